@@ -67,6 +67,8 @@ class PipelineParams(ParamGroup):
         self.convert_SHs_python = False
         self.compute_cov3D_python = False
         self.debug = False
+        self.rasterizer = "cuda"
+        self.precull = False
         super().__init__(parser, "Pipeline Parameters")
 
 class OptimizationParams(ParamGroup):
@@ -108,6 +110,7 @@ def get_combined_args(parser : ArgumentParser):
 
     merged_dict = vars(args_cfgfile).copy()
     for k,v in vars(args_cmdline).items():
-        if v != None:
+        # flags the config file does not know keep their default, even a None one
+        if v != None or k not in merged_dict:
             merged_dict[k] = v
     return Namespace(**merged_dict)
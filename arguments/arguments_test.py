@@ -0,0 +1,25 @@
+import os
+import tempfile
+import unittest
+from argparse import ArgumentParser, Namespace
+from unittest import mock
+from arguments import get_combined_args
+
+
+class GetCombinedArgsTest(unittest.TestCase):
+    def test_given_a_config_file__when_combining__then_keep_the_none_defaults_it_does_not_know(
+        self,
+    ) -> None:
+        parser = ArgumentParser()
+        parser.add_argument("--model_path", type=str, default=None)
+        parser.add_argument("--sh_degree", type=int, default=None)
+        parser.add_argument("--target_size", type=float, default=None)
+        with tempfile.TemporaryDirectory() as directory:
+            with open(os.path.join(directory, "cfg_args"), "w") as cfg_file:
+                cfg_file.write(str(Namespace(model_path=directory, sh_degree=3)))
+
+            with mock.patch("sys.argv", ["render.py", "--model_path", directory]):
+                args = get_combined_args(parser)
+
+        self.assertEqual(args.sh_degree, 3)
+        self.assertIsNone(args.target_size)
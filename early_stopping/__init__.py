@@ -48,7 +48,8 @@ class EarlyStoppingHandler:
         self,
         step: int,
         test_cameras: List[Any],
-        render_func: Callable,
+        render_func: Optional[Callable] = None,
+        render_batch_func: Optional[Callable] = None,
     ) -> bool:
         if not self.use_early_stopping:
             return False
@@ -61,8 +62,14 @@ class EarlyStoppingHandler:
 
         ssims = []
 
-        for camera in test_cameras:
-            image = torch.clamp(render_func(camera), 0.0, 1.0)
+        # render_batch_func renders all cameras in one pass and yields the images in order
+        if render_batch_func is not None:
+            images = render_batch_func(test_cameras)
+        else:
+            images = (render_func(camera) for camera in test_cameras)
+
+        for camera, image in zip(test_cameras, images):
+            image = torch.clamp(image, 0.0, 1.0)
             gt_image = torch.clamp(camera.original_image.to(self.device), 0.0, 1.0)
 
             ssims.append(ssim(image, gt_image))
@@ -1,19 +1,15 @@
-from typing import NamedTuple
 import unittest
 from early_stopping import EarlyStoppingHandler, GracePeriod
 import torch
-
-
-class TestCamera(NamedTuple):
-    original_image: torch.Tensor
+from utils.testing_utils import FakeView
 
 
 class EarlyStoppingTest(unittest.TestCase):
     def setUp(self) -> None:
         self.test_cameras = [
-            TestCamera(original_image=torch.zeros((128, 128, 3))),
-            TestCamera(original_image=torch.zeros((128, 128, 3))),
-            TestCamera(original_image=torch.zeros((128, 128, 3))),
+            FakeView(original_image=torch.zeros((128, 128, 3))),
+            FakeView(original_image=torch.zeros((128, 128, 3))),
+            FakeView(original_image=torch.zeros((128, 128, 3))),
         ]
 
     def test_given_valid_paramaters__when_initializing__then_do_not_throw_any_errors(
@@ -198,6 +194,36 @@ class EarlyStoppingTest(unittest.TestCase):
             )
         )
 
+    def test_given_a_batch_render_function__when_checking_for_early_stop__then_render_all_cameras_in_one_call(
+        self,
+    ) -> None:
+        handler = EarlyStoppingHandler(
+            use_early_stopping=True,
+            start_early_stopping_iteration=0,
+            grace_periods=[],
+            early_stopping_check_interval=1,
+            n_patience_epochs=2,
+            device="cpu",
+            use_wandb=False,
+        )
+        batches = []
+
+        def render_batch_func(cameras):
+            batches.append(len(cameras))
+            return (torch.ones_like(camera.original_image) for camera in cameras)
+
+        for i in range(3):
+            self.assertFalse(
+                handler.stop_early(
+                    step=i,
+                    test_cameras=self.test_cameras,
+                    render_batch_func=render_batch_func,
+                )
+            )
+
+        self.assertEqual(batches, [3, 3, 3])
+        self.assertEqual(handler.n_epochs_without_improvement, 2)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -14,16 +14,32 @@ import math
 from scene.gaussian_model import GaussianModel
 from utils.sh_utils import eval_sh
 
+def precull(visible, *tensors):
+    """
+    Restrict the per-Gaussian inputs of the rasterizer (None allowed) to the
+    visible indices. Indexing keeps the autograd graph, so the gradients are
+    scattered back to all Gaussians.
+    """
+    return tuple(None if t is None else t[visible] for t in tensors)
+
+def scatter_visible(visible, num_points, values):
+    out = torch.zeros((num_points,) + values.shape[1:], dtype=values.dtype, device=values.device)
+    out[visible] = values
+    return out
+
 def render(viewpoint_camera, pc : GaussianModel, pipe, bg_color : torch.Tensor, scaling_modifier = 1.0, override_color = None):
     """
     Render the scene. 
     
-    Background tensor (bg_color) must be on GPU!
+    Background tensor (bg_color) must be on GPU, or on the device of the model with pipe.rasterizer == "torch"!
     """
  
     # Create zero tensor. We will use it to make pytorch return gradients of the 2D (screen-space) means
-    from diff_gaussian_rasterization import GaussianRasterizationSettings, GaussianRasterizer
-    screenspace_points = torch.zeros_like(pc.get_xyz, dtype=pc.get_xyz.dtype, requires_grad=True, device="cuda") + 0
+    if pipe.rasterizer == "torch":
+        from gaussian_renderer.torch_rasterizer import GaussianRasterizationSettings, GaussianRasterizer
+    else:
+        from diff_gaussian_rasterization import GaussianRasterizationSettings, GaussianRasterizer
+    screenspace_points = torch.zeros_like(pc.get_xyz, dtype=pc.get_xyz.dtype, requires_grad=True) + 0
     try:
         screenspace_points.retain_grad()
     except:
@@ -81,7 +97,14 @@ def render(viewpoint_camera, pc : GaussianModel, pipe, bg_color : torch.Tensor,
     else:
         colors_precomp = override_color
 
+    if pipe.precull:
+        # only hand the Gaussians inside the view frustum to the rasterizer
+        visible = pc.frustum_indices(viewpoint_camera, scaling_modifier)
+        means3D, means2D, opacity, scales, rotations, cov3D_precomp, shs, colors_precomp = precull(
+            visible, means3D, means2D, opacity, scales, rotations, cov3D_precomp, shs, colors_precomp)
+
     # Rasterize visible Gaussians to image, obtain their radii (on screen). 
+    # (the torch backend also returns the importance outputs, they are dropped here)
     rendered_image, radii = rasterizer(
         means3D = means3D,
         means2D = means2D,
@@ -90,7 +113,10 @@ def render(viewpoint_camera, pc : GaussianModel, pipe, bg_color : torch.Tensor,
         opacities = opacity,
         scales = scales,
         rotations = rotations,
-        cov3D_precomp = cov3D_precomp)
+        cov3D_precomp = cov3D_precomp)[:2]
+
+    if pipe.precull:
+        radii = scatter_visible(visible, pc.get_xyz.shape[0], radii)
 
     # Those Gaussians that were frustum culled or had a radius of 0 were not visible.
     # They will be excluded from value updates used in the splitting criteria.
@@ -105,12 +131,15 @@ def render_imp(viewpoint_camera, pc : GaussianModel, pipe, bg_color : torch.Tens
     """
     Render the scene. 
     
-    Background tensor (bg_color) must be on GPU!
+    Background tensor (bg_color) must be on GPU, or on the device of the model with pipe.rasterizer == "torch"!
     """
  
     # Create zero tensor. We will use it to make pytorch return gradients of the 2D (screen-space) means
-    from diff_gaussian_rasterization_ms import GaussianRasterizationSettings, GaussianRasterizer
-    screenspace_points = torch.zeros_like(pc.get_xyz, dtype=pc.get_xyz.dtype, requires_grad=True, device="cuda") + 0
+    if pipe.rasterizer == "torch":
+        from gaussian_renderer.torch_rasterizer import GaussianRasterizationSettings, GaussianRasterizer
+    else:
+        from diff_gaussian_rasterization_ms import GaussianRasterizationSettings, GaussianRasterizer
+    screenspace_points = torch.zeros_like(pc.get_xyz, dtype=pc.get_xyz.dtype, requires_grad=True) + 0
     try:
         screenspace_points.retain_grad()
     except:
@@ -168,6 +197,12 @@ def render_imp(viewpoint_camera, pc : GaussianModel, pipe, bg_color : torch.Tens
     else:
         colors_precomp = override_color
 
+    if pipe.precull:
+        # only hand the Gaussians inside the view frustum to the rasterizer
+        visible = pc.frustum_indices(viewpoint_camera, scaling_modifier)
+        means3D, means2D, opacity, scales, rotations, cov3D_precomp, shs, colors_precomp = precull(
+            visible, means3D, means2D, opacity, scales, rotations, cov3D_precomp, shs, colors_precomp)
+
     # Rasterize visible Gaussians to image, obtain their radii (on screen). 
     rendered_image, radii, \
     accum_weights_ptr, accum_weights_count, accum_max_count  = rasterizer(
@@ -180,6 +215,13 @@ def render_imp(viewpoint_camera, pc : GaussianModel, pipe, bg_color : torch.Tens
         rotations = rotations,
         cov3D_precomp = cov3D_precomp)
 
+    if pipe.precull:
+        num_points = pc.get_xyz.shape[0]
+        radii = scatter_visible(visible, num_points, radii)
+        accum_weights_ptr = scatter_visible(visible, num_points, accum_weights_ptr)
+        accum_weights_count = scatter_visible(visible, num_points, accum_weights_count)
+        accum_max_count = scatter_visible(visible, num_points, accum_max_count)
+
     # Those Gaussians that were frustum culled or had a radius of 0 were not visible.
     # They will be excluded from value updates used in the splitting criteria.
     return {"render": rendered_image,
@@ -204,12 +246,15 @@ def render_depth(viewpoint_camera, pc : GaussianModel, pipe, bg_color : torch.Te
     """
     Render the scene. 
     
-    Background tensor (bg_color) must be on GPU!
+    Background tensor (bg_color) must be on GPU, or on the device of the model with pipe.rasterizer == "torch"!
     """
  
     # Create zero tensor. We will use it to make pytorch return gradients of the 2D (screen-space) means
-    from diff_gaussian_rasterization_ms import GaussianRasterizationSettings, GaussianRasterizer
-    screenspace_points = torch.zeros_like(pc.get_xyz, dtype=pc.get_xyz.dtype, requires_grad=True, device="cuda") + 0
+    if pipe.rasterizer == "torch":
+        from gaussian_renderer.torch_rasterizer import GaussianRasterizationSettings, GaussianRasterizer
+    else:
+        from diff_gaussian_rasterization_ms import GaussianRasterizationSettings, GaussianRasterizer
+    screenspace_points = torch.zeros_like(pc.get_xyz, dtype=pc.get_xyz.dtype, requires_grad=True) + 0
     try:
         screenspace_points.retain_grad()
     except:
@@ -282,15 +327,117 @@ def render_depth(viewpoint_camera, pc : GaussianModel, pipe, bg_color : torch.Te
 
 
 
+@torch.no_grad()
+def render_batch(cameras, pc : GaussianModel, pipe, bg_color : torch.Tensor, scaling_modifier = 1.0, override_color = None, stats_only = False, depth = False, importance = True):
+    """
+    Render a list of cameras with the rasterizer of render_imp (or of
+    render_depth if depth is set) and yield the package of every view in order.
+    With importance=False the plain rasterizer of render is used instead and
+    the packages hold the render and the radii only.
+
+    The activated Gaussian attributes and the screen-space points are shared by
+    the whole batch, so this is for evaluation passes only (no gradients).
+    With stats_only the colors are not evaluated (the Gaussians are rasterized
+    black), the rendered images are dropped and only the visibility and
+    importance statistics are yielded. pipe.precull applies to the color and
+    importance renders, not to the depth ones.
+    """
+    if pipe.rasterizer == "torch":
+        from gaussian_renderer.torch_rasterizer import GaussianRasterizationSettings, GaussianRasterizer
+    elif depth or importance:
+        from diff_gaussian_rasterization_ms import GaussianRasterizationSettings, GaussianRasterizer
+    else:
+        from diff_gaussian_rasterization import GaussianRasterizationSettings, GaussianRasterizer
 
+    means3D = pc.get_xyz
+    means2D = torch.zeros_like(means3D)
+    opacity = pc.get_opacity
 
+    scales = None
+    rotations = None
+    cov3D_precomp = None
+    if pipe.compute_cov3D_python:
+        cov3D_precomp = pc.get_covariance(scaling_modifier)
+    else:
+        scales = pc.get_scaling
+        rotations = pc.get_rotation
 
+    shs = None
+    colors_precomp = None
+    if stats_only:
+        # the statistics do not depend on the colors, skip the SH evaluation
+        colors_precomp = torch.zeros_like(means3D)
+    elif override_color is None:
+        if pipe.convert_SHs_python:
+            shs_view = pc.get_features.transpose(1, 2).view(-1, 3, (pc.max_sh_degree+1)**2)
+        else:
+            shs = pc.get_features
+    else:
+        colors_precomp = override_color
 
+    for viewpoint_camera in cameras:
+        if override_color is None and pipe.convert_SHs_python and not stats_only:
+            # view dependent, the only per view part of the preprocessing
+            dir_pp = (means3D - viewpoint_camera.camera_center.repeat(means3D.shape[0], 1))
+            dir_pp_normalized = dir_pp/dir_pp.norm(dim=1, keepdim=True)
+            sh2rgb = eval_sh(pc.active_sh_degree, shs_view, dir_pp_normalized)
+            colors_precomp = torch.clamp_min(sh2rgb + 0.5, 0.0)
 
-
-
-
-
-
-
-
+        raster_settings = GaussianRasterizationSettings(
+            image_height=int(viewpoint_camera.image_height),
+            image_width=int(viewpoint_camera.image_width),
+            tanfovx=math.tan(viewpoint_camera.FoVx * 0.5),
+            tanfovy=math.tan(viewpoint_camera.FoVy * 0.5),
+            bg=bg_color,
+            scale_modifier=scaling_modifier,
+            viewmatrix=viewpoint_camera.world_view_transform,
+            projmatrix=viewpoint_camera.full_proj_transform,
+            sh_degree=pc.active_sh_degree,
+            campos=viewpoint_camera.camera_center,
+            prefiltered=False,
+            debug=pipe.debug
+        )
+        rasterizer = GaussianRasterizer(raster_settings=raster_settings)
+
+        if depth:
+            yield rasterizer.render_depth(
+                means3D = means3D,
+                means2D = means2D,
+                shs = shs,
+                colors_precomp = colors_precomp,
+                opacities = opacity,
+                scales = scales,
+                rotations = rotations,
+                cov3D_precomp = cov3D_precomp)
+            continue
+
+        inputs = (means3D, means2D, opacity, scales, rotations, cov3D_precomp, shs, colors_precomp)
+        if pipe.precull:
+            visible = pc.frustum_indices(viewpoint_camera, scaling_modifier)
+            inputs = precull(visible, *inputs)
+
+        outputs = rasterizer(
+            means3D = inputs[0],
+            means2D = inputs[1],
+            shs = inputs[6],
+            colors_precomp = inputs[7],
+            opacities = inputs[2],
+            scales = inputs[3],
+            rotations = inputs[4],
+            cov3D_precomp = inputs[5])
+        # (the torch backend always returns the importance outputs)
+        rendered_image, radii = outputs[:2]
+        stats = {"accum_weights": outputs[2], "area_proj": outputs[3], "area_max": outputs[4]} if importance else {}
+
+        if pipe.precull:
+            num_points = means3D.shape[0]
+            radii = scatter_visible(visible, num_points, radii)
+            stats = {key: scatter_visible(visible, num_points, value) for key, value in stats.items()}
+
+        render_pkg = {"visibility_filter" : radii > 0,
+                      "radii": radii,
+                      **stats,
+                      }
+        if not stats_only:
+            render_pkg["render"] = rendered_image
+        yield render_pkg
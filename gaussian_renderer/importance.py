@@ -0,0 +1,98 @@
+import time
+import random
+import torch
+
+
+class ImportanceAccumulator:
+    """
+    Accumulates the per-Gaussian statistics returned by render_imp over a set
+    of views. Both importance metrics are gathered in the same pass:
+
+    - indoor:  sum of blending weights
+    - outdoor: sum of blending weights normalised by the projected area,
+               only over views where the Gaussian is the max contributor of
+               at least one pixel
+    """
+
+    def __init__(self, num_points, device="cuda"):
+        self.num_points = num_points
+        self.device = device
+        self.accum_weights = torch.zeros(num_points, device=device)
+        self.accum_weights_area = torch.zeros(num_points, device=device)
+        self.accum_area_max = torch.zeros(num_points, device=device)
+        self.view_names = []
+        self.view_times = []
+
+    @staticmethod
+    def select_views(views, view_fraction=1.0, seed=None):
+        if view_fraction >= 1.0:
+            return list(views)
+        num_views = max(1, int(round(len(views) * view_fraction)))
+        idx = sorted(random.Random(seed).sample(range(len(views)), num_views))
+        return [views[i] for i in idx]
+
+    def add(self, render_pkg):
+        accum_weights = render_pkg["accum_weights"]
+        area_proj = render_pkg["area_proj"]
+        area_max = render_pkg["area_max"]
+
+        self.accum_area_max += area_max
+        self.accum_weights += accum_weights
+
+        mask_t = area_max != 0
+        self.accum_weights_area[mask_t] += (accum_weights/area_proj)[mask_t]
+
+    @torch.no_grad()
+    def accumulate(self, views, gaussians, pipe, background, view_fraction=1.0, seed=None, render_func=None):
+        views = self.select_views(views, view_fraction, seed)
+        if render_func is None:
+            from gaussian_renderer import render_batch
+            render_pkgs = render_batch(views, gaussians, pipe, background, stats_only=True)
+        else:
+            render_pkgs = (render_func(view, gaussians, pipe, background) for view in views)
+
+        start = time.perf_counter()
+        for view, render_pkg in zip(views, render_pkgs):
+            self.add(render_pkg)
+            if torch.device(self.device).type == "cuda":
+                torch.cuda.synchronize()
+            end = time.perf_counter()
+            self.view_times.append(end - start)
+            self.view_names.append(getattr(view, "image_name", None))
+            start = end
+        return self
+
+    @property
+    def time_per_view(self):
+        if len(self.view_times) == 0:
+            return 0.0
+        return sum(self.view_times) / len(self.view_times)
+
+    def scores(self, imp_metric):
+        if imp_metric == 'outdoor':
+            imp_score = self.accum_weights_area.clone()
+        else:
+            imp_score = self.accum_weights.clone()
+        imp_score[self.accum_area_max==0] = 0
+        return imp_score
+
+    def save(self, path):
+        torch.save({
+            "num_points": self.num_points,
+            "accum_weights": self.accum_weights.cpu(),
+            "accum_weights_area": self.accum_weights_area.cpu(),
+            "accum_area_max": self.accum_area_max.cpu(),
+            "view_names": self.view_names,
+            "view_times": self.view_times,
+        }, path)
+
+    @classmethod
+    def load(cls, path, device="cuda"):
+        state = torch.load(path)
+        acc = cls(state["num_points"], device=device)
+        acc.accum_weights = state["accum_weights"].to(device)
+        acc.accum_weights_area = state["accum_weights_area"].to(device)
+        acc.accum_area_max = state["accum_area_max"].to(device)
+        acc.view_names = state["view_names"]
+        acc.view_times = state["view_times"]
+        return acc
@@ -0,0 +1,80 @@
+import os
+import tempfile
+import unittest
+import torch
+from gaussian_renderer.importance import ImportanceAccumulator
+from utils.testing_utils import FakeView, fake_render
+
+
+class ImportanceAccumulatorTest(unittest.TestCase):
+    def setUp(self) -> None:
+        torch.manual_seed(0)
+        self.num_points = 64
+        self.views = []
+        for i in range(6):
+            area_max = (torch.rand(self.num_points) > 0.5).float()
+            area_max[0] = 0  # never the max contributor
+            self.views.append(FakeView(
+                image_name=str(i),
+                render_pkg={
+                    "accum_weights": torch.rand(self.num_points),
+                    "area_proj": torch.randint(1, 10, (self.num_points,), dtype=torch.int32),
+                    "area_max": area_max,
+                },
+            ))
+
+    def reference_scores(self, imp_metric):
+        # the loop formerly inlined at simp_iteration1 / simp_iteration2
+        imp_score = torch.zeros(self.num_points)
+        accum_area_max = torch.zeros(self.num_points)
+        for view in self.views:
+            pkg = view.render_pkg
+            accum_area_max = accum_area_max+pkg["area_max"]
+            if imp_metric=='outdoor':
+                mask_t=pkg["area_max"]!=0
+                temp=imp_score+pkg["accum_weights"]/pkg["area_proj"]
+                imp_score[mask_t] = temp[mask_t]
+            else:
+                imp_score=imp_score+pkg["accum_weights"]
+        imp_score[accum_area_max==0]=0
+        return imp_score
+
+    def accumulate(self, **kwargs):
+        return ImportanceAccumulator(self.num_points, device="cpu").accumulate(
+            self.views, None, None, None, render_func=fake_render, **kwargs)
+
+    def test_given_all_views__when_scoring_both_metrics__then_match_the_inline_loops(
+        self,
+    ) -> None:
+        acc = self.accumulate()
+
+        for imp_metric in ["indoor", "outdoor"]:
+            self.assertTrue(torch.allclose(acc.scores(imp_metric), self.reference_scores(imp_metric)))
+        self.assertEqual(acc.scores("outdoor")[0].item(), 0)
+        self.assertEqual(len(acc.view_times), len(self.views))
+
+    def test_given_a_view_fraction__when_accumulating__then_use_a_seeded_subset_of_views(
+        self,
+    ) -> None:
+        acc_a = self.accumulate(view_fraction=0.5, seed=1)
+        acc_b = self.accumulate(view_fraction=0.5, seed=1)
+
+        self.assertEqual(len(acc_a.view_names), 3)
+        self.assertEqual(acc_a.view_names, acc_b.view_names)
+
+    def test_given_saved_scores__when_loading__then_scores_are_identical(
+        self,
+    ) -> None:
+        acc = self.accumulate()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "importance.pt")
+            acc.save(path)
+            loaded = ImportanceAccumulator.load(path, device="cpu")
+
+        self.assertEqual(loaded.num_points, self.num_points)
+        self.assertTrue(torch.equal(loaded.scores("outdoor"), acc.scores("outdoor")))
+        self.assertTrue(torch.equal(loaded.scores("indoor"), acc.scores("indoor")))
+
+
+if __name__ == "__main__":
+    unittest.main()
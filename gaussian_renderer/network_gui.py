@@ -3,60 +3,62 @@
 # GRAPHDECO research group, https://team.inria.fr/graphdeco
 # All rights reserved.
 #
-# This software is free for non-commercial, research and evaluation use 
+# This software is free for non-commercial, research and evaluation use
 # under the terms of the LICENSE.md file.
 #
 # For inquiries contact  george.drettakis@inria.fr
 #
 
-import torch
-import traceback
-import socket
+import copy
+import io
 import json
+import queue
+import socket
+import threading
+import time
+import traceback
+import torch
+from PIL import Image
+from gaussian_renderer.render_cache import RenderCache, model_version
 from scene.cameras import MiniCam
+from utils.general_utils import build_scaling_rotation, strip_symmetric
+
+server = None
 
-host = "127.0.0.1"
-port = 6009
-
-conn = None
-addr = None
-
-listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-
-def init(wish_host, wish_port):
-    global host, port, listener
-    host = wish_host
-    port = wish_port
-    listener.bind((host, port))
-    listener.listen()
-    listener.settimeout(0)
-
-def try_connect():
-    global conn, addr, listener
-    try:
-        conn, addr = listener.accept()
-        print(f"\nConnected by {addr}")
-        conn.settimeout(None)
-    except Exception as inst:
-        pass
-            
-def read():
-    global conn
-    messageLength = conn.recv(4)
-    messageLength = int.from_bytes(messageLength, 'little')
-    message = conn.recv(messageLength)
-    return json.loads(message.decode("utf-8"))
-
-def send(message_bytes, verify):
-    global conn
-    if message_bytes != None:
+def init(wish_host, wish_port, target_fps=30, render_func=None):
+    """
+    Start the viewer server on a background thread, drawing frames with
+    render_func (gaussian_renderer.render by default). The training loop only
+    calls update(), which costs nothing unless the viewer is waiting for a frame.
+    """
+    global server
+    server = GUIServer(wish_host, wish_port, target_fps=target_fps, render_func=render_func).start()
+    return server
+
+def update(gaussians, pipe, background, verify, last_iteration=False):
+    if server is not None:
+        server.update(gaussians, pipe, background, verify, last_iteration)
+
+def read(conn):
+    message_length = int.from_bytes(recv_exactly(conn, 4), 'little')
+    return json.loads(recv_exactly(conn, message_length).decode("utf-8"))
+
+def recv_exactly(conn, length):
+    data = b""
+    while len(data) < length:
+        chunk = conn.recv(length - len(data))
+        if not chunk:
+            raise ConnectionError("Viewer disconnected")
+        data += chunk
+    return data
+
+def send(conn, message_bytes, verify):
+    if message_bytes is not None:
         conn.sendall(message_bytes)
     conn.sendall(len(verify).to_bytes(4, 'little'))
     conn.sendall(bytes(verify, 'ascii'))
 
-def receive():
-    message = read()
-
+def receive(message, device="cuda"):
     width = message["resolution_x"]
     height = message["resolution_y"]
 
@@ -71,10 +73,10 @@ def receive():
             do_rot_scale_python = bool(message["rot_scale_python"])
             keep_alive = bool(message["keep_alive"])
             scaling_modifier = message["scaling_modifier"]
-            world_view_transform = torch.reshape(torch.tensor(message["view_matrix"]), (4, 4)).cuda()
+            world_view_transform = torch.reshape(torch.tensor(message["view_matrix"]), (4, 4)).to(device)
             world_view_transform[:,1] = -world_view_transform[:,1]
             world_view_transform[:,2] = -world_view_transform[:,2]
-            full_proj_transform = torch.reshape(torch.tensor(message["view_projection_matrix"]), (4, 4)).cuda()
+            full_proj_transform = torch.reshape(torch.tensor(message["view_projection_matrix"]), (4, 4)).to(device)
             full_proj_transform[:,1] = -full_proj_transform[:,1]
             custom_cam = MiniCam(width, height, fovy, fovx, znear, zfar, world_view_transform, full_proj_transform)
         except Exception as e:
@@ -83,4 +85,199 @@ def receive():
             raise e
         return custom_cam, do_training, do_shs_python, do_rot_scale_python, keep_alive, scaling_modifier
     else:
-        return None, None, None, None, None, None
\ No newline at end of file
+        return None, None, None, None, None, None
+
+def encode_frame(image, encoding="raw", quality=85):
+    """
+    Frame bytes for the viewer: raw is the HxWx3 uint8 image the SIBR viewer
+    expects, jpeg is prefixed with its length in bytes (4 bytes, little endian).
+    """
+    array = (torch.clamp(image, min=0, max=1.0) * 255).byte().permute(1, 2, 0).contiguous().cpu().numpy()
+    if encoding == "raw":
+        return memoryview(array)
+    if encoding != "jpeg":
+        raise ValueError("Unknown encoding {}, expected raw or jpeg".format(encoding))
+    buffer = io.BytesIO()
+    Image.fromarray(array).save(buffer, format="JPEG", quality=quality)
+    return len(buffer.getvalue()).to_bytes(4, 'little') + buffer.getvalue()
+
+class GaussianSnapshot:
+    """
+    Detached copy of the activated parameters, rendered while training goes on.
+    """
+
+    def __init__(self, gaussians):
+        with torch.no_grad():
+            self.get_xyz = gaussians.get_xyz.detach().clone()
+            self.get_opacity = gaussians.get_opacity.detach().clone()
+            self.get_scaling = gaussians.get_scaling.detach().clone()
+            self.get_rotation = gaussians.get_rotation.detach().clone()
+            self.get_features = gaussians.get_features.detach().clone()
+        self.active_sh_degree = gaussians.active_sh_degree
+        self.max_sh_degree = gaussians.max_sh_degree
+        self.version = model_version(gaussians)
+
+    def get_covariance(self, scaling_modifier = 1):
+        L = build_scaling_rotation(scaling_modifier * self.get_scaling, self.get_rotation)
+        return strip_symmetric(L @ L.transpose(1, 2))
+
+class GUIServer:
+    """
+    Serves one viewer at a time from a background thread. When the viewer asks
+    for a frame, the next update() call of the training loop hands over the
+    cached frame of the current Gaussians or a snapshot of them, which is
+    rendered and encoded on the server thread. Frames are limited to target_fps; the viewer picks the encoding
+    with the optional "encoding" (raw or jpeg) and "quality" message fields.
+    Encoded frames are cached per pose until the Gaussians change, so a paused
+    viewer or paused training costs no rendering (cache_bytes=0 disables it).
+    """
+
+    def __init__(self, host="127.0.0.1", port=6009, target_fps=30, render_func=None, snapshot_timeout=1.0,
+                 cache_bytes=64 * 2**20):
+        if render_func is None:
+            from gaussian_renderer import render as render_func
+        self.render_func = render_func
+        self.frame_interval = 1.0 / target_fps if target_fps > 0 else 0.0
+        self.snapshot_timeout = snapshot_timeout
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listener.bind((host, port))
+        self.listener.listen()
+        self.listener.settimeout(0.5)
+        self.address = self.listener.getsockname()
+
+        self.requests = queue.Queue(maxsize=1)
+        self.conn = None
+        self.do_training = True
+        self.keep_alive = False
+        self.verify = ""
+        self.snapshot = None
+        self.cache = RenderCache(cache_bytes) if cache_bytes > 0 else None
+        self.frames = 0
+        self.snapshots = 0
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        conn = self.conn
+        if conn is not None:
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        if self.thread is not None:
+            self.thread.join()
+        self.listener.close()
+
+    def update(self, gaussians, pipe, background, verify, last_iteration=False):
+        """
+        Called by the training loop every iteration. Blocks, while still serving
+        frames, as long as the viewer pauses training, and after the last
+        iteration for as long as it asks to keep the session alive.
+        """
+        self.verify = verify
+        while True:
+            paused = self._paused(last_iteration)
+            # the usual case, no frame waiting
+            if not paused and self.requests.empty():
+                return
+            try:
+                request = self.requests.get_nowait() if not paused else self.requests.get(timeout=0.1)
+            except queue.Empty:
+                request = None
+            if request is not None:
+                key, reply = request
+                frame = self.cache.get(key, model_version(gaussians)) if key is not None else None
+                if frame is not None:
+                    reply.put((frame, None))
+                else:
+                    gui_pipe = copy.copy(pipe)
+                    gui_pipe.precull = False
+                    reply.put((None, (GaussianSnapshot(gaussians), gui_pipe, background)))
+                    self.snapshots += 1
+            if not self._paused(last_iteration):
+                return
+
+    def _paused(self, last_iteration):
+        return self.conn is not None and not self.stopped.is_set() and (not self.do_training or (last_iteration and self.keep_alive))
+
+    def _request_frame(self, key):
+        """
+        (frame, None) when the cache holds the frame of key for the current
+        Gaussians, else (None, snapshot) to render.
+        """
+        reply = queue.Queue(maxsize=1)
+        self.requests.put((key, reply))
+        start = time.perf_counter()
+        while True:
+            try:
+                frame, snapshot = reply.get(timeout=0.1)
+                if snapshot is not None:
+                    self.snapshot = snapshot
+                return frame, snapshot
+            except queue.Empty:
+                pass
+            timed_out = self.snapshot is not None and time.perf_counter() - start > self.snapshot_timeout
+            if not (timed_out or self.stopped.is_set()):
+                continue
+            try:
+                self.requests.get_nowait()
+            except queue.Empty:
+                # update() already took the request, the snapshot is on its way
+                continue
+            if self.snapshot is None:
+                raise ConnectionError("GUI server stopped")
+            # training is not calling update() (finished or busy), show the last state
+            frame = self.cache.get(key, self.snapshot[0].version) if key is not None else None
+            return frame, None if frame is not None else self.snapshot
+
+    def _serve(self):
+        while not self.stopped.is_set():
+            try:
+                conn, addr = self.listener.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            print(f"\nConnected by {addr}")
+            conn.settimeout(None)
+            self.conn = conn
+            try:
+                self._serve_viewer(conn)
+            except Exception:
+                pass
+            finally:
+                self.conn = None
+                conn.close()
+
+    def _serve_viewer(self, conn):
+        last_frame = 0.0
+        while not self.stopped.is_set():
+            message = read(conn)
+            frame = None
+            if message["resolution_x"] != 0 and message["resolution_y"] != 0:
+                self.do_training, self.keep_alive = bool(message["train"]), bool(message["keep_alive"])
+                time.sleep(max(0.0, last_frame + self.frame_interval - time.perf_counter()))
+                last_frame = time.perf_counter()
+                custom_cam, _, do_shs_python, do_rot_scale_python, _, scaling_modifier = receive(message, "cpu")
+                encoding, quality = message.get("encoding", "raw"), int(message.get("quality", 85))
+                key = self.cache.key(custom_cam, scaling_modifier, do_shs_python, do_rot_scale_python, encoding, quality) if self.cache is not None else None
+                frame, snapshot = self._request_frame(key)
+                if frame is None:
+                    gaussians, pipe, background = snapshot
+                    pipe.convert_SHs_python, pipe.compute_cov3D_python = do_shs_python, do_rot_scale_python
+                    if gaussians.get_xyz.device != custom_cam.world_view_transform.device:
+                        custom_cam = receive(message, gaussians.get_xyz.device)[0]
+                    with torch.no_grad():
+                        net_image = self.render_func(custom_cam, gaussians, pipe, background, scaling_modifier)["render"]
+                    frame = encode_frame(net_image, encoding, quality)
+                    if key is not None:
+                        self.cache.put(key, gaussians.version, frame)
+                self.frames += 1
+            send(conn, frame, self.verify)
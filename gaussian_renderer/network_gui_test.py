@@ -0,0 +1,208 @@
+import io
+import json
+import math
+import socket
+import threading
+import time
+import types
+import unittest
+from unittest import mock
+import numpy as np
+import torch
+from torch import nn
+from PIL import Image
+from gaussian_renderer import render, render_imp
+from gaussian_renderer.network_gui import GUIServer, receive, recv_exactly
+from scene.gaussian_model import GaussianModel
+from utils.graphics_utils import getProjectionMatrix
+
+
+def make_pipe():
+    return types.SimpleNamespace(convert_SHs_python=False, compute_cov3D_python=False, debug=False,
+                                 rasterizer="torch", precull=False)
+
+
+def make_model(num_points=100):
+    generator = torch.Generator().manual_seed(0)
+    model = GaussianModel(0)
+    model._xyz = nn.Parameter(torch.cat([torch.rand((num_points, 2), generator=generator) * 2 - 1,
+                                         torch.rand((num_points, 1), generator=generator) * 2 + 3], 1))
+    model._features_dc = nn.Parameter(torch.rand((num_points, 1, 3), generator=generator))
+    model._features_rest = nn.Parameter(torch.zeros((num_points, 0, 3)))
+    model._scaling = nn.Parameter(torch.log(torch.rand((num_points, 3), generator=generator) * 0.1 + 0.02))
+    model._rotation = nn.Parameter(torch.randn((num_points, 4), generator=generator))
+    model._opacity = nn.Parameter(torch.randn((num_points, 1), generator=generator))
+    return model
+
+
+def make_message(width=32, height=24, train=True, keep_alive=False, **kwargs):
+    # the SIBR viewer sends OpenGL style matrices, flipping the y and z camera axes
+    fov = math.radians(60)
+    view = torch.eye(4)
+    view[:, 1:3] *= -1
+    projection = getProjectionMatrix(znear=0.01, zfar=100.0, fovX=fov, fovY=fov).transpose(0, 1)
+    view_projection = torch.eye(4) @ projection
+    view_projection[:, 1] *= -1
+    return dict(resolution_x=width, resolution_y=height, train=train, fov_y=fov, fov_x=fov, z_near=0.01, z_far=100.0,
+                shs_python=False, rot_scale_python=False, keep_alive=keep_alive, scaling_modifier=1.0,
+                view_matrix=view.reshape(-1).tolist(), view_projection_matrix=view_projection.reshape(-1).tolist(), **kwargs)
+
+
+class Viewer:
+    def __init__(self, address):
+        self.conn = socket.create_connection(address)
+
+    def request(self, message):
+        body = json.dumps(message).encode("utf-8")
+        self.conn.sendall(len(body).to_bytes(4, 'little') + body)
+        if message.get("encoding", "raw") == "jpeg":
+            frame = recv_exactly(self.conn, int.from_bytes(recv_exactly(self.conn, 4), 'little'))
+        else:
+            frame = recv_exactly(self.conn, message["resolution_x"] * message["resolution_y"] * 3)
+        verify = recv_exactly(self.conn, int.from_bytes(recv_exactly(self.conn, 4), 'little'))
+        return frame, verify.decode("ascii")
+
+    def close(self):
+        self.conn.close()
+
+
+class Trainer:
+    """
+    Stand in for the training loop, counting the iterations done while a viewer is attached.
+    """
+
+    def __init__(self, server, model, pipe, background):
+        self.iterations = 0
+        self.stopped = threading.Event()
+
+        def loop():
+            while not self.stopped.is_set():
+                server.update(model, pipe, background, "/data/scene")
+                self.iterations += 1
+                time.sleep(0.001)
+
+        self.thread = threading.Thread(target=loop, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+
+class GUIServerTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.model = make_model()
+        self.pipe = make_pipe()
+        self.background = torch.tensor([0.0, 0.0, 0.0])
+        self.server = GUIServer("127.0.0.1", 0, target_fps=20).start()
+        self.viewer = Viewer(self.server.address)
+        self.trainer = Trainer(self.server, self.model, self.pipe, self.background)
+
+    def tearDown(self) -> None:
+        self.trainer.stop()
+        self.viewer.close()
+        self.server.stop()
+
+    def test_given_a_raw_frame_request__when_training__then_send_the_render_of_a_snapshot(
+        self,
+    ) -> None:
+        message = make_message()
+        frame, verify = self.viewer.request(message)
+
+        camera = receive(message, "cpu")[0]
+        with torch.no_grad():
+            expected = render(camera, self.model, self.pipe, self.background)["render"]
+        expected = (torch.clamp(expected, min=0, max=1.0) * 255).byte().permute(1, 2, 0).numpy()
+        self.assertEqual(verify, "/data/scene")
+        self.assertTrue(np.array_equal(np.frombuffer(frame, dtype=np.uint8).reshape(24, 32, 3), expected))
+        self.assertEqual(self.server.snapshots, 1)
+
+    def test_given_a_jpeg_request__when_training__then_send_a_length_prefixed_jpeg(
+        self,
+    ) -> None:
+        frame, _ = self.viewer.request(make_message(encoding="jpeg", quality=70))
+
+        image = Image.open(io.BytesIO(frame))
+        self.assertEqual(image.format, "JPEG")
+        self.assertEqual(image.size, (32, 24))
+
+    def test_given_a_target_fps__when_requesting_frames__then_rate_limit_them_without_stalling_training(
+        self,
+    ) -> None:
+        start = time.perf_counter()
+        for _ in range(4):
+            self.viewer.request(make_message())
+        elapsed = time.perf_counter() - start
+
+        self.assertGreaterEqual(elapsed, 3 / 20)
+        self.assertEqual(self.server.frames, 4)
+        self.assertLessEqual(self.server.snapshots, 4)
+        self.assertGreater(self.trainer.iterations, 4)
+
+    def test_given_a_paused_viewer__when_training__then_block_until_resumed(
+        self,
+    ) -> None:
+        self.viewer.request(make_message(train=False))
+        time.sleep(0.05)
+        paused_at = self.trainer.iterations
+        time.sleep(0.1)
+
+        self.assertEqual(self.trainer.iterations, paused_at)
+        self.viewer.request(make_message(train=False))
+        self.viewer.request(make_message(train=True))
+        time.sleep(0.1)
+        self.assertGreater(self.trainer.iterations, paused_at)
+
+    def test_given_paused_training__when_the_viewer_repeats_a_pose__then_serve_it_from_the_cache(
+        self,
+    ) -> None:
+        first, _ = self.viewer.request(make_message(train=False))
+        repeated, _ = self.viewer.request(make_message(train=False))
+        moved = make_message(train=False)
+        moved["view_matrix"][12] = 0.5
+        self.viewer.request(moved)
+
+        self.assertEqual(first, repeated)
+        self.assertEqual(self.server.frames, 3)
+        self.assertEqual(self.server.snapshots, 2)
+        self.assertEqual(self.server.cache.hits, 1)
+        self.viewer.request(make_message(train=True))
+
+
+class UpdateTest(unittest.TestCase):
+    def test_given_no_waiting_viewer__when_updating__then_skip_the_snapshot_work(
+        self,
+    ) -> None:
+        server = GUIServer("127.0.0.1", 0)
+        with mock.patch("gaussian_renderer.network_gui.model_version") as version:
+            for _ in range(10):
+                server.update(make_model(), make_pipe(), torch.zeros(3), "/data/scene")
+        server.stop()
+
+        version.assert_not_called()
+        self.assertEqual(server.snapshots, 0)
+
+    def test_given_a_render_func__when_serving_a_frame__then_render_with_it(
+        self,
+    ) -> None:
+        model, pipe, background = make_model(), make_pipe(), torch.tensor([0.0, 0.0, 0.0])
+        server = GUIServer("127.0.0.1", 0, render_func=render_imp).start()
+        viewer = Viewer(server.address)
+        trainer = Trainer(server, model, pipe, background)
+        message = make_message()
+        try:
+            frame, _ = viewer.request(message)
+        finally:
+            trainer.stop()
+            viewer.close()
+            server.stop()
+
+        with torch.no_grad():
+            expected = render_imp(receive(message, "cpu")[0], model, pipe, background)["render"]
+        expected = (torch.clamp(expected, min=0, max=1.0) * 255).byte().permute(1, 2, 0).numpy()
+        self.assertIs(server.render_func, render_imp)
+        self.assertTrue(np.array_equal(np.frombuffer(frame, dtype=np.uint8).reshape(24, 32, 3), expected))
+
+
+if __name__ == "__main__":
+    unittest.main()
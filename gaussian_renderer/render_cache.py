@@ -0,0 +1,87 @@
+import threading
+from collections import OrderedDict
+import torch
+
+
+def model_version(gaussians):
+    """
+    Changes whenever the Gaussians do: optimizer steps bump the version counter
+    of the parameters, densification and pruning replace them, and the active
+    SH degree changes what is rendered.
+    """
+    params = [gaussians._xyz, gaussians._features_dc, gaussians._features_rest,
+              gaussians._scaling, gaussians._rotation, gaussians._opacity]
+    return (gaussians.active_sh_degree,) + tuple((id(p), p._version, p.shape[0]) for p in params)
+
+
+def camera_key(camera, quantum=1e-4):
+    """
+    Resolution and the view / projection matrices rounded to quantum, poses
+    closer than that share a frame.
+    """
+    matrices = torch.cat([camera.world_view_transform.reshape(-1), camera.full_proj_transform.reshape(-1)])
+    return (camera.image_width, camera.image_height) + tuple(torch.round(matrices / quantum).long().tolist())
+
+
+def value_bytes(value):
+    if isinstance(value, torch.Tensor):
+        return value.numel() * value.element_size()
+    if isinstance(value, memoryview):
+        return value.nbytes
+    return len(value)
+
+
+class RenderCache:
+    """
+    LRU cache of rendered (or encoded) frames with a byte budget. Entries belong
+    to one model version, looking up or storing another version drops them all.
+    """
+
+    def __init__(self, max_bytes=256 * 2**20, quantum=1e-4):
+        self.max_bytes = max_bytes
+        self.quantum = quantum
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.version = None
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, camera, *extra):
+        return camera_key(camera, self.quantum) + tuple(extra)
+
+    def _check_version(self, version):
+        if version != self.version:
+            self.entries.clear()
+            self.nbytes = 0
+            self.version = version
+
+    def get(self, key, version):
+        with self.lock:
+            self._check_version(version)
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, version, value):
+        size = value_bytes(value)
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            self._check_version(version)
+            if key in self.entries:
+                self.nbytes -= value_bytes(self.entries.pop(key))
+            self.entries[key] = value
+            self.nbytes += size
+            while self.nbytes > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.nbytes -= value_bytes(evicted)
+
+    def stats(self):
+        with self.lock:
+            return {"cache_hits": self.hits, "cache_misses": self.misses,
+                    "cache_entries": len(self.entries), "cache_bytes": self.nbytes}
@@ -0,0 +1,81 @@
+import unittest
+import torch
+from torch import nn
+from gaussian_renderer.render_cache import RenderCache, model_version
+from scene.cameras import MiniCam
+from scene.gaussian_model import GaussianModel
+from utils.graphics_utils import getProjectionMatrix
+
+
+def make_camera(x=0.0, width=32, height=24):
+    world_view_transform = torch.eye(4)
+    world_view_transform[3, 0] = x
+    projection_matrix = getProjectionMatrix(znear=0.01, zfar=100.0, fovX=1.0, fovY=1.0).transpose(0, 1)
+    return MiniCam(width, height, 1.0, 1.0, 0.01, 100.0, world_view_transform, world_view_transform @ projection_matrix)
+
+
+def make_model(num_points=10):
+    model = GaussianModel(1)
+    model._xyz = nn.Parameter(torch.zeros((num_points, 3)))
+    model._features_dc = nn.Parameter(torch.zeros((num_points, 1, 3)))
+    model._features_rest = nn.Parameter(torch.zeros((num_points, 3, 3)))
+    model._scaling = nn.Parameter(torch.zeros((num_points, 3)))
+    model._rotation = nn.Parameter(torch.zeros((num_points, 4)))
+    model._opacity = nn.Parameter(torch.zeros((num_points, 1)))
+    return model
+
+
+class RenderCacheTest(unittest.TestCase):
+    def test_given_nearly_identical_poses__when_looking_up__then_share_the_entry(
+        self,
+    ) -> None:
+        cache = RenderCache(quantum=1e-3)
+        cache.put(cache.key(make_camera(0.5), "raw"), 0, b"frame")
+
+        self.assertEqual(cache.get(cache.key(make_camera(0.5 + 1e-5), "raw"), 0), b"frame")
+        self.assertIsNone(cache.get(cache.key(make_camera(0.6), "raw"), 0))
+        self.assertIsNone(cache.get(cache.key(make_camera(0.5, width=64), "raw"), 0))
+        self.assertIsNone(cache.get(cache.key(make_camera(0.5), "jpeg"), 0))
+        self.assertEqual((cache.hits, cache.misses), (1, 3))
+
+    def test_given_a_byte_budget__when_storing__then_evict_the_least_recently_used_frames(
+        self,
+    ) -> None:
+        cache = RenderCache(max_bytes=300)
+        keys = [cache.key(make_camera(0.1 * i)) for i in range(4)]
+        cache.put(keys[0], 0, bytes(100))
+        cache.put(keys[1], 0, torch.zeros(25))
+        cache.put(keys[2], 0, memoryview(bytes(100)))
+        cache.get(keys[0], 0)
+        cache.put(keys[3], 0, bytes(100))
+
+        self.assertIsNone(cache.get(keys[1], 0))
+        for key in [keys[0], keys[2], keys[3]]:
+            self.assertIsNotNone(cache.get(key, 0))
+        self.assertEqual(cache.nbytes, 300)
+        cache.put(keys[1], 0, bytes(301))
+        self.assertIsNone(cache.get(keys[1], 0))
+
+    def test_given_a_changed_model__when_looking_up__then_invalidate_the_cache(
+        self,
+    ) -> None:
+        model = make_model()
+        cache = RenderCache()
+        key = cache.key(make_camera())
+        version = model_version(model)
+        cache.put(key, version, b"frame")
+        self.assertEqual(model_version(model), version)
+
+        with torch.no_grad():
+            model._xyz.add_(1.0)
+        self.assertIsNone(cache.get(key, model_version(model)))
+        self.assertEqual(cache.stats()["cache_entries"], 0)
+
+        for change in [lambda: model.oneupSHdegree(), lambda: setattr(model, "_opacity", nn.Parameter(torch.zeros((5, 1))))]:
+            version = model_version(model)
+            change()
+            self.assertNotEqual(model_version(model), version)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import torch
+from utils.general_utils import weighted_sample_without_replacement
+
+
+def voxel_unique(pts, voxel_size):
+    """
+    Indices of one point (the first one) per occupied voxel of size voxel_size.
+    """
+    coords = torch.floor(pts / voxel_size).long()
+    coords = coords - coords.min(dim=0).values
+    if coords.max() < (1 << 21):
+        keys = (coords[:, 0] << 42) | (coords[:, 1] << 21) | coords[:, 2]
+        _, inverse = torch.unique(keys, return_inverse=True)
+    else:
+        _, inverse = torch.unique(coords, dim=0, return_inverse=True)
+
+    num_points = pts.shape[0]
+    first = torch.full((int(inverse.max()) + 1,), num_points, dtype=torch.long, device=pts.device)
+    first.scatter_reduce_(0, inverse, torch.arange(num_points, device=pts.device), reduce="amin")
+    return torch.sort(first).values
+
+
+@torch.no_grad()
+def reproject_points(views, gaussians, pipe, background, num_depth, voxel_size=None, render_func=None, generator=None):
+    """
+    Sample about num_depth points from the depth renders of all views, with
+    probability 1-accum_alpha per pixel, and return them with the ground truth
+    colors of their pixels. Views are streamed one by one through render_batch
+    and sampled on the device into a preallocated buffer. Every view gets a
+    share of num_depth proportional to its number of pixels.
+
+    If voxel_size is given, only one point per voxel is kept.
+    """
+    if render_func is None:
+        from gaussian_renderer import render_batch
+        render_depth_pkgs = render_batch(views, gaussians, pipe, background, depth=True)
+    else:
+        render_depth_pkgs = (render_func(view, gaussians, pipe, background) for view in views)
+
+    num_pixels = [int(view.image_height) * int(view.image_width) for view in views]
+    total_pixels = sum(num_pixels)
+    num_samples = [int(n * num_depth / total_pixels) for n in num_pixels]
+
+    device = gaussians.get_xyz.device
+    out_pts = torch.empty((sum(num_samples), 3), device=device)
+    out_rgb = torch.empty((sum(num_samples), 3), device=device)
+
+    offset = 0
+    for view, num_sampled, render_depth_pkg in zip(views, num_samples, render_depth_pkgs):
+        prob = 1 - render_depth_pkg["accum_alpha"]
+
+        indices = weighted_sample_without_replacement(prob, num_sampled, generator=generator)
+        n = indices.shape[0]
+
+        pts = render_depth_pkg["out_pts"].reshape(3, -1)
+        gt = view.original_image[0:3, :, :].to(device).reshape(3, -1)
+        out_pts[offset:offset + n] = pts[:, indices].T
+        out_rgb[offset:offset + n] = gt[:, indices].T
+        offset += n
+
+    out_pts, out_rgb = out_pts[:offset], out_rgb[:offset]
+
+    if voxel_size is not None:
+        keep = voxel_unique(out_pts, voxel_size)
+        out_pts, out_rgb = out_pts[keep], out_rgb[keep]
+
+    return out_pts, out_rgb
@@ -0,0 +1,60 @@
+import unittest
+import torch
+from gaussian_renderer.reprojection import reproject_points, voxel_unique
+from utils.testing_utils import FakeGaussians, FakeView, fake_render
+
+
+class ReprojectPointsTest(unittest.TestCase):
+    def setUp(self) -> None:
+        torch.manual_seed(0)
+        self.gaussians = FakeGaussians(get_xyz=torch.zeros((1, 3)))
+        self.views = []
+        for _ in range(4):
+            accum_alpha = torch.rand((1, 16, 16))
+            accum_alpha[:, :4] = 1.0  # fully covered rows are never sampled
+            self.views.append(FakeView(
+                image_height=16,
+                image_width=16,
+                original_image=torch.rand((3, 16, 16)),
+                render_pkg={
+                    "out_pts": torch.rand((3, 16, 16)),
+                    "accum_alpha": accum_alpha,
+                },
+            ))
+
+    def test_given_num_depth__when_reprojecting__then_sample_pixels_with_their_points_and_colors(
+        self,
+    ) -> None:
+        pts, rgb = reproject_points(self.views, self.gaussians, None, None, num_depth=200, render_func=fake_render)
+
+        self.assertEqual(pts.shape, (200, 3))
+        self.assertEqual(rgb.shape, (200, 3))
+        for view, view_pts, view_rgb in zip(self.views, pts.split(50), rgb.split(50)):
+            all_pts = view.render_pkg["out_pts"].reshape(3, -1).T
+            all_rgb = view.original_image.reshape(3, -1).T
+            matches = (view_pts[:, None] == all_pts[None]).all(-1)
+            pixel = matches.float().argmax(-1)
+            self.assertTrue(matches.any(-1).all())
+            self.assertTrue(torch.equal(all_rgb[pixel], view_rgb))
+            self.assertTrue((pixel >= 4 * 16).all())
+
+    def test_given_a_voxel_size__when_reprojecting__then_keep_one_point_per_voxel(
+        self,
+    ) -> None:
+        pts, rgb = reproject_points(self.views, self.gaussians, None, None, num_depth=400,
+                                    voxel_size=0.25, render_func=fake_render)
+
+        voxels = torch.floor(pts / 0.25)
+        self.assertEqual(torch.unique(voxels, dim=0).shape[0], pts.shape[0])
+        self.assertEqual(rgb.shape[0], pts.shape[0])
+
+    def test_given_duplicated_points__when_hashing_voxels__then_keep_the_first_of_each(
+        self,
+    ) -> None:
+        pts = torch.tensor([[0.1, 0.1, 0.1], [5.0, 5.0, 5.0], [0.2, 0.2, 0.2], [-3.0, 0.0, 0.0]])
+
+        self.assertEqual(voxel_unique(pts, 1.0).tolist(), [0, 1, 3])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,165 @@
+import math
+import numpy as np
+import torch
+from gaussian_renderer import render
+from scene.cameras import MiniCam
+from utils.general_utils import build_scaling_rotation, strip_symmetric
+from utils.graphics_utils import getProjectionMatrix
+from utils.writer_utils import PNGWriter, to_uint8
+
+BLOCK_SIZE = 16
+
+
+def resized_camera(camera, width, height=None):
+    """
+    The same view (pose and field of view) at another resolution, the height
+    follows the aspect ratio when not given.
+    """
+    if height is None:
+        height = round(width * camera.image_height / camera.image_width)
+    return MiniCam(width, height, camera.FoVy, camera.FoVx, camera.znear, camera.zfar,
+                   camera.world_view_transform, camera.full_proj_transform)
+
+
+def tile_shear(camera, x0, y0, width, height):
+    W, H = camera.image_width, camera.image_height
+    focal_x = W / (2 * math.tan(camera.FoVx * 0.5))
+    focal_y = H / (2 * math.tan(camera.FoVy * 0.5))
+    return (x0 + width / 2 - W / 2) / focal_x, (y0 + height / 2 - H / 2) / focal_y
+
+
+def tile_camera(camera, x0, y0, width, height):
+    """
+    Camera rendering the pixels [x0, x0 + width) x [y0, y0 + height) of camera.
+
+    The rasterizers only know centered frusta, so the view space is sheared,
+    x' = x - s_x z and y' = y - s_y z, to put the tile center on the optical
+    axis. Projecting the sheared points moves the image by a constant offset,
+    the depths and (see TileGaussians) the 2D covariances stay those of the
+    full camera.
+    """
+    W, H = camera.image_width, camera.image_height
+    focal_x = W / (2 * math.tan(camera.FoVx * 0.5))
+    focal_y = H / (2 * math.tan(camera.FoVy * 0.5))
+    shear_x, shear_y = tile_shear(camera, x0, y0, width, height)
+    shear = torch.eye(4, dtype=camera.world_view_transform.dtype, device=camera.world_view_transform.device)
+    shear[2, 0] = -shear_x
+    shear[2, 1] = -shear_y
+
+    fovx = 2 * math.atan(width / (2 * focal_x))
+    fovy = 2 * math.atan(height / (2 * focal_y))
+    world_view_transform = camera.world_view_transform @ shear
+    projection_matrix = getProjectionMatrix(znear=camera.znear, zfar=camera.zfar, fovX=fovx, fovY=fovy).transpose(0, 1)
+    full_proj_transform = world_view_transform @ projection_matrix.to(world_view_transform)
+    return MiniCam(width, height, fovy, fovx, camera.znear, camera.zfar, world_view_transform, full_proj_transform)
+
+
+def tile_grid(width, height, tile_size):
+    for y0 in range(0, height, tile_size):
+        for x0 in range(0, width, tile_size):
+            yield x0, y0, min(tile_size, width - x0), min(tile_size, height - y0)
+
+
+class TileGaussians:
+    """
+    The Gaussians of pc (the visible ones if given) as the tiles of camera see
+    them. The rasterizers evaluate the Jacobian of the projection with the
+    center clamped to 1.3 tan(fov / 2) around the optical axis, which is much
+    closer for a tile than for the full image. get_covariance undoes this: a
+    view space shear (x += a z, y += b z) per Gaussian makes the clamped
+    Jacobian of the tile equal the (clamped) Jacobian of the full camera.
+    """
+
+    def __init__(self, pc, camera, visible=None):
+        select = (lambda t: t) if visible is None else (lambda t: t[visible])
+        self.get_xyz = select(pc.get_xyz)
+        self.get_opacity = select(pc.get_opacity)
+        self.get_scaling = select(pc.get_scaling)
+        self.get_rotation = select(pc.get_rotation)
+        self.get_features = select(pc.get_features)
+        self.active_sh_degree = pc.active_sh_degree
+        self.max_sh_degree = pc.max_sh_degree
+
+        view = camera.world_view_transform
+        self.world_to_view = view[:3, :3].T.to(self.get_xyz)
+        t = self.get_xyz @ view[:3, :3] + view[3, :3]
+        self.valid = t[:, 2] > 0.2
+        z = torch.where(self.valid, t[:, 2], torch.ones_like(t[:, 2]))
+        self.u, self.v = t[:, 0] / z, t[:, 1] / z
+        self.limit_x = 1.3 * math.tan(camera.FoVx * 0.5)
+        self.limit_y = 1.3 * math.tan(camera.FoVy * 0.5)
+        self.u_full = torch.clamp(self.u, -self.limit_x, self.limit_x)
+        self.v_full = torch.clamp(self.v, -self.limit_y, self.limit_y)
+        self.set_tile(camera)
+
+    def set_tile(self, camera, shear=(0.0, 0.0)):
+        self.shear = shear
+        self.tile_limit_x = 1.3 * math.tan(camera.FoVx * 0.5)
+        self.tile_limit_y = 1.3 * math.tan(camera.FoVy * 0.5)
+
+    def get_covariance(self, scaling_modifier = 1):
+        shear_x, shear_y = self.shear
+        a = shear_x + torch.clamp(self.u - shear_x, -self.tile_limit_x, self.tile_limit_x) - self.u_full
+        b = shear_y + torch.clamp(self.v - shear_y, -self.tile_limit_y, self.tile_limit_y) - self.v_full
+        B = torch.eye(3, device=a.device).repeat(a.shape[0], 1, 1)
+        B[:, 0, 2] = torch.where(self.valid, a, torch.zeros_like(a))
+        B[:, 1, 2] = torch.where(self.valid, b, torch.zeros_like(b))
+        M = torch.linalg.inv(self.world_to_view) @ B @ self.world_to_view
+        L = M @ build_scaling_rotation(scaling_modifier * self.get_scaling, self.get_rotation)
+        return strip_symmetric(L @ L.transpose(1, 2))
+
+
+class TilePipe:
+    """
+    pipe with the covariances taken from TileGaussians and without per tile culling.
+    """
+
+    compute_cov3D_python = True
+    precull = False
+
+    def __init__(self, pipe):
+        self.pipe = pipe
+
+    def __getattr__(self, name):
+        return getattr(self.pipe, name)
+
+
+@torch.no_grad()
+def render_tiled(viewpoint_camera, pc, pipe, bg_color, tile_size=1024, scaling_modifier=1.0, render_func=render):
+    """
+    Render viewpoint_camera tile by tile, yielding (x0, y0, image) for every
+    tile of at most tile_size pixels a side, the same pixels as a render of the
+    full image. The memory of the rasterizer is set by the tile size. With
+    pipe.precull, the Gaussians are culled once against the full view.
+
+    tile_size is rounded up to a multiple of the 16 pixel blocks of the
+    rasterizers: Gaussians cover whole blocks of their bounding rectangle, so
+    tiles must share the block grid of the full image.
+    """
+    tile_size = BLOCK_SIZE * math.ceil(tile_size / BLOCK_SIZE)
+    visible = pc.frustum_indices(viewpoint_camera, scaling_modifier) if pipe.precull else None
+    gaussians = TileGaussians(pc, viewpoint_camera, visible)
+    tile_pipe = TilePipe(pipe)
+    for x0, y0, width, height in tile_grid(viewpoint_camera.image_width, viewpoint_camera.image_height, tile_size):
+        camera = tile_camera(viewpoint_camera, x0, y0, width, height)
+        gaussians.set_tile(camera, tile_shear(viewpoint_camera, x0, y0, width, height))
+        yield x0, y0, render_func(camera, gaussians, tile_pipe, bg_color, scaling_modifier)["render"]
+
+
+def save_tiled(path, viewpoint_camera, pc, pipe, bg_color, tile_size=1024, scaling_modifier=1.0):
+    """
+    Render viewpoint_camera in tiles and save it as a PNG at path. Every row of
+    finished tiles is converted to 8 bit and streamed into the PNG, so neither
+    the GPU nor the host holds more than a row of tiles of the full resolution.
+    """
+    width = viewpoint_camera.image_width
+    with PNGWriter(path, width, viewpoint_camera.image_height) as writer:
+        strip, strip_y = None, None
+        for x0, y0, image in render_tiled(viewpoint_camera, pc, pipe, bg_color, tile_size, scaling_modifier):
+            tile = to_uint8(image)
+            if y0 != strip_y:
+                if strip is not None:
+                    writer.write(strip)
+                strip, strip_y = np.empty((tile.shape[0], width, 3), dtype=np.uint8), y0
+            strip[:, x0:x0 + tile.shape[1]] = tile
+        writer.write(strip)
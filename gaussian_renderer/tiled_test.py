@@ -0,0 +1,85 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import torch
+from PIL import Image
+from gaussian_renderer import render
+from gaussian_renderer.tiled import render_tiled, resized_camera, save_tiled, tile_camera
+from scene import spatial_index_test
+from utils.testing_utils import FakePipe, make_camera, make_gaussians, random_camera
+
+
+class TiledRenderTest(unittest.TestCase):
+    def setUp(self) -> None:
+        torch.manual_seed(0)
+        n = 60
+        self.gaussians = make_gaussians(
+            torch.cat([torch.rand(n, 2) * 4 - 2, torch.rand(n, 1) * 3 + 2], 1).tolist(),
+            (torch.rand(n, 3) * 0.2 + 0.02).tolist(), torch.rand(n, 3).tolist(), (torch.rand(n) * 0.9 + 0.1).tolist())
+        self.camera = make_camera(50, 38, t=np.array([0.1, -0.2, 0.3]))
+        self.background = torch.tensor([0.2, 0.1, 0.0])
+
+    def stitch(self, tiles):
+        image = torch.zeros((3, self.camera.image_height, self.camera.image_width))
+        for x0, y0, tile in tiles:
+            image[:, y0:y0 + tile.shape[1], x0:x0 + tile.shape[2]] = tile
+        return image
+
+    def test_given_a_tile__when_rendering_it__then_match_the_crop_of_the_full_image(
+        self,
+    ) -> None:
+        full = render(self.camera, self.gaussians, FakePipe(), self.background)["render"]
+
+        tile = render(tile_camera(self.camera, 16, 0, 32, 16), self.gaussians, FakePipe(), self.background)["render"]
+
+        self.assertEqual(tile.shape, (3, 16, 32))
+        self.assertEqual(tile_camera(self.camera, 0, 0, 50, 38).world_view_transform.tolist(), self.camera.world_view_transform.tolist())
+        # Gaussians far outside the tile differ through the clamped Jacobian, covered by TileGaussians
+        self.assertTrue(torch.allclose(tile, full[:, 0:16, 16:48], atol=1e-2))
+
+    def test_given_tiles__when_stitching__then_match_the_full_image(
+        self,
+    ) -> None:
+        full = render(self.camera, self.gaussians, FakePipe(), self.background)["render"]
+
+        for tile_size, num_tiles in [(16, 4 * 3), (10, 4 * 3), (40, 2 * 1)]:
+            tiles = list(render_tiled(self.camera, self.gaussians, FakePipe(), self.background, tile_size=tile_size))
+            self.assertEqual(len(tiles), num_tiles)
+            self.assertTrue(torch.allclose(self.stitch(tiles), full, atol=1e-4))
+
+    def test_given_precull__when_rendering_in_tiles__then_match_the_full_image(
+        self,
+    ) -> None:
+        model = spatial_index_test.make_model(2_000)
+        camera = random_camera(2, width=45, height=40)
+        with torch.no_grad():
+            full = render(camera, model, FakePipe(), self.background)["render"]
+
+        tiles = list(render_tiled(camera, model, FakePipe(precull=True), self.background, tile_size=16))
+
+        image = torch.zeros_like(full)
+        for x0, y0, tile in tiles:
+            image[:, y0:y0 + tile.shape[1], x0:x0 + tile.shape[2]] = tile
+        self.assertTrue(torch.allclose(image, full, atol=1e-4))
+
+    def test_given_an_output_path__when_saving_in_tiles__then_write_the_upscaled_view(
+        self,
+    ) -> None:
+        camera = resized_camera(self.camera, 100)
+        with torch.no_grad():
+            full = render(camera, self.gaussians, FakePipe(), self.background)["render"]
+        expected = full.mul(255).add_(0.5).clamp_(0, 255).permute(1, 2, 0).to(torch.uint8).numpy()
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "out.png")
+            save_tiled(path, camera, self.gaussians, FakePipe(), self.background, tile_size=32)
+            image = np.array(Image.open(path))
+            self.assertEqual(os.listdir(directory), ["out.png"])
+
+        self.assertEqual(image.shape, (76, 100, 3))
+        self.assertLessEqual(np.abs(image.astype(int) - expected.astype(int)).max(), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,345 @@
+#
+# Pure PyTorch port of the tile rasterizers in submodules/diff-gaussian-rasterization*.
+# It follows the CUDA kernels step by step (frustum culling, EWA projection,
+# 16x16 tile binning, front to back blending with early termination), so it
+# can stand in for them on machines without a GPU. Gradients come from autograd.
+#
+
+from typing import NamedTuple
+import torch
+import torch.nn as nn
+from utils.sh_utils import eval_sh
+
+BLOCK_X = 16
+BLOCK_Y = 16
+
+
+class GaussianRasterizationSettings(NamedTuple):
+    image_height: int
+    image_width: int
+    tanfovx : float
+    tanfovy : float
+    bg : torch.Tensor
+    scale_modifier : float
+    viewmatrix : torch.Tensor
+    projmatrix : torch.Tensor
+    sh_degree : int
+    campos : torch.Tensor
+    prefiltered : bool
+    debug : bool
+
+
+def quaternion_to_rotation(q):
+    r, x, y, z = q.unbind(-1)
+    return torch.stack([
+        1 - 2 * (y*y + z*z), 2 * (x*y - r*z), 2 * (x*z + r*y),
+        2 * (x*y + r*z), 1 - 2 * (x*x + z*z), 2 * (y*z - r*x),
+        2 * (x*z - r*y), 2 * (y*z + r*x), 1 - 2 * (x*x + y*y)], dim=-1).reshape(-1, 3, 3)
+
+
+def unpack_covariance(c):
+    """
+    (N, 3, 3) covariances from their 6 upper triangle values, as stored in
+    cov3D_precomp.
+    """
+    return torch.stack([c[:, 0], c[:, 1], c[:, 2],
+                        c[:, 1], c[:, 3], c[:, 4],
+                        c[:, 2], c[:, 4], c[:, 5]], dim=-1).reshape(-1, 3, 3)
+
+
+def preprocess(means3D, means2D, opacities, shs, colors_precomp, scales, rotations, cov3D_precomp, raster_settings):
+    """
+    Per Gaussian part of the pipeline (preprocessCUDA). Returns the indices of
+    the visible Gaussians, the integer radii of all Gaussians and a dict with
+    the screen space quantities of the visible ones.
+    """
+    settings = raster_settings
+    W, H = settings.image_width, settings.image_height
+    grid_x = (W + BLOCK_X - 1) // BLOCK_X
+    grid_y = (H + BLOCK_Y - 1) // BLOCK_Y
+    P = means3D.shape[0]
+    radii = torch.zeros(P, dtype=torch.int32, device=means3D.device)
+
+    # near plane culling, computed on the subset only so no inf reaches autograd
+    p_orig = torch.cat([means3D, torch.ones_like(means3D[:, :1])], dim=1)
+    with torch.no_grad():
+        idx = torch.nonzero((p_orig @ settings.viewmatrix)[:, 2] > 0.2).squeeze(1)
+    p_orig = p_orig[idx]
+    p_view = p_orig @ settings.viewmatrix
+    p_hom = p_orig @ settings.projmatrix
+    p_proj = p_hom[:, :3] / (p_hom[:, 3:4] + 0.0000001)
+
+    if cov3D_precomp is not None:
+        cov3D = unpack_covariance(cov3D_precomp[idx])
+    else:
+        L = quaternion_to_rotation(rotations[idx]) * (settings.scale_modifier * scales[idx])[:, None, :]
+        cov3D = L @ L.transpose(1, 2)
+
+    # EWA splatting, with the same clamping of the Jacobian as the kernel
+    focal_x = W / (2.0 * settings.tanfovx)
+    focal_y = H / (2.0 * settings.tanfovy)
+    limx = 1.3 * settings.tanfovx
+    limy = 1.3 * settings.tanfovy
+    tz = p_view[:, 2]
+    tx = torch.clamp(p_view[:, 0] / tz, -limx, limx) * tz
+    ty = torch.clamp(p_view[:, 1] / tz, -limy, limy) * tz
+    zeros = torch.zeros_like(tz)
+    J = torch.stack([focal_x / tz, zeros, -(focal_x * tx) / (tz * tz),
+                     zeros, focal_y / tz, -(focal_y * ty) / (tz * tz)], dim=-1).reshape(-1, 2, 3)
+    T = J @ settings.viewmatrix[:3, :3].T
+    cov2D = T @ cov3D @ T.transpose(1, 2)
+    a = cov2D[:, 0, 0] + 0.3
+    b = cov2D[:, 0, 1]
+    c = cov2D[:, 1, 1] + 0.3
+    det = a * c - b * b
+
+    mid = 0.5 * (a + c)
+    lambda1 = mid + torch.sqrt(torch.clamp_min(mid * mid - det, 0.1))
+    lambda2 = mid - torch.sqrt(torch.clamp_min(mid * mid - det, 0.1))
+    radius = torch.ceil(3.0 * torch.sqrt(torch.maximum(lambda1, lambda2))).detach()
+    # means2D only shifts the projection, so its gradient is the one w.r.t. NDC as in the kernel
+    ndc = p_proj[:, :2] + means2D[idx, :2]
+    point_image = torch.stack([((ndc[:, 0] + 1.0) * W - 1.0) * 0.5,
+                               ((ndc[:, 1] + 1.0) * H - 1.0) * 0.5], dim=-1)
+
+    with torch.no_grad():
+        px, py = point_image[:, 0], point_image[:, 1]
+        rect_min_x = torch.trunc((px - radius) / BLOCK_X).clamp(0, grid_x).long()
+        rect_min_y = torch.trunc((py - radius) / BLOCK_Y).clamp(0, grid_y).long()
+        rect_max_x = torch.trunc((px + radius + BLOCK_X - 1) / BLOCK_X).clamp(0, grid_x).long()
+        rect_max_y = torch.trunc((py + radius + BLOCK_Y - 1) / BLOCK_Y).clamp(0, grid_y).long()
+        num_tiles = (rect_max_x - rect_min_x) * (rect_max_y - rect_min_y)
+        visible = torch.nonzero((det != 0) & (num_tiles > 0)).squeeze(1)
+
+    det_inv = 1.0 / det[visible]
+    conic = torch.stack([c[visible] * det_inv, -b[visible] * det_inv, a[visible] * det_inv], dim=-1)
+    vis_idx = idx[visible]
+    radii[vis_idx] = radius[visible].int()
+
+    if colors_precomp is not None:
+        colors = colors_precomp[vis_idx]
+    else:
+        dirs = means3D[vis_idx] - settings.campos
+        dirs = dirs / dirs.norm(dim=1, keepdim=True)
+        colors = torch.clamp_min(eval_sh(settings.sh_degree, shs[vis_idx].transpose(1, 2), dirs) + 0.5, 0.0)
+
+    return vis_idx, radii, {
+        "xy": point_image[visible],
+        "depth": tz[visible].detach(),
+        "conic": conic,
+        "opacity": opacities[vis_idx, 0],
+        "colors": colors,
+        "rect_min": (rect_min_x[visible], rect_min_y[visible]),
+        "rect_max": (rect_max_x[visible], rect_max_y[visible]),
+        "grid": (grid_x, grid_y),
+    }
+
+
+@torch.no_grad()
+def bin_tiles(points):
+    """
+    Duplicate every visible Gaussian once per tile it touches and sort the
+    copies by tile, then by depth. Returns the sorted Gaussian indices and the
+    end offset of every tile in them.
+    """
+    (min_x, min_y), (max_x, max_y) = points["rect_min"], points["rect_max"]
+    grid_x, grid_y = points["grid"]
+    device = min_x.device
+    width = max_x - min_x
+    num_tiles = width * (max_y - min_y)
+
+    gauss = torch.repeat_interleave(torch.arange(num_tiles.shape[0], device=device), num_tiles)
+    starts = torch.cumsum(num_tiles, 0) - num_tiles
+    local = torch.arange(gauss.shape[0], device=device) - starts[gauss]
+    tile = (min_y[gauss] + local // width[gauss]) * grid_x + min_x[gauss] + local % width[gauss]
+
+    order = torch.sort(points["depth"][gauss], stable=True).indices
+    gauss, tile = gauss[order], tile[order]
+    order = torch.sort(tile, stable=True).indices
+    gauss, tile = gauss[order], tile[order]
+
+    ranges_end = torch.cumsum(torch.bincount(tile, minlength=grid_x * grid_y), 0)
+    return gauss, ranges_end
+
+
+def rasterize(means3D, means2D, opacities, shs, colors_precomp, scales, rotations, cov3D_precomp,
+              raster_settings, chunk_size=1024, importance=False, depth=False):
+    """
+    Render the Gaussians tile by tile. Every tile blends its depth sorted
+    Gaussians in chunks of chunk_size, each chunk vectorized over the pixels
+    of the tile, which bounds the memory to chunk_size x 256 values.
+
+    importance adds the accum_weights / area_proj / area_max outputs of the
+    _ms rasterizer, depth the outputs of its render_depth.
+    """
+    settings = raster_settings
+    W, H = settings.image_width, settings.image_height
+    device = means3D.device
+    P = means3D.shape[0]
+    vis_idx, radii, points = preprocess(means3D, means2D, opacities, shs, colors_precomp,
+                                        scales, rotations, cov3D_precomp, settings)
+    gauss, ranges_end = bin_tiles(points)
+    grid_x, _ = points["grid"]
+
+    color = settings.bg[:, None, None].repeat(1, H, W)
+    out = {}
+    if importance:
+        out["accum_weights"] = torch.zeros(P, device=device)
+        out["area_proj"] = torch.zeros(P, dtype=torch.int32, device=device)
+        out["area_max"] = torch.zeros(P, device=device)
+    if depth:
+        out["out_pts"] = torch.zeros((3, H, W), device=device)
+        out["rendered_depth"] = torch.zeros((1, H, W), device=device)
+        out["discriminants"] = torch.zeros((1, H, W), device=device)
+        out["gidx"] = torch.zeros((1, H, W), dtype=torch.int32, device=device)
+        out["accum_alpha"] = torch.ones((1, H, W), device=device)
+        with torch.no_grad():
+            # ray / ellipsoid intersection is done in the frame of each Gaussian, with 3 sigma radii
+            if cov3D_precomp is not None:
+                # the eigenvectors of the covariance are the axes of the frame, its eigenvalues the squared scales
+                eigenvalues, eigenvectors = torch.linalg.eigh(unpack_covariance(cov3D_precomp[vis_idx]).double())
+                rot_t = eigenvectors.transpose(1, 2).float()
+                inv_radius = (1.0 / (3.0 * torch.sqrt(torch.clamp_min(eigenvalues, 1e-20)))).float()
+            else:
+                rot_t = quaternion_to_rotation(rotations[vis_idx]).transpose(1, 2)
+                inv_radius = 1.0 / (3.0 * scales[vis_idx])
+            ray_origin = torch.einsum("gij,gj->gi", rot_t, settings.campos - means3D[vis_idx]) * inv_radius
+            projmatrix_inv = torch.inverse(settings.projmatrix)
+
+    counts = torch.diff(ranges_end, prepend=ranges_end.new_zeros(1))
+    tiles = torch.nonzero(counts).squeeze(1)
+    for tile, start, end in zip(tiles.tolist(), (ranges_end - counts)[tiles].tolist(), ranges_end[tiles].tolist()):
+        ty, tx = divmod(tile, grid_x)
+        x0, y0 = tx * BLOCK_X, ty * BLOCK_Y
+        x1, y1 = min(x0 + BLOCK_X, W), min(y0 + BLOCK_Y, H)
+        pix_y, pix_x = torch.meshgrid(torch.arange(y0, y1, device=device, dtype=torch.float32),
+                                      torch.arange(x0, x1, device=device, dtype=torch.float32), indexing="ij")
+        pix_x, pix_y = pix_x.reshape(-1), pix_y.reshape(-1)
+        num_pix = pix_x.shape[0]
+
+        T = torch.ones(num_pix, device=device)
+        C = torch.zeros((num_pix, 3), device=device)
+        done = torch.zeros(num_pix, dtype=torch.bool, device=device)
+        weight_max = torch.zeros(num_pix, device=device)
+        weight_idx = torch.zeros(num_pix, dtype=torch.long, device=device)
+        if depth:
+            with torch.no_grad():
+                ndc_x = (pix_x * 2.0 + 1.0) / W - 1.0
+                ndc_y = (pix_y * 2.0 + 1.0) / H - 1.0
+                p_hom = torch.stack([ndc_x * 1.0000001, ndc_y * 1.0000001,
+                                     torch.full_like(ndc_x, (100 + 0.01 - 1) / (100 - 0.01)),
+                                     torch.ones_like(ndc_x)], dim=-1)
+                ray_direction = (p_hom @ projmatrix_inv)[:, :3] - settings.campos
+                ray_length = ray_direction.norm(dim=-1)
+                ray_direction_n = ray_direction / ray_length[:, None]
+                pts_max = torch.zeros((num_pix, 3), device=device)
+                depth_max = torch.zeros(num_pix, device=device)
+                disc_max = torch.zeros(num_pix, device=device)
+
+        for ids in gauss[start:end].split(chunk_size):
+            d_x = points["xy"][ids, 0:1] - pix_x[None]
+            d_y = points["xy"][ids, 1:2] - pix_y[None]
+            conic = points["conic"][ids]
+            power = -0.5 * (conic[:, 0:1] * d_x * d_x + conic[:, 2:3] * d_y * d_y) - conic[:, 1:2] * d_x * d_y
+            alpha = torch.clamp_max(points["opacity"][ids, None] * torch.exp(power), 0.99)
+            alpha = torch.where((power <= 0) & (alpha >= 1.0 / 255.0), alpha, torch.zeros_like(alpha))
+
+            if depth:
+                with torch.no_grad():
+                    rd = torch.einsum("gij,pj->gpi", rot_t[ids], ray_direction_n) * inv_radius[ids, None]
+                    ro = ray_origin[ids, None]
+                    qa = (rd * rd).sum(-1)
+                    qb = 2 * (rd * ro).sum(-1)
+                    qc = (ro * ro).sum(-1) - 1
+                    discriminant = qb * qb - 4 * qa * qc
+                    t = -qb / (2 * qa)
+                    hit_depth = t / ray_length[None]
+                    front = hit_depth >= 0
+                # Gaussians behind the camera are blended but do not attenuate T
+                update = alpha * front
+            else:
+                update = alpha
+
+            one_minus = 1.0 - update
+            T_before = T[None] * torch.cat([torch.ones_like(one_minus[:1]), torch.cumprod(one_minus, 0)[:-1]])
+            with torch.no_grad():
+                fails = (T_before * (1.0 - alpha) < 0.0001) & (alpha > 0)
+                valid = (torch.cumsum(fails.int(), 0) == 0) & ~done[None]
+            weight = alpha * T_before * valid
+            C = C + weight.T @ points["colors"][ids]
+            T = T * torch.prod(torch.where(valid, one_minus, torch.ones_like(one_minus)), 0)
+
+            with torch.no_grad():
+                done = done | fails.any(0)
+                contrib = weight.detach() * front if depth else weight.detach()
+                chunk_max, chunk_arg = contrib.max(0)
+                better = chunk_max > weight_max
+                weight_max = torch.where(better, chunk_max, weight_max)
+                weight_idx = torch.where(better, vis_idx[ids][chunk_arg], weight_idx)
+                if importance:
+                    out["accum_weights"].index_add_(0, vis_idx[ids], weight.detach().sum(1))
+                    out["area_proj"].index_add_(0, vis_idx[ids], (valid & (alpha > 0)).sum(1).int())
+                if depth:
+                    pix = torch.arange(num_pix, device=device)
+                    t_max = t[chunk_arg, pix]
+                    pts_max = torch.where(better[:, None], settings.campos + t_max[:, None] * ray_direction_n, pts_max)
+                    depth_max = torch.where(better, hit_depth[chunk_arg, pix], depth_max)
+                    disc_max = torch.where(better, discriminant[chunk_arg, pix], disc_max)
+
+            if bool(done.all()):
+                break
+
+        color[:, y0:y1, x0:x1] = (C + T[:, None] * settings.bg).T.reshape(3, y1 - y0, x1 - x0)
+        with torch.no_grad():
+            if importance:
+                out["area_max"].index_add_(0, weight_idx[weight_max > 0], torch.ones_like(weight_max[weight_max > 0]))
+            if depth:
+                hit = weight_max > 0
+                out["out_pts"][:, y0:y1, x0:x1] = (pts_max * hit[:, None]).T.reshape(3, y1 - y0, x1 - x0)
+                out["rendered_depth"][0, y0:y1, x0:x1] = (depth_max * hit).reshape(y1 - y0, x1 - x0)
+                out["discriminants"][0, y0:y1, x0:x1] = (disc_max * hit).reshape(y1 - y0, x1 - x0)
+                out["gidx"][0, y0:y1, x0:x1] = (weight_idx * hit).int().reshape(y1 - y0, x1 - x0)
+                out["accum_alpha"][0, y0:y1, x0:x1] = T.detach().reshape(y1 - y0, x1 - x0)
+
+    return color, radii, out
+
+
+class GaussianRasterizer(nn.Module):
+    """
+    Drop-in replacement for the GaussianRasterizer of diff_gaussian_rasterization_ms.
+    Calling it returns (color, radii, accum_weights, area_proj, area_max), the
+    first two being the outputs of the plain diff_gaussian_rasterization one.
+    """
+    def __init__(self, raster_settings, chunk_size=1024):
+        super().__init__()
+        self.raster_settings = raster_settings
+        self.chunk_size = chunk_size
+
+    def _inputs(self, means3D, means2D, opacities, shs, colors_precomp, scales, rotations, cov3D_precomp):
+        empty = lambda t: t is None or t.numel() == 0
+        if empty(shs) == empty(colors_precomp):
+            raise Exception('Please provide excatly one of either SHs or precomputed colors!')
+        if (empty(scales) or empty(rotations)) == empty(cov3D_precomp):
+            raise Exception('Please provide exactly one of either scale/rotation pair or precomputed 3D covariance!')
+        return (means3D, means2D, opacities,
+                None if empty(shs) else shs,
+                None if empty(colors_precomp) else colors_precomp,
+                None if empty(scales) else scales,
+                None if empty(rotations) else rotations,
+                None if empty(cov3D_precomp) else cov3D_precomp)
+
+    def forward(self, means3D, means2D, opacities, shs = None, colors_precomp = None, scales = None, rotations = None, cov3D_precomp = None):
+        color, radii, out = rasterize(*self._inputs(means3D, means2D, opacities, shs, colors_precomp, scales, rotations, cov3D_precomp),
+                                      self.raster_settings, chunk_size=self.chunk_size, importance=True)
+        return color, radii, out["accum_weights"], out["area_proj"], out["area_max"]
+
+    def render_depth(self, means3D, means2D, opacities, shs = None, colors_precomp = None, scales = None, rotations = None, cov3D_precomp = None):
+        color, radii, out = rasterize(*self._inputs(means3D, means2D, opacities, shs, colors_precomp, scales, rotations, cov3D_precomp),
+                                      self.raster_settings, chunk_size=self.chunk_size, depth=True)
+        return {"render": color,
+                "out_pts": out["out_pts"],
+                "rendered_depth": out["rendered_depth"],
+                "discriminants": out["discriminants"],
+                "gidx": out["gidx"],
+                "accum_alpha": out["accum_alpha"],
+                }
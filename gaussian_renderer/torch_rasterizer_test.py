@@ -0,0 +1,207 @@
+import math
+import unittest
+import numpy as np
+import torch
+from gaussian_renderer import render, render_imp, render_depth, render_batch
+from gaussian_renderer.torch_rasterizer import preprocess, GaussianRasterizationSettings
+from utils.testing_utils import FakePipe, make_camera, make_gaussians
+
+
+def reference_render(camera, gaussians, background):
+    # the per pixel loop of renderCUDA, over the same preprocessed Gaussians
+    settings = GaussianRasterizationSettings(
+        camera.image_height, camera.image_width, math.tan(camera.FoVx * 0.5), math.tan(camera.FoVy * 0.5),
+        background, 1.0, camera.world_view_transform, camera.full_proj_transform, 0, camera.camera_center, False, False)
+    with torch.no_grad():
+        vis_idx, _, points = preprocess(gaussians.get_xyz, torch.zeros_like(gaussians.get_xyz), gaussians.get_opacity,
+                                        gaussians.get_features, None, gaussians.get_scaling, gaussians.get_rotation, None, settings)
+    order = torch.argsort(points["depth"]).tolist()
+    P = gaussians.get_xyz.shape[0]
+    image = torch.zeros((3, camera.image_height, camera.image_width))
+    accum_weights, area_proj, area_max = torch.zeros(P), torch.zeros(P, dtype=torch.int32), torch.zeros(P)
+    for y in range(camera.image_height):
+        for x in range(camera.image_width):
+            T, C, weight_max, idx_max = 1.0, torch.zeros(3), 0.0, None
+            for g in order:
+                if not (points["rect_min"][0][g] <= x // 16 < points["rect_max"][0][g]
+                        and points["rect_min"][1][g] <= y // 16 < points["rect_max"][1][g]):
+                    continue
+                d = points["xy"][g] - torch.tensor([x, y], dtype=torch.float32)
+                con = points["conic"][g]
+                power = (-0.5 * (con[0] * d[0] * d[0] + con[2] * d[1] * d[1]) - con[1] * d[0] * d[1]).item()
+                if power > 0:
+                    continue
+                alpha = min(0.99, points["opacity"][g].item() * math.exp(power))
+                if alpha < 1.0 / 255.0:
+                    continue
+                if T * (1 - alpha) < 0.0001:
+                    break
+                C += points["colors"][g].detach() * alpha * T
+                accum_weights[vis_idx[g]] += alpha * T
+                area_proj[vis_idx[g]] += 1
+                if weight_max < alpha * T:
+                    weight_max, idx_max = alpha * T, vis_idx[g]
+                T = T * (1 - alpha)
+            if idx_max is not None:
+                area_max[idx_max] += 1
+            image[:, y, x] = C + T * background
+    return image, accum_weights, area_proj, area_max
+
+
+class TorchRasterizerTest(unittest.TestCase):
+    def setUp(self) -> None:
+        torch.manual_seed(0)
+        self.camera = make_camera()
+        self.background = torch.tensor([0.1, 0.2, 0.3])
+
+    def test_given_a_gaussian_on_the_optical_axis__when_rendering__then_it_covers_the_image_center(
+        self,
+    ) -> None:
+        gaussians = make_gaussians([[0, 0, 4], [0, 0, -4]], [[0.3] * 3] * 2, [[1, 0, 0]] * 2, [0.99, 0.99])
+
+        pkg = render(self.camera, gaussians, FakePipe(), self.background)
+
+        self.assertEqual(pkg["render"].shape, (3, 36, 40))
+        self.assertEqual(pkg["radii"][1].item(), 0)
+        self.assertGreater(pkg["radii"][0].item(), 0)
+        self.assertGreater(pkg["render"][0, 18, 20].item(), 0.9)
+        self.assertTrue((pkg["render"][1:, 18, 20] < 0.05).all())
+        self.assertTrue(torch.allclose(pkg["render"][:, 0, 0], self.background))
+
+    def test_given_overlapping_gaussians__when_rendering_in_chunks__then_match_the_per_pixel_loop(
+        self,
+    ) -> None:
+        n = 40
+        gaussians = make_gaussians(
+            torch.cat([torch.rand(n, 2) * 3 - 1.5, torch.rand(n, 1) * 3 + 2], 1).tolist(),
+            (torch.rand(n, 3) * 0.3 + 0.05).tolist(), torch.rand(n, 3).tolist(), (torch.rand(n) * 0.9 + 0.1).tolist())
+
+        pkg = render_imp(self.camera, gaussians, FakePipe(), self.background)
+        with torch.no_grad():
+            pkg_chunked = self.render_chunked(gaussians, chunk_size=3)
+        image, accum_weights, area_proj, area_max = reference_render(self.camera, gaussians, self.background)
+
+        for out in [pkg["render"], pkg_chunked]:
+            self.assertTrue(torch.allclose(out, image, atol=1e-4))
+        self.assertTrue(torch.allclose(pkg["accum_weights"], accum_weights, atol=1e-3))
+        self.assertTrue(torch.equal(pkg["area_proj"], area_proj))
+        self.assertTrue(torch.equal(pkg["area_max"], area_max))
+
+    def render_chunked(self, gaussians, chunk_size):
+        from gaussian_renderer.torch_rasterizer import rasterize
+        settings = GaussianRasterizationSettings(
+            36, 40, math.tan(self.camera.FoVx * 0.5), math.tan(self.camera.FoVy * 0.5), self.background, 1.0,
+            self.camera.world_view_transform, self.camera.full_proj_transform, 0, self.camera.camera_center, False, False)
+        color, _, _ = rasterize(gaussians.get_xyz, torch.zeros_like(gaussians.get_xyz), gaussians.get_opacity,
+                                gaussians.get_features, None, gaussians.get_scaling, gaussians.get_rotation, None,
+                                settings, chunk_size=chunk_size)
+        return color
+
+    def test_given_a_loss_on_the_image__when_backpropagating__then_visible_gaussians_get_gradients(
+        self,
+    ) -> None:
+        gaussians = make_gaussians([[0.2, 0, 4], [-0.3, 0.1, 3], [0, 0, -4]], [[0.3] * 3] * 3,
+                                   [[1, 0, 0], [0, 1, 0], [0, 0, 1]], [0.5, 0.5, 0.5], requires_grad=True)
+
+        pkg = render(self.camera, gaussians, FakePipe(), self.background)
+        pkg["render"].sum().backward()
+
+        viewspace_grad = pkg["viewspace_points"].grad[:, :2].norm(dim=-1)
+        self.assertTrue((viewspace_grad[:2] > 0).all())
+        self.assertEqual(viewspace_grad[2].item(), 0)
+        self.assertTrue((gaussians.get_opacity.grad[:2] != 0).all())
+        self.assertTrue((gaussians.get_xyz.grad[:2] != 0).any(-1).all())
+
+    def test_given_an_axis_aligned_gaussian__when_rendering_depth__then_points_lie_on_its_center_along_the_ray(
+        self,
+    ) -> None:
+        gaussians = make_gaussians([[0, 0, 4]], [[0.3] * 3], [[1, 1, 1]], [0.99])
+        gaussians = gaussians._replace(get_rotation=torch.tensor([[1.0, 0, 0, 0]]))
+
+        pkg = render_depth(self.camera, gaussians, FakePipe(), self.background)
+
+        self.assertEqual(pkg["out_pts"].shape, (3, 36, 40))
+        center = pkg["out_pts"][:, 18, 20]
+        # the kernel keeps the point of the ray closest to the center in the ellipsoid metric
+        self.assertTrue(torch.allclose(center, torch.tensor([0.0, 0.0, 4.0]), atol=0.1))
+        self.assertGreater(pkg["rendered_depth"][0, 18, 20].item(), 0)
+        self.assertLess(pkg["accum_alpha"][0, 18, 20].item(), 0.1)
+        self.assertEqual(pkg["accum_alpha"][0, 0, 0].item(), 1.0)
+        self.assertTrue(torch.equal(pkg["out_pts"][:, 0, 0], torch.zeros(3)))
+
+    def test_given_precomputed_covariances__when_rendering_depth__then_match_the_scale_rotation_pair(
+        self,
+    ) -> None:
+        torch.manual_seed(0)
+        gaussians = make_gaussians([[0, 0, 4], [0.3, -0.2, 3]], [[0.3, 0.2, 0.1], [0.1, 0.4, 0.2]],
+                                   [[1, 0, 0], [0, 1, 0]], [0.9, 0.7])
+
+        pkg = render_depth(self.camera, gaussians, FakePipe(compute_cov3D_python=True), self.background)
+
+        expected = render_depth(self.camera, gaussians, FakePipe(), self.background)
+        for key in ["out_pts", "rendered_depth", "discriminants", "accum_alpha"]:
+            self.assertTrue(torch.allclose(pkg[key], expected[key], atol=1e-4), key)
+        self.assertTrue(torch.equal(pkg["gidx"], expected["gidx"]))
+
+
+class RenderBatchTest(unittest.TestCase):
+    def setUp(self) -> None:
+        torch.manual_seed(0)
+        self.cameras = [make_camera(), make_camera(t=np.array([0.3, 0.0, 0.5])), make_camera(32, 24, t=np.array([0.0, -0.2, 0.0]))]
+        n = 30
+        self.gaussians = make_gaussians(
+            torch.cat([torch.rand(n, 2) * 3 - 1.5, torch.rand(n, 1) * 3 + 2], 1).tolist(),
+            (torch.rand(n, 3) * 0.3 + 0.05).tolist(), torch.rand(n, 3).tolist(), (torch.rand(n) * 0.9 + 0.1).tolist())
+        self.background = torch.tensor([0.0, 0.0, 0.0])
+
+    def test_given_several_cameras__when_rendering_a_batch__then_match_rendering_one_view_at_a_time(
+        self,
+    ) -> None:
+        for pipe in [FakePipe(), FakePipe(convert_SHs_python=True, compute_cov3D_python=True)]:
+            pkgs = list(render_batch(self.cameras, self.gaussians, pipe, self.background))
+
+            self.assertEqual(len(pkgs), len(self.cameras))
+            for camera, pkg in zip(self.cameras, pkgs):
+                expected = render_imp(camera, self.gaussians, pipe, self.background)
+                self.assertTrue(torch.allclose(pkg["render"], expected["render"], atol=1e-5))
+                for key in ["radii", "area_proj", "area_max"]:
+                    self.assertTrue(torch.equal(pkg[key], expected[key]))
+
+    def test_given_stats_only__when_rendering_a_batch__then_yield_the_statistics_without_images(
+        self,
+    ) -> None:
+        for pipe in [FakePipe(), FakePipe(convert_SHs_python=True)]:
+            pkgs = list(render_batch(self.cameras, self.gaussians, pipe, self.background, stats_only=True))
+
+            self.assertNotIn("render", pkgs[0])
+            self.assertEqual(pkgs[0]["accum_weights"].shape, (30,))
+            # the statistics do not need the colors
+            for camera, pkg in zip(self.cameras, pkgs):
+                expected = render_imp(camera, self.gaussians, pipe, self.background)
+                self.assertTrue(torch.allclose(pkg["accum_weights"], expected["accum_weights"], atol=1e-6))
+                for key in ["radii", "area_proj", "area_max"]:
+                    self.assertTrue(torch.equal(pkg[key], expected[key]))
+
+    def test_given_depth__when_rendering_a_batch__then_match_render_depth(
+        self,
+    ) -> None:
+        for pipe in [FakePipe(), FakePipe(compute_cov3D_python=True)]:
+            for camera, pkg in zip(self.cameras, render_batch(self.cameras, self.gaussians, pipe, self.background, depth=True)):
+                expected = render_depth(camera, self.gaussians, pipe, self.background)
+                self.assertTrue(torch.allclose(pkg["out_pts"], expected["out_pts"]))
+                self.assertTrue(torch.allclose(pkg["accum_alpha"], expected["accum_alpha"]))
+
+    def test_given_no_importance__when_rendering_a_batch__then_match_render_without_the_statistics(
+        self,
+    ) -> None:
+        pkgs = list(render_batch(self.cameras, self.gaussians, FakePipe(), self.background, importance=False))
+
+        self.assertNotIn("accum_weights", pkgs[0])
+        for camera, pkg in zip(self.cameras, pkgs):
+            expected = render(camera, self.gaussians, FakePipe(), self.background)
+            self.assertTrue(torch.allclose(pkg["render"], expected["render"], atol=1e-5))
+            self.assertTrue(torch.equal(pkg["radii"], expected["radii"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
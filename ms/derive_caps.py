@@ -0,0 +1,131 @@
+import os
+import sys
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.abspath(os.path.join(BASE_DIR, '..')))
+
+import copy
+import torch
+from random import randint
+from tqdm import tqdm
+from argparse import ArgumentParser, Namespace
+from scene import Scene, GaussianModel
+from gaussian_renderer import render_imp, render_batch
+from gaussian_renderer.importance import ImportanceAccumulator
+from utils.loss_utils import l1_loss, ssim
+from utils.image_utils import psnr
+from utils.general_utils import safe_state
+from arguments import ModelParams, PipelineParams, OptimizationParams, get_combined_args
+
+
+def finetune(scene, gaussians, opt, pipe, background, iterations):
+    # continue on the tail of the position lr schedule, the model is already converged
+    first_iter = max(opt.position_lr_max_steps - iterations, 0)
+    viewpoint_stack = None
+    for iteration in tqdm(range(first_iter, first_iter + iterations), desc="Fine-tuning"):
+        gaussians.update_learning_rate(iteration)
+
+        if not viewpoint_stack:
+            viewpoint_stack = scene.getTrainCameras().copy()
+        viewpoint_cam = viewpoint_stack.pop(randint(0, len(viewpoint_stack)-1))
+
+        image = render_imp(viewpoint_cam, gaussians, pipe, background)["render"]
+        gt_image = viewpoint_cam.original_image.cuda()
+        Ll1 = l1_loss(image, gt_image)
+        loss = (1.0 - opt.lambda_dssim) * Ll1 + opt.lambda_dssim * (1.0 - ssim(image, gt_image))
+        loss.backward()
+
+        with torch.no_grad():
+            gaussians.optimizer.step()
+            gaussians.optimizer.zero_grad(set_to_none = True)
+
+
+@torch.no_grad()
+def evaluate_psnr(views, gaussians, pipe, background):
+    if len(views) == 0:
+        return None
+    psnr_test = 0.0
+    for view, render_pkg in zip(views, render_batch(views, gaussians, pipe, background)):
+        image = torch.clamp(render_pkg["render"], 0.0, 1.0)
+        gt_image = torch.clamp(view.original_image.to("cuda"), 0.0, 1.0)
+        psnr_test += psnr(image, gt_image).mean().double()
+    return (psnr_test / len(views)).item()
+
+
+def derive_caps(dataset, opt, pipe, args):
+    gaussians = GaussianModel(dataset.sh_degree)
+    scene = Scene(dataset, gaussians, load_iteration=args.iteration, shuffle=False)
+    ply_path = os.path.join(dataset.model_path, "point_cloud", "iteration_" + str(scene.loaded_iter), "point_cloud.ply")
+
+    bg_color = [1, 1, 1] if dataset.white_background else [0, 0, 0]
+    background = torch.tensor(bg_color, dtype=torch.float32, device="cuda")
+
+    # one importance pass over the trained model gives the ordering for every cap
+    if args.imp_scores is not None and os.path.exists(args.imp_scores):
+        accumulator = ImportanceAccumulator.load(args.imp_scores)
+        assert accumulator.num_points == gaussians.get_xyz.shape[0], "Stored importance scores do not match the model"
+        print("Loaded importance scores from {}".format(args.imp_scores))
+    else:
+        accumulator = ImportanceAccumulator(gaussians.get_xyz.shape[0]).accumulate(
+            scene.getTrainCameras(), gaussians, pipe, background, view_fraction=args.imp_view_fraction, seed=0)
+        print("Importance pass: {} views, {:.1f} ms per view".format(len(accumulator.view_times), accumulator.time_per_view * 1000))
+        if args.imp_scores is not None:
+            accumulator.save(args.imp_scores)
+    imp_score = accumulator.scores(args.imp_metric)
+    order = torch.argsort(imp_score, descending=True)
+    print("Importance computed for {} Gaussians".format(order.shape[0]))
+
+    for cap in sorted(args.caps):
+        capped = GaussianModel(dataset.sh_degree)
+        capped.load_ply(ply_path)
+        capped.spatial_lr_scale = scene.cameras_extent
+        capped.training_setup(opt)
+
+        keep_mask = torch.zeros(order.shape[0], dtype=torch.bool, device="cuda")
+        keep_mask[order[:cap]] = True
+        capped.prune_points(keep_mask==False)
+
+        scene.gaussians = capped
+        if args.finetune_iterations > 0:
+            finetune(scene, capped, opt, pipe, background, args.finetune_iterations)
+
+        cap_path = os.path.join(args.output_path, "cap_{}".format(cap))
+        iteration = scene.loaded_iter + args.finetune_iterations
+        capped.save_ply(os.path.join(cap_path, "point_cloud", "iteration_{}".format(iteration), "point_cloud.ply"))
+
+        # keep the folder usable by render.py / metrics.py
+        cap_args = copy.copy(vars(dataset))
+        cap_args["model_path"] = cap_path
+        with open(os.path.join(cap_path, "cfg_args"), 'w') as cfg_log_f:
+            cfg_log_f.write(str(Namespace(**cap_args)))
+
+        print("\n[CAP {}] {} Gaussians, test PSNR {}".format(
+            cap, capped.get_xyz.shape[0], evaluate_psnr(scene.getTestCameras(), capped, pipe, background)))
+
+        torch.cuda.empty_cache()
+
+
+if __name__ == "__main__":
+    # Set up command line argument parser
+    parser = ArgumentParser(description="Derive capped models from one trained run")
+    model = ModelParams(parser, sentinel=True)
+    op = OptimizationParams(parser)
+    pipeline = PipelineParams(parser)
+    parser.add_argument("--iteration", default=-1, type=int)
+    parser.add_argument("--caps", nargs="+", type=int, required=True)
+    parser.add_argument("--imp_metric", required=True, type=str, default = None)
+    parser.add_argument("--finetune_iterations", type=int, default=3_000)
+    parser.add_argument("--imp_view_fraction", type=float, default=1.0)
+    parser.add_argument("--imp_scores", type=str, default=None, help="File to store the importance scores in, reused when it already exists")
+    parser.add_argument("--output_path", type=str, default=None, help="Defaults to <model path>/caps")
+    parser.add_argument("--quiet", action="store_true")
+    args = get_combined_args(parser)
+    args.output_path = args.output_path or os.path.join(args.model_path, "caps")
+    print("Deriving caps from " + args.model_path)
+
+    # Initialize system state (RNG)
+    safe_state(args.quiet)
+
+    derive_caps(model.extract(args), op.extract(args), pipeline.extract(args), args)
+
+    # All done
+    print("\nDerivation complete.")
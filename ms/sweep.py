@@ -0,0 +1,104 @@
+import os
+import sys
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.abspath(os.path.join(BASE_DIR, '..')))
+
+import copy
+import random
+import numpy as np
+import torch
+from scene import Scene, GaussianModel
+from gaussian_renderer import network_gui
+from utils.general_utils import safe_state
+from lpipsPyTorch.modules.lpips import LPIPS
+from train import training, training_parser, init_wandb
+
+
+def parse_sweep_config(parser, config, fixed=()):
+    '''
+    Parse one --sweep value such as "num_max=500000,lambda_diff=0.3" into
+    a dict of overrides, casting every value with the type of its argument.
+    The arguments in fixed (those of the shared scene) cannot be overridden.
+    '''
+    actions = {action.dest: action for action in parser._actions}
+    overrides = {}
+    for pair in config.split(","):
+        key, value = pair.split("=")
+        key = key.strip().lstrip("-")
+        if key not in actions:
+            raise ValueError("Unknown argument in sweep config: {}".format(key))
+        if key in fixed:
+            raise ValueError("The scene is loaded once for the whole sweep, {} cannot change per config".format(key))
+        action = actions[key]
+        if action.nargs in ("+", "*"):
+            # list arguments use ":" as separator, e.g. reproject_iter=2000:8000
+            overrides[key] = [action.type(v) for v in value.split(":")]
+        elif action.type is None:
+            overrides[key] = value.lower() in ("1", "true", "yes")
+        else:
+            overrides[key] = action.type(value)
+    return overrides
+
+
+def sweep_name(overrides):
+    return "_".join("{}_{}".format(k, "-".join(map(str, v)) if isinstance(v, list) else v) for k, v in overrides.items())
+
+
+def sweep(args, parser, lp, op, pp):
+    # every config is checked before the long runs start
+    scene_keys = [key.lstrip("_") for key in vars(lp)]
+    configs = [parse_sweep_config(parser, config, scene_keys) for config in args.sweep]
+
+    # load cameras, images and the initial point cloud only once
+    os.makedirs(args.model_path, exist_ok=True)
+    shared_scene = Scene(lp.extract(args), GaussianModel(sh_degree=0))
+    lpips = LPIPS('vgg', '0.1').to('cuda')
+
+    for overrides in configs:
+
+        run_args = copy.deepcopy(args)
+        for k, v in overrides.items():
+            setattr(run_args, k, v)
+        run_args.model_path = os.path.join(args.model_path, sweep_name(overrides))
+        run_args.save_iterations.append(run_args.iterations)
+        run_args.test_iterations.append(run_args.iterations)
+
+        wandb_run_name = None if args.wandb_run_name is None else args.wandb_run_name + "_" + sweep_name(overrides)
+        wand_run = init_wandb(args.wandb_key, args.wandb_project, wandb_run_name, run_args.model_path, run_args)
+
+        # every configuration starts from the same RNG state
+        random.seed(0)
+        np.random.seed(0)
+        torch.manual_seed(0)
+
+        try:
+            print("Optimizing " + run_args.model_path)
+            training(lp.extract(run_args), op.extract(run_args), pp.extract(run_args), run_args.test_iterations,
+                     run_args.save_iterations, run_args.checkpoint_iterations, run_args.start_checkpoint, run_args.debug_from,
+                     run_args, shared_scene=shared_scene, lpips=lpips)
+        finally:
+            if wand_run is not None:
+                wand_run.finish()
+
+        torch.cuda.empty_cache()
+
+
+if __name__ == "__main__":
+    parser, lp, op, pp = training_parser()
+    parser.add_argument("--sweep", action="append", required=True,
+                        help="Overrides for one run, e.g. --sweep num_max=500000,lambda_diff=0.3 (repeat for every configuration)")
+    args = parser.parse_args(sys.argv[1:])
+    if not args.model_path:
+        parser.error("a sweep needs an output root, please pass -m/--model_path")
+
+    # Initialize system state (RNG)
+    safe_state(args.quiet)
+
+    # Start GUI server, configure and run training
+    network_gui.init(args.ip, args.port, args.gui_fps)
+    torch.autograd.set_detect_anomaly(args.detect_anomaly)
+
+    sweep(args, parser, lp, op, pp)
+
+    # All done
+    print("\nSweep complete.")
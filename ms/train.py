@@ -8,10 +8,12 @@ import torch
 from random import randint
 from utils.loss_utils import l1_loss, ssim
 from gaussian_renderer import network_gui
-from gaussian_renderer import render_imp, render_depth
+from gaussian_renderer import render_imp, render_batch
+from gaussian_renderer.importance import ImportanceAccumulator
+from gaussian_renderer.reprojection import reproject_points
 import sys
 from scene import Scene, GaussianModel
-from utils.general_utils import get_top_k_indices, safe_state
+from utils.general_utils import get_cdf_threshold, get_top_k_indices, safe_state, weighted_sample_without_replacement
 import uuid
 from tqdm import tqdm
 from utils.image_utils import psnr
@@ -24,7 +26,6 @@ try:
 except ImportError:
     TENSORBOARD_FOUND = False
 
-import numpy as np
 from lpipsPyTorch.modules.lpips import LPIPS
 from utils.sh_utils import SH2RGB
 from early_stopping import EarlyStoppingHandler, parse_grace_periods
@@ -39,10 +40,7 @@ def init_cdf_mask(importance, thres=1.0):
     importance = importance.flatten()   
     if thres!=1.0:
         percent_sum = thres
-        vals,idx = torch.sort(importance+(1e-6))
-        cumsum_val = torch.cumsum(vals, dim=0)
-        split_index = ((cumsum_val/vals.sum()) > (1-percent_sum)).nonzero().min()
-        split_val_nonprune = vals[split_index]
+        split_val_nonprune = get_cdf_threshold(importance+(1e-6), percent_sum)
 
         non_prune_mask = importance>split_val_nonprune 
     else: 
@@ -51,19 +49,18 @@ def init_cdf_mask(importance, thres=1.0):
     return non_prune_mask
 
 
-
-
-
-
-
-def training(dataset, opt, pipe, testing_iterations, saving_iterations, checkpoint_iterations, checkpoint, debug_from, args) -> None:
+def training(dataset, opt, pipe, testing_iterations, saving_iterations, checkpoint_iterations, checkpoint, debug_from, args, shared_scene=None, lpips=None) -> None:
     first_iter = 0
     tb_writer = prepare_output_and_logger(dataset)
     log = []
 
     gaussians = GaussianModel(sh_degree=0, log=log)
 
-    scene = Scene(dataset, gaussians)
+    if shared_scene is None:
+        scene = Scene(dataset, gaussians)
+    else:
+        # cameras and images were already loaded by the caller (see sweep.py)
+        scene = shared_scene.fork(dataset.model_path, gaussians)
     gaussians.training_setup(opt)
     if checkpoint:
         (model_params, first_iter) = torch.load(checkpoint)
@@ -83,7 +80,8 @@ def training(dataset, opt, pipe, testing_iterations, saving_iterations, checkpoi
     mask_blur = torch.zeros(gaussians._xyz.shape[0], device='cuda')
     area_max_acum = torch.zeros(gaussians._xyz.shape[0], device='cuda')
 
-    lpips = LPIPS('vgg', '0.1').to('cuda')
+    if lpips is None:
+        lpips = LPIPS('vgg', '0.1').to('cuda')
 
     cum_deleted = 0
     cum_created = 0
@@ -98,20 +96,7 @@ def training(dataset, opt, pipe, testing_iterations, saving_iterations, checkpoi
     
     for iteration in range(first_iter, opt.iterations + 1):       
         log.append(f"Iteration: {iteration}")
-        if network_gui.conn == None:
-            network_gui.try_connect()
-        while network_gui.conn != None:
-            try:
-                net_image_bytes = None
-                custom_cam, do_training, pipe.convert_SHs_python, pipe.compute_cov3D_python, keep_alive, scaling_modifer = network_gui.receive()
-                if custom_cam != None:
-                    net_image = render_imp(custom_cam, gaussians, pipe, background, scaling_modifer)["render"]
-                    net_image_bytes = memoryview((torch.clamp(net_image, min=0, max=1.0) * 255).byte().permute(1, 2, 0).contiguous().cpu().numpy())
-                network_gui.send(net_image_bytes, dataset.source_path)
-                if do_training and ((iteration < int(opt.iterations)) or not keep_alive):
-                    break
-            except Exception as e:
-                network_gui.conn = None
+        network_gui.update(gaussians, pipe, background, dataset.source_path, iteration == opt.iterations)
 
         iter_start.record()
 
@@ -157,7 +142,7 @@ def training(dataset, opt, pipe, testing_iterations, saving_iterations, checkpoi
                 progress_bar.close()
 
             # Log and save
-            training_report(tb_writer, iteration, Ll1, loss, l1_loss, iter_start.elapsed_time(iter_end), testing_iterations, scene, render_imp, (pipe, background), lpips)
+            training_report(tb_writer, iteration, Ll1, loss, l1_loss, iter_start.elapsed_time(iter_end), testing_iterations, scene, render_batch, (pipe, background), lpips)
             if (iteration in saving_iterations):
                 print("\n[ITER {}] Saving Gaussians".format(iteration))
                 scene.save(iteration)
@@ -172,7 +157,7 @@ def training(dataset, opt, pipe, testing_iterations, saving_iterations, checkpoi
             if early_stopping_handler.stop_early(
                 step=iteration,
                 test_cameras=scene.getTestCameras(),
-                render_func=lambda camera: render_imp(camera, scene.gaussians, pipe, background)["render"],
+                render_batch_func=lambda cameras: (pkg["render"] for pkg in render_batch(cameras, scene.gaussians, pipe, background)),
             ):
                 scene.save(iteration)
                 break
@@ -232,39 +217,8 @@ def training(dataset, opt, pipe, testing_iterations, saving_iterations, checkpoi
 
                     n_before = gaussians._xyz.shape[0]
                     
-                    out_pts_list=[]
-                    gt_list=[]
-                    views=scene.getTrainCameras()
-                    for view in views:
-                        gt = view.original_image[0:3, :, :]
-                        render_depth_pkg = render_depth(view, gaussians, pipe, background)
-                        out_pts = render_depth_pkg["out_pts"]
-                        accum_alpha = render_depth_pkg["accum_alpha"]
-
-
-                        prob=1-accum_alpha
-
-                        prob = prob/prob.sum()
-                        prob = prob.reshape(-1).cpu().numpy()
-
-
-                        factor=1/(image.shape[1]*image.shape[2]*len(views)/args.num_depth)
-
-
-                        N_xyz=prob.shape[0]
-                        num_sampled=int(N_xyz*factor)
-
-                        indices = np.random.choice(N_xyz, size=num_sampled, 
-                                                   p=prob,replace=False)
-                        
-                        out_pts = out_pts.permute(1,2,0).reshape(-1,3)
-                        gt = gt.permute(1,2,0).reshape(-1,3)
-
-                        out_pts_list.append(out_pts[indices])
-                        gt_list.append(gt[indices])       
-
-                    out_pts_merged=torch.cat(out_pts_list)
-                    gt_merged=torch.cat(gt_list)
+                    out_pts_merged, gt_merged = reproject_points(scene.getTrainCameras(), gaussians, pipe, background,
+                                                                 args.num_depth, voxel_size=args.reproject_voxel_size)
 
                     gaussians.reinitial_pts(out_pts_merged, gt_merged)
                     gaussians.training_setup(opt)
@@ -281,37 +235,14 @@ def training(dataset, opt, pipe, testing_iterations, saving_iterations, checkpoi
 
             if iteration == simp_iteration1:
 
-                imp_score = torch.zeros(gaussians._xyz.shape[0]).cuda()
-                accum_area_max = torch.zeros(gaussians._xyz.shape[0]).cuda()
-                views=scene.getTrainCameras()
-                for view in views:
-                    # print(idx)
-                    render_pkg = render_imp(view, gaussians, pipe, background)
-                    accum_weights = render_pkg["accum_weights"]
-                    area_proj = render_pkg["area_proj"]
-                    area_max = render_pkg["area_max"]
-
-                    accum_area_max = accum_area_max+area_max
-
-                    if args.imp_metric=='outdoor':
-                        mask_t=area_max!=0
-                        temp=imp_score+accum_weights/area_proj
-                        imp_score[mask_t] = temp[mask_t]
-                    else:
-                        imp_score=imp_score+accum_weights
-                
-                imp_score[accum_area_max==0]=0
-                prob = imp_score/imp_score.sum()
-                prob = prob.cpu().numpy()
-
-
+                imp_score = ImportanceAccumulator(gaussians._xyz.shape[0]).accumulate(
+                    scene.getTrainCameras(), gaussians, pipe, background, view_fraction=args.imp_view_fraction).scores(args.imp_metric)
                 factor=args.sampling_factor
                 N_xyz=gaussians._xyz.shape[0]
-                num_sampled=int(N_xyz*factor*((prob!=0).sum()/prob.shape[0]))
-                indices = np.random.choice(N_xyz, size=num_sampled, 
-                                           p=prob, replace=False)
+                num_sampled=int(N_xyz*factor*((imp_score!=0).sum().item()/N_xyz))
+                indices = weighted_sample_without_replacement(imp_score, num_sampled)
     
-                mask = np.zeros(N_xyz, dtype=bool)
+                mask = torch.zeros(N_xyz, dtype=torch.bool, device=imp_score.device)
                 mask[indices] = True
 
 
@@ -327,32 +258,13 @@ def training(dataset, opt, pipe, testing_iterations, saving_iterations, checkpoi
                 viewpoint_stack = scene.getTrainCameras().copy()
                 area_max_acum = torch.zeros(gaussians._xyz.shape[0], device='cuda')
 
-                n_deleted = n_deleted + (mask==False).sum()
+                n_deleted = n_deleted + (mask==False).sum().item()
 
 
             if iteration == args.simp_iteration2:
 
-                imp_score = torch.zeros(gaussians._xyz.shape[0]).cuda()
-                accum_area_max = torch.zeros(gaussians._xyz.shape[0]).cuda()
-                views=scene.getTrainCameras()
-                for view in views:
-                    gt = view.original_image[0:3, :, :]
-                    
-                    render_pkg = render_imp(view, gaussians, pipe, background)
-                    accum_weights = render_pkg["accum_weights"]
-                    area_proj = render_pkg["area_proj"]
-                    area_max = render_pkg["area_max"]
-
-                    accum_area_max = accum_area_max+area_max
-
-                    if args.imp_metric=='outdoor':
-                        mask_t=area_max!=0
-                        temp=imp_score+accum_weights/area_proj
-                        imp_score[mask_t] = temp[mask_t]
-                    else:
-                        imp_score=imp_score+accum_weights
-                    
-                imp_score[accum_area_max==0]=0
+                imp_score = ImportanceAccumulator(gaussians._xyz.shape[0]).accumulate(
+                    scene.getTrainCameras(), gaussians, pipe, background, view_fraction=args.imp_view_fraction).scores(args.imp_metric)
                 non_prune_mask = init_cdf_mask(importance=imp_score, thres=0.99) 
                                 
                 gaussians.prune_points(non_prune_mask==False)
@@ -443,8 +355,9 @@ def training_report(tb_writer, iteration, Ll1, loss, l1_loss, elapsed, testing_i
                 psnr_test = 0.0
                 ssims = []
                 # lpipss = []
-                for idx, viewpoint in enumerate(config['cameras']):
-                    image = torch.clamp(renderFunc(viewpoint, scene.gaussians, *renderArgs)["render"], 0.0, 1.0)
+                render_pkgs = renderFunc(config['cameras'], scene.gaussians, *renderArgs)
+                for idx, (viewpoint, render_pkg) in enumerate(zip(config['cameras'], render_pkgs)):
+                    image = torch.clamp(render_pkg["render"], 0.0, 1.0)
                     gt_image = torch.clamp(viewpoint.original_image.to("cuda"), 0.0, 1.0)
                     if tb_writer and (idx < 5):
                         tb_writer.add_images(config['name'] + "_view_{}/render".format(viewpoint.image_name), image[None], global_step=iteration)
@@ -503,7 +416,7 @@ def init_wandb(wandb_key: str, wandb_project: str, wandb_run_name: str, model_pa
     else:
         return None
 
-if __name__ == "__main__":
+def training_parser():
     # Set up command line argument parser
     parser = ArgumentParser(description="Training script parameters")
     lp = ModelParams(parser)
@@ -511,6 +424,7 @@ if __name__ == "__main__":
     pp = PipelineParams(parser)
     parser.add_argument('--ip', type=str, default="127.0.0.1")
     parser.add_argument('--port', type=int, default=6009)
+    parser.add_argument('--gui_fps', type=float, default=30)
     parser.add_argument('--debug_from', type=int, default=-1)
     parser.add_argument('--detect_anomaly', action='store_true', default=False)
     parser.add_argument("--test_iterations", nargs="+", type=int, default=[7_000, 30_000])
@@ -525,10 +439,12 @@ if __name__ == "__main__":
     parser.add_argument("--sampling_factor", type=float, default = 0.5)
 
     parser.add_argument("--imp_metric", required=True, type=str, default = None)
+    parser.add_argument("--imp_view_fraction", type=float, default = 1.0, help="Fraction of training views used for the importance passes")
 
     parser.add_argument("--num_max", type=int, default = None, help="Maximum number of splats in the scene")
     parser.add_argument("--lambda_diff", type=float, default=0.5, help="Weighting the contribution for blur-split and gradient based densification when running into the cap")
     parser.add_argument("--reproject_iter", nargs="+", type=int, default=[2_000, 8_000])
+    parser.add_argument("--reproject_voxel_size", type=float, default=None, help="Keep one reprojected point per voxel of this size")
 
     parser.add_argument("--wandb_key", type=str, default="", help="The key used to sign into weights & biases logging")
     parser.add_argument("--wandb_project", type=str, default="")
@@ -539,6 +455,10 @@ if __name__ == "__main__":
     parser.add_argument("--start_early_stopping_iteration", type=int)
     parser.add_argument("--n_patience_epochs", type=int, default=3)
 
+    return parser, lp, op, pp
+
+if __name__ == "__main__":
+    parser, lp, op, pp = training_parser()
     args = parser.parse_args(sys.argv[1:])
     args.save_iterations.append(args.iterations)
     args.test_iterations.append(args.iterations)
@@ -552,7 +472,7 @@ if __name__ == "__main__":
         safe_state(args.quiet)
 
         # Start GUI server, configure and run training
-        network_gui.init(args.ip, args.port)
+        network_gui.init(args.ip, args.port, args.gui_fps, render_func=render_imp)
         torch.autograd.set_detect_anomaly(args.detect_anomaly)
 
 
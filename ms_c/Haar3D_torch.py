@@ -1,5 +1,11 @@
+import os
+import sys
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.abspath(os.path.join(BASE_DIR, '..')))
+
 import numpy as np
 import torch
+from utils.morton_utils import morton_encode, morton_decode
 
 
 
@@ -24,31 +30,10 @@ def copyAsort(V):
     W=np.ones(V.shape[0])  
     
     # encode zyx (pos) to bin
-    vx, vy, vz= V[:,2], V[:,1], V[:,0]
-    val = ((0x000001 & vx)    ) + ((0x000001 & vy)<< 1) + ((0x000001 &  vz)<< 2) + \
-                ((0x000002 & vx)<< 2) + ((0x000002 & vy)<< 3) + ((0x000002 &  vz)<< 4) + \
-                ((0x000004 & vx)<< 4) + ((0x000004 & vy)<< 5) + ((0x000004 &  vz)<< 6) + \
-                ((0x000008 & vx)<< 6) + ((0x000008 & vy)<< 7) + ((0x000008 &  vz)<< 8) + \
-                ((0x000010 & vx)<< 8) + ((0x000010 & vy)<< 9) + ((0x000010 &  vz)<<10) + \
-                ((0x000020 & vx)<<10) + ((0x000020 & vy)<<11) + ((0x000020 &  vz)<<12) + \
-                ((0x000040 & vx)<<12) + ((0x000040 & vy)<<13) + ((0x000040 &  vz)<<14) + \
-                ((0x000080 & vx)<<14) + ((0x000080 & vy)<<15) + ((0x000080 &  vz)<<16) + \
-                ((0x000100 & vx)<<16) + ((0x000100 & vy)<<17) + ((0x000100 &  vz)<<18) + \
-                ((0x000200 & vx)<<18) + ((0x000200 & vy)<<19) + ((0x000200 &  vz)<<20) + \
-                ((0x000400 & vx)<<20) + ((0x000400 & vy)<<21) + ((0x000400 &  vz)<<22) + \
-                ((0x000800 & vx)<<22) + ((0x000800 & vy)<<23) + ((0x000800 &  vz)<<24) + \
-                ((0x001000 & vx)<<24) + ((0x001000 & vy)<<25) + ((0x001000 &  vz)<<26) + \
-                ((0x002000 & vx)<<26) + ((0x002000 & vy)<<27) + ((0x002000 &  vz)<<28) + \
-                ((0x004000 & vx)<<28) + ((0x004000 & vy)<<29) + ((0x004000 &  vz)<<30) + \
-                ((0x008000 & vx)<<30) + ((0x008000 & vy)<<31) + ((0x008000 &  vz)<<32) + \
-                ((0x010000 & vx)<<32) + ((0x010000 & vy)<<33) + ((0x010000 &  vz)<<34) + \
-                ((0x020000 & vx)<<34) + ((0x020000 & vy)<<35) + ((0x020000 &  vz)<<36) + \
-                ((0x040000 & vx)<<36) + ((0x040000 & vy)<<37) + ((0x040000 &  vz)<<38) + \
-                ((0x080000 & vx)<<38) + ((0x080000 & vy)<<39) + ((0x080000 &  vz)<<40) + \
-                ((0x100000 & vx)<<40) + ((0x100000 & vy)<<41) + ((0x100000 &  vz)<<42)
+    val = morton_encode(V)
         
     reord=np.argsort(val)
-    val=np.sort(val)
+    val=val[reord]
     
     return W, val, reord
 
@@ -74,76 +59,7 @@ def val2V(val, factor):
         print('error')
         return
     
-    val = val<<factor    
-    V_re = np.zeros((val.shape[0],3))
-    
-    V_re[:,2] = (0x000001 & val) + \
-                (0x000002 & (val>> 2)) + \
-                (0x000004 & (val>> 4)) + \
-                (0x000008 & (val>> 6)) + \
-                (0x000010 & (val>> 8)) + \
-                (0x000020 & (val>>10)) + \
-                (0x000040 & (val>>12)) + \
-                (0x000080 & (val>>14)) + \
-                (0x000100 & (val>>16)) + \
-                (0x000200 & (val>>18)) + \
-                (0x000400 & (val>>20)) + \
-                (0x000800 & (val>>22)) + \
-                (0x001000 & (val>>24)) + \
-                (0x002000 & (val>>26)) + \
-                (0x004000 & (val>>28)) + \
-                (0x008000 & (val>>30)) + \
-                (0x010000 & (val>>32)) + \
-                (0x020000 & (val>>34)) + \
-                (0x040000 & (val>>36)) + \
-                (0x080000 & (val>>38)) + \
-                (0x100000 & (val>>40))
-    
-    
-    V_re[:,1] = (0x000001 & (val>> 1)) + \
-                (0x000002 & (val>> 3)) + \
-                (0x000004 & (val>> 5)) + \
-                (0x000008 & (val>> 7)) + \
-                (0x000010 & (val>> 9)) + \
-                (0x000020 & (val>>11)) + \
-                (0x000040 & (val>>13)) + \
-                (0x000080 & (val>>15)) + \
-                (0x000100 & (val>>17)) + \
-                (0x000200 & (val>>19)) + \
-                (0x000400 & (val>>21)) + \
-                (0x000800 & (val>>23)) + \
-                (0x001000 & (val>>25)) + \
-                (0x002000 & (val>>27)) + \
-                (0x004000 & (val>>29)) + \
-                (0x008000 & (val>>31)) + \
-                (0x010000 & (val>>33)) + \
-                (0x020000 & (val>>35)) + \
-                (0x040000 & (val>>37)) + \
-                (0x080000 & (val>>39)) + \
-                (0x100000 & (val>>41))
-    
-    
-    V_re[:,0] = (0x000001 & (val>> 2)) + \
-                (0x000002 & (val>> 4)) + \
-                (0x000004 & (val>> 6)) + \
-                (0x000008 & (val>> 8)) + \
-                (0x000010 & (val>>10)) + \
-                (0x000020 & (val>>12)) + \
-                (0x000040 & (val>>14)) + \
-                (0x000080 & (val>>16)) + \
-                (0x000100 & (val>>18)) + \
-                (0x000200 & (val>>20)) + \
-                (0x000400 & (val>>22)) + \
-                (0x000800 & (val>>24)) + \
-                (0x001000 & (val>>26)) + \
-                (0x002000 & (val>>28)) + \
-                (0x004000 & (val>>30)) + \
-                (0x008000 & (val>>32)) + \
-                (0x010000 & (val>>34)) + \
-                (0x020000 & (val>>36)) + \
-                (0x040000 & (val>>38)) + \
-                (0x080000 & (val>>40)) + \
-                (0x100000 & (val>>42))
+    V_re = morton_decode(val<<factor).astype(np.float64)
                 
     if factor == 1:
         V_re[:,2]/=2
@@ -184,7 +100,7 @@ def transform_batched(a0, a1, C0, C1):
     temp2 = a1[:,None]
     trans_matrix = np.concatenate((temp1, temp2, -temp2, temp1),1)
     trans_matrix = trans_matrix.reshape(-1,2,2)
-    trans_matrix = torch.tensor(trans_matrix).to(C0.get_device()).float()
+    trans_matrix = torch.tensor(trans_matrix).to(C0.device).float()
     
     
     V=torch.matmul(trans_matrix, torch.cat((C0,C1),1))
@@ -246,7 +162,7 @@ def itransform_batched(a0, a1, CT0, CT1):
     temp2 = a1[None]
     trans_matrix = np.concatenate((temp1, -temp2, temp2, temp1),1)
     trans_matrix = trans_matrix.reshape(2,2,-1)
-    trans_matrix = torch.tensor(trans_matrix).to(CT0.get_device()).float()    
+    trans_matrix = torch.tensor(trans_matrix).to(CT0.device).float()    
     
     
     trans_matrix=trans_matrix.permute((2,0,1))
@@ -615,7 +531,7 @@ def inv_haar3D(inV, inCT, depth):
     
     depth *= 3
     
-    device = inCT.get_device()
+    device = inCT.device
     
     
     outC = torch.zeros((N, K)).to(device)
@@ -641,7 +557,7 @@ def inv_haar3D(inV, inCT, depth):
       
         
         d = d-1
-        S = iM[d]
+        S = int(iM[d])
         M = iM[d-1] if d else NN 
         
         
@@ -912,7 +828,7 @@ def inv_haar3D_param(inV, inCT, depth):
     
     depth *= 3
     
-    device = inCT.get_device()
+    device = inCT.device
     
     
     outC = torch.zeros((N, K)).to(device)
@@ -948,7 +864,7 @@ def inv_haar3D_param(inV, inCT, depth):
       
         
         d = d-1
-        S = iM[d]
+        S = int(iM[d])
         M = iM[d-1] if d else NN 
         
         
@@ -1036,6 +952,181 @@ def inv_haar3D_param(inV, inCT, depth):
     return res  
 
 
+def raht_tree(inV, depth, device="cpu"):
+    '''
+    RAHT tree of haar3D, built with boolean masks and stream compaction, O(N)
+    per level without the sorting of np.setdiff1d, and stopping as soon as
+    every node is merged.
+
+    Parameters
+    ----------
+    inV : point cloud geometry(pre-voxlized and deduplicated)
+    depth : depth level of geometry(octree)
+    device : device of the returned tensors
+
+    Returns
+    -------
+    res : order (inV row of every morton sorted point), levels (depth level,
+          coeff idx of the low- and high-freq nodes, transform weights) of
+          the levels with merges, w and depth_CT of every coeff
+    '''
+
+    val = morton_encode(torch.as_tensor(np.asarray(inV), device=device))
+    order = torch.argsort(val)
+    val = val[order]
+
+    N = val.shape[0]
+    # pos, coeff idx of the low-freq coeff of every node of the current level
+    pos = torch.arange(N, device=device)
+    w = torch.ones(N, dtype=torch.float64, device=device)
+    outW = torch.zeros(N, dtype=torch.float64, device=device)
+    depth_CT = torch.full((N, ), -1, dtype=torch.int64, device=device)
+
+    levels = []
+    for d in range(depth * 3):
+        if pos.shape[0] <= 1:
+            break
+
+        # siblings share the morton code of their parent, the left one is merged with the right one
+        parent = val >> 1
+        mask = torch.zeros(pos.shape[0], dtype=torch.bool, device=device)
+        mask[:-1] = parent[:-1] == parent[1:]
+        left = torch.nonzero(mask).squeeze(1)
+        right = left + 1
+        keep = torch.ones(pos.shape[0], dtype=torch.bool, device=device)
+        keep[right] = False
+
+        if left.shape[0] > 0:
+            w_left, w_right = w[left], w[right]
+            a = torch.sqrt(w_left + w_right)
+            levels.append((d, pos[left], pos[right], torch.sqrt(w_left) / a, torch.sqrt(w_right) / a))
+            # high-freq coeffs keep the weight and depth of the merge
+            outW[pos[right]] = w_left + w_right
+            depth_CT[pos[right]] = d
+            w[left] = w_left + w_right
+
+        val, pos, w = parent[keep], pos[keep], w[keep]
+
+    outW[pos] = w
+    depth_CT[pos] = depth * 3 - 1
+
+    res = {'order':order,
+           'levels':levels,
+           'w':outW,
+           'depth_CT':depth_CT,
+           }
+
+    return res
+
+
+
+def haar3D_fast(inV, inC, depth):
+    '''
+    haar3D on the tree of raht_tree, on the device of inC (torch tensor or
+    np.array).
+
+    Returns
+    -------
+    res : CT, w and depth_CT as in haar3D, as tensors on the device of inC
+    '''
+
+    inC = torch.as_tensor(inC)
+    tree = raht_tree(inV, depth, inC.device)
+
+    C = inC[tree['order']]+0
+    for _, left, right, a0, a1 in tree['levels']:
+        a0, a1 = a0.to(C.dtype)[:, None], a1.to(C.dtype)[:, None]
+        C0, C1 = C[left], C[right]
+        C[left] = a0*C0 + a1*C1
+        C[right] = -a1*C0 + a0*C1
+
+    res = {'CT':C,
+           'w':tree['w'],
+           'depth_CT':tree['depth_CT'],
+           }
+
+    return res
+
+
+
+def inv_haar3D_fast(inV, inCT, depth, tree=None):
+    '''
+    inv_haar3D on the tree of raht_tree, on the device of inCT (torch tensor
+    or np.array). tree, when given, is the raht_tree of inV on that device.
+
+    Returns
+    -------
+    res : rec attributes (float32)
+    '''
+
+    inCT = torch.as_tensor(inCT)
+    if tree is None:
+        tree = raht_tree(inV, depth, inCT.device)
+
+    C = inCT.float()+0
+    for _, left, right, a0, a1 in reversed(tree['levels']):
+        a0, a1 = a0.float()[:, None], a1.float()[:, None]
+        CT0, CT1 = C[left], C[right]
+        C[left] = a0*CT0 - a1*CT1
+        C[right] = a1*CT0 + a0*CT1
+
+    outC = torch.zeros_like(C)
+    outC[tree['order']] = C
+
+    return outC
+
+
+
+def inv_haar3D_lod(inV, inCT, depth, level, tree=None):
+    '''
+    inv_haar3D stopped before the depth level: the levels below it are not
+    inverted, their coeffs are not used. Every node left merges the points
+    sharing the morton code >> level, its low-pass coeff is sqrt(w) times the
+    mean attributes of these points.
+
+    Parameters
+    ----------
+    inV, inCT, depth, tree : as in inv_haar3D_fast
+    level : depth level to stop at, 0 inverts the whole tree
+
+    Returns
+    -------
+    res : C (mean attributes of every node, float32), w (points per node),
+          node (node of every inV row)
+    '''
+
+    inCT = torch.as_tensor(inCT)
+    if tree is None:
+        tree = raht_tree(inV, depth, inCT.device)
+
+    C = inCT.float()+0
+    for d, left, right, a0, a1 in reversed(tree['levels']):
+        if d < level:
+            break
+        a0, a1 = a0.float()[:, None], a1.float()[:, None]
+        CT0, CT1 = C[left], C[right]
+        C[left] = a0*CT0 - a1*CT1
+        C[right] = a1*CT0 + a0*CT1
+
+    # nodes are runs of the sorted morton codes, their low-pass coeff sits on the first point
+    val = morton_encode(torch.as_tensor(np.asarray(inV), device=inCT.device))[tree['order']] >> level
+    start = torch.ones(val.shape[0], dtype=torch.bool, device=inCT.device)
+    start[1:] = val[1:] != val[:-1]
+    first = torch.nonzero(start).squeeze(1)
+    w = torch.diff(first, append=torch.tensor([val.shape[0]], device=inCT.device))
+
+    node = torch.zeros_like(val)
+    node[tree['order']] = torch.cumsum(start.long(), 0) - 1
+
+    res = {'C':C[first] / torch.sqrt(w.float())[:, None],
+           'w':w,
+           'node':node,
+           }
+
+    return res
+
+
+
 def RGB2YUV(rgb):
     r, g, b = rgb[:,0], rgb[:,1], rgb[:,2]
     y = 0.212600 * r + 0.715200 * g + 0.072200 * b
@@ -0,0 +1,84 @@
+import unittest
+import numpy as np
+import torch
+from Haar3D_torch import copyAsort, haar3D, inv_haar3D, haar3D_fast, inv_haar3D_fast, inv_haar3D_lod, val2V
+from utils.morton_utils import morton_encode
+
+
+def make_cloud(num_points, depth, seed=0):
+    rng = np.random.default_rng(seed)
+    V = np.unique(rng.integers(0, 2**depth, (num_points, 3)), axis=0).astype(np.float64)
+    rng.shuffle(V)
+    C = torch.tensor(rng.standard_normal((V.shape[0], 4)), dtype=torch.float32)
+    return V, C
+
+
+class Haar3DFastTest(unittest.TestCase):
+    def test_given_a_voxelized_cloud__when_transforming__then_match_haar3D(
+        self,
+    ) -> None:
+        for depth, num_points in [(4, 300), (10, 2_000)]:
+            V, C = make_cloud(num_points, depth)
+
+            expected = haar3D(V, C, depth)
+            res = haar3D_fast(V, C, depth)
+
+            self.assertTrue(torch.allclose(res['CT'], expected['CT'], atol=1e-5))
+            self.assertTrue(np.array_equal(res['w'].numpy(), expected['w']))
+            self.assertTrue(np.array_equal(res['depth_CT'].numpy(), expected['depth_CT']))
+
+    def test_given_coefficients__when_inverting__then_match_inv_haar3D_and_recover_the_attributes(
+        self,
+    ) -> None:
+        V, C = make_cloud(2_000, 8, seed=1)
+        CT = haar3D_fast(V, C, 8)['CT']
+
+        outC = inv_haar3D_fast(V, CT, 8)
+
+        self.assertTrue(torch.allclose(outC, inv_haar3D(V, CT, 8), atol=1e-5))
+        self.assertTrue(torch.allclose(outC, C, atol=1e-5))
+
+    def test_given_a_single_point__when_transforming__then_keep_its_attributes(
+        self,
+    ) -> None:
+        V, C = np.array([[3.0, 1.0, 2.0]]), torch.tensor([[0.5, -1.0]])
+
+        res = haar3D_fast(V, C, 2)
+
+        self.assertTrue(torch.equal(res['CT'], C))
+        self.assertEqual(res['depth_CT'].tolist(), [5])
+        self.assertTrue(torch.equal(inv_haar3D_fast(V, res['CT'], 2), C))
+
+    def test_given_coefficients__when_inverting_down_to_a_level__then_return_the_means_of_its_nodes(
+        self,
+    ) -> None:
+        V, C = make_cloud(2_000, 8, seed=2)
+        CT = haar3D_fast(V, C, 8)['CT']
+
+        res = inv_haar3D_lod(V, CT, 8, 9)
+
+        # the nodes of depth level 9 group the points of a 8 voxels cube
+        _, groups = np.unique(morton_encode(V.astype(np.int64)) >> 9, return_inverse=True)
+        groups = torch.tensor(groups.reshape(-1))
+        self.assertEqual(res['C'].shape[0], groups.max().item() + 1)
+        self.assertTrue(torch.equal(res['node'], groups))
+        self.assertTrue(torch.equal(res['w'], torch.bincount(groups)))
+        means = torch.zeros_like(res['C']).index_add_(0, groups, C) / res['w'][:, None]
+        self.assertTrue(torch.allclose(res['C'], means, atol=1e-5))
+
+
+class MortonOrderTest(unittest.TestCase):
+    def test_given_a_cloud__when_sorting_and_decoding__then_recover_the_sorted_points(
+        self,
+    ) -> None:
+        V, _ = make_cloud(1_000, 16)
+
+        W, val, reord = copyAsort(V)
+
+        self.assertTrue((val[1:] > val[:-1]).all())
+        self.assertTrue(np.array_equal(val2V(val, 0), V[reord]))
+        self.assertTrue(np.array_equal(W, np.ones(V.shape[0])))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,333 @@
+import os
+import sys
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.abspath(os.path.join(BASE_DIR, '..')))
+
+import itertools
+import json
+import resource
+import tempfile
+import threading
+import time
+import numpy as np
+import torch
+from argparse import ArgumentParser
+from arguments import PipelineParams
+from gaussian_renderer import render_batch
+from scene.gaussian_model import GaussianModel
+from utils.image_utils import psnr
+from utils.trajectory_utils import load_trajectory, pose_camera
+
+from codec import CHUNK_SIZE, DEPTH, QSTEP, compress_chunked, compress_model, decompress_model, model_from_features
+
+# raht: compress_model, chunked: compress_chunked, vq: compress_model with an SH rest codebook
+CODECS = ('raht', 'chunked', 'vq')
+CODEBOOK_SIZE = 4096
+# columns of comparison_table compared to the baseline
+COMPARED = ('size', 'encode_time', 'decode_time', 'peak_memory', 'psnr')
+
+
+def synthetic_model(num_points, sh_degree=3, seed=0, device="cuda"):
+    '''
+    GaussianModel standing in for a trained one: small Gaussians on the
+    surfaces of random spheres, with colors varying smoothly over them and
+    noisy view dependent colors.
+    '''
+
+    generator = torch.Generator().manual_seed(seed)
+    num_spheres = max(1, num_points // 10_000)
+    centers = torch.randn((num_spheres, 3), generator=generator) * 5
+    radii = torch.rand(num_spheres, generator=generator) + 0.5
+    sphere = torch.randint(num_spheres, (num_points,), generator=generator)
+    directions = torch.nn.functional.normalize(torch.randn((num_points, 3), generator=generator), dim=1)
+    pos = centers[sphere] + radii[sphere, None] * directions
+
+    num_rest = (sh_degree + 1) ** 2 - 1
+    feat = torch.cat((torch.sin(pos * 2) * 0.8,
+                      torch.randn((num_points, 3 * num_rest), generator=generator) * 0.05,
+                      torch.log(torch.rand((num_points, 3), generator=generator) * 0.04 + 0.01),
+                      torch.nn.functional.normalize(torch.randn((num_points, 4), generator=generator), dim=1),
+                      torch.randn((num_points, 1), generator=generator) + 2), 1)
+    return model_from_features(pos.to(device), feat.to(device), sh_degree)
+
+
+def orbit_cameras(gaussians, num_views, width=320, height=240, device="cuda"):
+    '''
+    num_views cameras on a circle around the Gaussians, looking at their center.
+    '''
+
+    pos = gaussians.get_xyz.detach().cpu().numpy()
+    center = np.median(pos, 0)
+    distance = 2 * np.percentile(np.linalg.norm(pos - center, axis=1), 90) + 1e-3
+    fovx = np.radians(60)
+    fovy = 2 * np.arctan(np.tan(fovx / 2) * height / width)
+    cameras = []
+    for angle in np.linspace(0, 2 * np.pi, num_views, endpoint=False):
+        eye = center + distance * np.array([np.cos(angle), 0.3, np.sin(angle)])
+        forward = (center - eye) / np.linalg.norm(center - eye)
+        right = np.cross(forward, [0, 1, 0])
+        right /= np.linalg.norm(right)
+        # camera to world, x right, y down, z forward
+        R = np.stack((right, np.cross(forward, right), forward), 1)
+        cameras.append(pose_camera(R, eye, width, height, fovx, fovy, device))
+    return cameras
+
+
+class PeakMemory:
+    '''
+    Peak resident memory of this process and of its child processes (the
+    workers of compress_chunked) above their level at the start, in bytes,
+    sampled every interval seconds on a thread while in the with block (peak),
+    and peak CUDA memory allocated by torch (peak_gpu). A child exiting between
+    two samples still counts with its own peak, from getrusage. Without
+    /proc/self/statm, peak is the peak of the whole process so far.
+    '''
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.peak = 0
+        self.peak_gpu = 0
+        self.done = threading.Event()
+        self.sampler = threading.Thread(target=self._sample, daemon=True)
+
+    @staticmethod
+    def resident(pid='self'):
+        try:
+            with open('/proc/{}/statm'.format(pid)) as file:
+                return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def children(pid):
+        pids = []
+        try:
+            for task in os.listdir('/proc/{}/task'.format(pid)):
+                with open('/proc/{}/task/{}/children'.format(pid, task)) as file:
+                    pids += file.read().split()
+        except OSError:
+            pass
+        return pids
+
+    def total(self):
+        # children exiting while they are read count as 0
+        total = self.resident()
+        pids = self.children(os.getpid())
+        while pids:
+            pid = pids.pop()
+            total += self.resident(pid) or 0
+            pids += self.children(pid)
+        return total
+
+    def _sample(self):
+        while not self.done.wait(self.interval):
+            self.peak = max(self.peak, self.total() - self.start)
+
+    def __enter__(self):
+        if torch.cuda.is_available():
+            torch.cuda.synchronize()
+            torch.cuda.reset_peak_memory_stats()
+        self.start = self.resident()
+        self.start_children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        if self.start is not None:
+            self.start = self.total()
+            self.sampler.start()
+        return self
+
+    def __exit__(self, *exc):
+        if torch.cuda.is_available():
+            torch.cuda.synchronize()
+            self.peak_gpu = torch.cuda.max_memory_allocated()
+        children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        if self.start is None:
+            self.peak = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss + children) * 1024
+            return
+        self.done.set()
+        self.sampler.join()
+        self.peak = max(self.peak, self.total() - self.start)
+        # ru_maxrss of the children is the peak of the largest one waited for, so it only counts when it grew
+        if children > self.start_children:
+            self.peak = max(self.peak, children * 1024)
+
+
+def benchmark_grid(codecs=CODECS, qsteps=(QSTEP,), chunk_size=CHUNK_SIZE, codebook_size=CODEBOOK_SIZE):
+    '''
+    Settings of run_benchmark: every codec with every quantization step.
+    '''
+
+    configs = []
+    for codec, Qstep in itertools.product(codecs, qsteps):
+        config = {'codec':codec, 'Qstep':Qstep}
+        if codec == 'chunked':
+            config['chunk_size'] = chunk_size
+        if codec == 'vq':
+            config['codebook_size'] = codebook_size
+        configs.append(config)
+    return configs
+
+
+def run_config(path, gaussians, config, depth=DEPTH, num_workers=None, device="cuda"):
+    '''
+    Compress the Gaussians to path with the setting config of benchmark_grid
+    and decompress them. Returns the measures and the decoded Gaussians.
+    '''
+
+    with PeakMemory() as encode_memory:
+        start = time.perf_counter()
+        if config['codec'] == 'chunked':
+            size = compress_chunked(path, gaussians, config['chunk_size'], depth, config['Qstep'], num_workers=num_workers)
+        else:
+            size = compress_model(path, gaussians, depth, config['Qstep'], codebook_size=config.get('codebook_size', 0))
+        encode_time = time.perf_counter() - start
+
+    with PeakMemory() as decode_memory:
+        start = time.perf_counter()
+        decoded = decompress_model(path, device)
+        if decoded._xyz.is_cuda:
+            torch.cuda.synchronize()
+        decode_time = time.perf_counter() - start
+
+    num_gaussians = gaussians._xyz.shape[0]
+    return {'num_gaussians':num_gaussians,
+            'num_decoded':decoded._xyz.shape[0],
+            'size':size,
+            'bits_per_gaussian':8 * size / max(num_gaussians, 1),
+            'encode_time':encode_time,
+            'decode_time':decode_time,
+            'peak_memory':max(encode_memory.peak, decode_memory.peak),
+            'peak_gpu_memory':max(encode_memory.peak_gpu, decode_memory.peak_gpu),
+            }, decoded
+
+
+def render_psnr(gaussians, views, references, pipeline, background):
+    '''
+    Mean PSNR of the renders of views against the images references.
+    '''
+
+    with torch.no_grad():
+        renders = render_batch(views, gaussians, pipeline, background, importance=False)
+        return float(np.mean([psnr(render_pkg['render'][None], reference[None]).item()
+                              for render_pkg, reference in zip(renders, references)]))
+
+
+def run_benchmark(models, configs, depth=DEPTH, num_workers=None, device="cuda", views=None, pipeline=None,
+                  background=None):
+    '''
+    Results of every setting of configs (benchmark_grid) on every (name,
+    GaussianModel) of models: the measures of run_config, plus the PSNR of the
+    decoded renders against the uncompressed ones when views (a list of
+    cameras, or a function of the model returning them) are given.
+    '''
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for name, gaussians in models:
+            model_views = views(gaussians) if callable(views) else views
+            if model_views:
+                with torch.no_grad():
+                    references = [render_pkg['render'] for render_pkg in render_batch(model_views, gaussians, pipeline, background, importance=False)]
+            for config in configs:
+                measures, decoded = run_config(os.path.join(directory, 'compressed_gs.bin'), gaussians, config, depth,
+                                               num_workers, device)
+                if model_views:
+                    measures['psnr'] = render_psnr(decoded, model_views, references, pipeline, background)
+                results.append(dict(model=name, **config, **measures))
+                del decoded
+    return results
+
+
+def result_key(result):
+    return (result['model'], result['codec'], json.dumps(result['Qstep'], sort_keys=True),
+            result.get('chunk_size'), result.get('codebook_size'))
+
+
+def comparison_table(results, baseline=None):
+    '''
+    Markdown table of the results of run_benchmark, with the relative change
+    of the COMPARED measures against the result of the same model and setting
+    in baseline (a list of results) when there is one.
+    '''
+
+    baseline = {result_key(result): result for result in baseline or []}
+    lines = ['| model | codec | Qstep | size (MB) | bits/Gaussian | encode (s) | decode (s) | peak memory (MB) | PSNR | vs baseline |',
+             '|---|---|---|---|---|---|---|---|---|---|']
+    for result in results:
+        setting = result['codec']
+        if 'chunk_size' in result:
+            setting += ' {}'.format(result['chunk_size'])
+        if 'codebook_size' in result:
+            setting += ' {}'.format(result['codebook_size'])
+
+        changes = []
+        base = baseline.get(result_key(result))
+        for measure in COMPARED:
+            if base is None or base.get(measure) is None or result.get(measure) is None:
+                continue
+            if measure == 'psnr':
+                changes.append('psnr {:+.2f} dB'.format(result[measure] - base[measure]))
+            elif base[measure] > 0:
+                changes.append('{} {:+.1%}'.format(measure, result[measure] / base[measure] - 1))
+        lines.append('| {} | {} | {} | {:.3f} | {:.2f} | {:.2f} | {:.2f} | {:.1f} | {} | {} |'.format(
+            result['model'], setting, json.dumps(result['Qstep']), result['size'] / 2**20, result['bits_per_gaussian'],
+            result['encode_time'], result['decode_time'], result['peak_memory'] / 2**20,
+            '{:.2f}'.format(result['psnr']) if 'psnr' in result else '-', ', '.join(changes) or '-'))
+    return '\n'.join(lines)
+
+
+if __name__ == "__main__":
+    # Benchmark the codecs over PLYs and synthetic models
+    parser = ArgumentParser(description="Compression benchmark parameters")
+    pipeline = PipelineParams(parser)
+    parser.add_argument("plys", type=str, nargs="*", help="point_cloud.ply of trained models")
+    parser.add_argument("--synthetic", type=int, nargs="*", default=[100_000], help="Gaussians of the synthetic models to add")
+    parser.add_argument("--sh_degree", type=int, default=3, help="SH degree of the models")
+    parser.add_argument("--codecs", type=str, nargs="+", default=list(CODECS), choices=CODECS)
+    parser.add_argument("--qsteps", type=float, nargs="+", default=[QSTEP])
+    parser.add_argument("--depth", type=int, default=DEPTH)
+    parser.add_argument("--chunk_size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--codebook_size", type=int, default=CODEBOOK_SIZE)
+    parser.add_argument("--num_workers", type=int, default=None, help="Processes encoding the chunks, all cores by default")
+    parser.add_argument("--device", type=str, default="cuda")
+    parser.add_argument("--psnr", action="store_true", help="Also measure the PSNR of the decoded renders against the uncompressed ones")
+    parser.add_argument("--cameras", type=str, default=None, help="cameras.json style file of the PSNR views, an orbit around every model by default")
+    parser.add_argument("--num_views", type=int, default=8, help="Views of the orbit of --psnr")
+    parser.add_argument("--white_background", action="store_true")
+    parser.add_argument("--output", type=str, default="benchmark.json", help="JSON file of the results")
+    parser.add_argument("--baseline", type=str, default=None, help="JSON results of an earlier run to compare to")
+    parser.add_argument("--save_baseline", action="store_true", help="Write the results to --baseline instead of comparing to it")
+    args = parser.parse_args(sys.argv[1:])
+
+    models = []
+    for path in args.plys:
+        gaussians = GaussianModel(args.sh_degree)
+        gaussians.load_ply(path, args.device)
+        models.append((path, gaussians))
+    for num_points in args.synthetic:
+        models.append(('synthetic_{}'.format(num_points), synthetic_model(num_points, args.sh_degree, device=args.device)))
+
+    pipe = pipeline.extract(args)
+    if args.device == "cpu" and pipe.rasterizer == "cuda":
+        print("No CUDA rasterizer on the CPU, using the torch one")
+        pipe.rasterizer = "torch"
+
+    views = None
+    background = torch.tensor([1, 1, 1] if args.white_background else [0, 0, 0], dtype=torch.float32, device=args.device)
+    if args.psnr:
+        views = load_trajectory(args.cameras, args.device) if args.cameras else lambda gaussians: orbit_cameras(gaussians, args.num_views, device=args.device)
+
+    configs = benchmark_grid(args.codecs, args.qsteps, args.chunk_size, args.codebook_size)
+    results = run_benchmark(models, configs, args.depth, args.num_workers, args.device, views, pipe, background)
+
+    with open(args.output, 'w') as fp:
+        json.dump(results, fp, indent=True)
+    print("Wrote " + args.output)
+
+    baseline = None
+    if args.baseline is not None and args.save_baseline:
+        with open(args.baseline, 'w') as fp:
+            json.dump(results, fp, indent=True)
+        print("Wrote the baseline " + args.baseline)
+    elif args.baseline is not None:
+        with open(args.baseline) as fp:
+            baseline = json.load(fp)
+    print(comparison_table(results, baseline))
@@ -0,0 +1,68 @@
+import subprocess
+import sys
+import unittest
+import torch
+from benchmark import PeakMemory, benchmark_grid, comparison_table, orbit_cameras, run_benchmark, synthetic_model
+from utils.testing_utils import FakePipe
+
+
+class BenchmarkTest(unittest.TestCase):
+    def test_given_a_synthetic_model__when_benchmarking__then_measure_every_setting(
+        self,
+    ) -> None:
+        model = synthetic_model(3_000, sh_degree=1, device="cpu")
+        configs = benchmark_grid(qsteps=(0.01, 0.04), chunk_size=1_000, codebook_size=64)
+
+        results = run_benchmark([("synthetic", model)], configs, num_workers=1, device="cpu",
+                                views=lambda gaussians: orbit_cameras(gaussians, 2, 40, 30, device="cpu"),
+                                pipeline=FakePipe(), background=torch.zeros(3))
+
+        self.assertEqual(len(results), 6)
+        self.assertEqual([result["codec"] for result in results], ["raht", "raht", "chunked", "chunked", "vq", "vq"])
+        for result in results:
+            self.assertEqual(result["num_gaussians"], 3_000)
+            self.assertAlmostEqual(result["bits_per_gaussian"], 8 * result["size"] / 3_000)
+            self.assertGreater(result["encode_time"], 0)
+            self.assertGreater(result["decode_time"], 0)
+            self.assertGreaterEqual(result["peak_memory"], 0)
+            self.assertGreater(result["psnr"], 20)
+        # a coarser step, a smaller file and a lower psnr
+        self.assertLess(results[1]["size"], results[0]["size"])
+        self.assertLess(results[1]["psnr"], results[0]["psnr"])
+
+    def test_given_a_baseline__when_tabulating__then_show_the_change_of_the_same_settings(
+        self,
+    ) -> None:
+        result = {"model": "synthetic", "codec": "vq", "Qstep": 0.02, "codebook_size": 64, "size": 2_000, "num_gaussians": 100,
+                  "bits_per_gaussian": 160.0, "encode_time": 1.0, "decode_time": 0.5, "peak_memory": 2**20, "psnr": 40.0}
+        baseline = [dict(result, size=1_000, psnr=41.0), dict(result, codec="raht", size=10)]
+
+        table = comparison_table([result], baseline).splitlines()
+
+        self.assertEqual(len(table), 3)
+        self.assertIn("| vq 64 |", table[2])
+        self.assertIn("size +100.0%", table[2])
+        self.assertIn("psnr -1.00 dB", table[2])
+        self.assertIn("encode_time +0.0%", table[2])
+        self.assertTrue(comparison_table([result]).endswith("| - |"))
+
+    def test_given_an_allocation__when_measuring__then_report_a_peak_above_it(
+        self,
+    ) -> None:
+        with PeakMemory() as memory:
+            data = torch.ones(64 * 2**20, dtype=torch.uint8)
+
+        self.assertGreaterEqual(memory.peak, 32 * 2**20)
+        self.assertEqual(data.shape[0], 64 * 2**20)
+
+    def test_given_a_child_process_allocating__when_measuring__then_count_its_memory(
+        self,
+    ) -> None:
+        with PeakMemory() as memory:
+            subprocess.run([sys.executable, "-c", "import time; data = b'x' * (64 * 2**20); time.sleep(0.1)"], check=True)
+
+        self.assertGreaterEqual(memory.peak, 48 * 2**20)
+
+
+if __name__ == "__main__":
+    unittest.main()
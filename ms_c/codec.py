@@ -0,0 +1,436 @@
+import os
+import sys
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.abspath(os.path.join(BASE_DIR, '..')))
+
+import collections
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
+import torch
+from torch import nn
+from Haar3D_torch import haar3D_fast, inv_haar3D_fast, inv_haar3D_lod, raht_tree
+from scene.gaussian_model import GaussianModel
+from scene.spatial_index import frustum_planes, in_frustum
+from utils.container_utils import pack_container, read_container, unpack_container
+from utils.entropy_utils import decode_coefficients, encode_coefficients
+from utils.general_utils import build_quaternion, build_scaling_rotation
+from utils.morton_utils import morton_encode
+from utils.octree_utils import decode_geometry, encode_geometry, voxelize
+from utils.vq_utils import assign, decode_indices, encode_indices, kmeans
+
+DEPTH = 16
+QSTEP = 0.02
+# most Gaussians of a chunk of compress_chunked
+CHUNK_SIZE = 65536
+# fewest coeffs of a band of lod_bands
+MIN_BAND_SIZE = 16384
+# attributes sharing a quantization step, in the order of model_features
+ATTRIBUTE_GROUPS = ('dc', 'rest', 'scale', 'rotation', 'opacity')
+
+
+def model_features(gaussians):
+    '''
+    Attributes (n, channels) of the Gaussians in the RAHT channel order:
+    features dc, features rest, scaling, rotation and opacity.
+    '''
+    num_g = gaussians._xyz.shape[0]
+    return torch.cat((gaussians._features_dc.reshape(num_g, -1),
+                      gaussians._features_rest.reshape(num_g, -1),
+                      gaussians._scaling.reshape(num_g, -1),
+                      gaussians._rotation.reshape(num_g, -1),
+                      gaussians._opacity.reshape(num_g, -1),), 1
+                     )
+
+
+def lod_bands(depth_CT, depth):
+    '''
+    Bands [lo, hi) of depth levels, from the coarsest, each coded in its own
+    section so that a prefix of the container decodes to a coarser model.
+    Bands end on octree levels (3 depth levels) and hold at least
+    MIN_BAND_SIZE coeffs, the finest one aside.
+    '''
+
+    counts = np.bincount(np.asarray(depth_CT), minlength=depth*3)
+    bands = []
+    hi, size = depth*3, 0
+    for lo in range(depth*3 - 3, -1, -3):
+        size += counts[lo:lo+3].sum()
+        if size >= MIN_BAND_SIZE or lo == 0:
+            bands.append([lo, hi])
+            hi, size = lo, 0
+    return bands
+
+
+def channel_steps(Qstep, sh_degree):
+    '''
+    Quantization step of every channel of model_features: Qstep is either one
+    step for all the channels or a dict of steps of the ATTRIBUTE_GROUPS.
+    '''
+
+    if not isinstance(Qstep, dict):
+        Qstep = dict.fromkeys(ATTRIBUTE_GROUPS, Qstep)
+    sizes = [3, 3 * ((sh_degree + 1) ** 2 - 1), 3, 4, 1]
+    return np.repeat([float(Qstep[group]) for group in ATTRIBUTE_GROUPS], sizes)
+
+
+def transform_model(pos, feat, depth=DEPTH, lossless_geometry=False):
+    '''
+    Octree geometry bytes of the positions pos (n, 3) and RAHT (haar3D_fast)
+    of the attributes feat (n, channels) of the Gaussians kept, one per voxel in
+    morton order, with their voxels and their index in pos.
+    '''
+
+    with torch.no_grad():
+        geometry, pos_voxlized, pos_idx = encode_geometry(np.asarray(pos), depth, lossless_geometry)
+        feat = torch.as_tensor(feat)
+        feat = feat[torch.tensor(pos_idx, device=feat.device)]
+        return geometry, pos_voxlized, pos_idx, haar3D_fast(pos_voxlized, feat, depth)
+
+
+def pack_model(geometry, CT, depth_CT, sh_degree, depth=DEPTH, Qstep=QSTEP, codebook=None, indices=None):
+    '''
+    Container bytes of the geometry and of the RAHT coeffs CT, quantized with
+    the steps of channel_steps(Qstep) and entropy coded band by band
+    (lod_bands) from the coarsest. With a codebook (k, 3 * sh rest), CT has no
+    SH rest channels: the SH rest of every Gaussian is the code of indices.
+    '''
+
+    steps = torch.tensor(channel_steps(Qstep, 0 if codebook is not None else sh_degree), dtype=CT.dtype, device=CT.device)
+    CT_q = torch.round(CT/steps).cpu().numpy()
+    bands = lod_bands(depth_CT, depth)
+    sections = {'geometry':geometry}
+    if codebook is not None:
+        sections['codebook'] = codebook.cpu().numpy().astype(np.float16).tobytes()
+        sections['indices'] = encode_indices(indices.cpu().numpy(), codebook.shape[0])
+    for i, (lo, hi) in enumerate(bands):
+        rows = (depth_CT >= lo) & (depth_CT < hi)
+        sections['coefficients_{}'.format(i)] = encode_coefficients(CT_q[rows], depth_CT[rows])
+    return pack_container({'depth':depth, 'Qstep':Qstep, 'num_points':CT.shape[0], 'sh_degree':sh_degree,
+                           'bands':bands, 'codebook_size':0 if codebook is None else codebook.shape[0]},
+                          sections)
+
+
+def encode_model(pos, feat, sh_degree, depth=DEPTH, Qstep=QSTEP, lossless_geometry=False, codebook_size=0):
+    '''
+    Container bytes of the Gaussians with the positions pos (n, 3) and the
+    attributes feat (n, channels) of model_features (np.array or tensor):
+    octree geometry, then the entropy coded RAHT coefficients band by band
+    (lod_bands) from the coarsest. Qstep is one quantization step or a dict of
+    steps per attribute group (channel_steps). The header holds all the
+    decoder needs.
+
+    With codebook_size, the SH rest is vector quantized instead: a codebook of
+    that many codes (kmeans, on the device of feat) and the entropy coded code
+    index of every Gaussian, the RAHT codes the other attributes.
+    '''
+
+    with torch.no_grad():
+        feat = torch.as_tensor(feat)
+        num_sh = 3 * (sh_degree + 1) ** 2
+        if codebook_size == 0 or sh_degree == 0:
+            geometry, _, _, res = transform_model(pos, feat, depth, lossless_geometry)
+            return pack_model(geometry, res['CT'], res['depth_CT'].cpu().numpy(), sh_degree, depth, Qstep)
+
+        geometry, _, pos_idx, res = transform_model(pos, torch.cat((feat[:, :3], feat[:, num_sh:]), 1), depth, lossless_geometry)
+        rest = feat[torch.tensor(pos_idx, device=feat.device), 3:num_sh].float()
+        codebook = kmeans(rest, codebook_size)
+        return pack_model(geometry, res['CT'], res['depth_CT'].cpu().numpy(), sh_degree, depth, Qstep,
+                          codebook, assign(rest, codebook))
+
+
+def decode_model(data, device="cuda", level=None):
+    '''
+    Positions (n, 3) and attributes (n, channels) of encode_model as tensors
+    on device, with the header. The Gaussians come in morton order.
+
+    data may be a prefix of the container holding the geometry: the Gaussians
+    are then those of the finest level the bands in data reach. With level,
+    the inverse RAHT stops at that depth level (see inv_haar3D_lod) and the
+    points of every node are merged into one Gaussian (merge_gaussians).
+    '''
+
+    header, sections = unpack_container(data, partial=True)
+    depth = header['depth']
+    codebook_size = header.get('codebook_size', 0)
+    if 'geometry' not in sections or (codebook_size > 0 and 'indices' not in sections):
+        raise ValueError("the data does not hold the geometry")
+
+    # the bands in data, from the coarsest
+    bands = []
+    for i, band in enumerate(header['bands']):
+        if 'coefficients_{}'.format(i) not in sections:
+            break
+        bands.append(band)
+    finest = bands[-1][0] if bands else depth*3
+    if level is None:
+        level = finest
+    elif level < finest:
+        raise ValueError("the data reaches depth level {}, not {}".format(finest, level))
+
+    with torch.no_grad():
+        # octree decoding
+        pos_voxlized, pos = decode_geometry(sections['geometry'])
+
+        # entropy decoding, the contexts follow the depth levels of the RAHT tree
+        tree = raht_tree(pos_voxlized, depth, device)
+        depth_CT = tree['depth_CT'].cpu().numpy()
+        # without SH rest channels when it is vector quantized
+        sh_degree = 0 if codebook_size > 0 else header['sh_degree']
+        CT_q = np.zeros((pos_voxlized.shape[0], 3 * (sh_degree + 1) ** 2 + 8), dtype=np.int64)
+        for i, (lo, hi) in enumerate(bands):
+            if hi <= level:
+                break
+            rows = (depth_CT >= lo) & (depth_CT < hi)
+            CT_q[rows] = decode_coefficients(sections['coefficients_{}'.format(i)], depth_CT[rows])
+        steps = torch.tensor(channel_steps(header['Qstep'], sh_degree), dtype=torch.float32, device=device)
+        CT = torch.tensor(CT_q, device=device)*steps
+        pos = torch.tensor(pos, device=device)
+
+        # inverse RAHT
+        if level == 0:
+            feat_rec = inv_haar3D_fast(pos_voxlized, CT, depth, tree)
+        else:
+            res = inv_haar3D_lod(pos_voxlized, CT, depth, level, tree)
+            feat_rec = res['C']
+
+        # the SH rest is a table lookup of the codebook, averaged over the nodes of the level
+        if codebook_size > 0:
+            codebook = torch.tensor(np.frombuffer(sections['codebook'], dtype=np.float16).reshape(codebook_size, -1),
+                                    device=device).float()
+            rest = codebook[torch.tensor(decode_indices(sections['indices']), device=device)]
+            if level > 0:
+                rest = torch.zeros((res['w'].shape[0], rest.shape[1]), device=device).index_add_(0, res['node'], rest)
+                rest = rest / res['w'][:, None]
+            feat_rec = torch.cat((feat_rec[:, :3], rest, feat_rec[:, 3:]), 1)
+
+        if level > 0:
+            pos, feat_rec = merge_gaussians(pos, feat_rec, res['w'], res['node'], header['sh_degree'])
+
+    return pos, feat_rec, header
+
+
+def merge_gaussians(pos, feat, w, node, sh_degree):
+    '''
+    Positions and attributes of the Gaussians standing for groups of points:
+    node (n, ) is the group of every point of pos (n, 3), w the points per
+    group and feat the mean attributes of every group. The covariance is
+    that of the mean scaling and rotation plus the spread of the points,
+    the other attributes are the means.
+    '''
+
+    w = w.float()[:, None]
+    mean = torch.zeros((w.shape[0], 3), device=pos.device).index_add_(0, node, pos) / w
+    offsets = pos - mean[node]
+    spread = torch.zeros((w.shape[0], 3, 3), device=pos.device).index_add_(0, node, offsets[:, :, None]*offsets[:, None, :])
+
+    start = 3 * (sh_degree + 1) ** 2
+    # rotations of opposite signs may average out
+    rotation = feat[:, start+3:start+7]
+    identity = torch.tensor([1.0, 0.0, 0.0, 0.0], device=pos.device)
+    rotation = torch.where(rotation.norm(dim=1, keepdim=True) > 1e-6, rotation, identity)
+    L = build_scaling_rotation(torch.exp(feat[:, start:start+3]), rotation)
+    eigval, eigvec = torch.linalg.eigh((L @ L.transpose(1, 2) + spread / w[:, :, None]).double())
+    # a proper rotation
+    eigvec[:, :, 2] *= torch.sign(torch.linalg.det(eigvec))[:, None]
+
+    feat = feat.clone()
+    feat[:, start:start+3] = 0.5 * torch.log(torch.clamp_min(eigval, 1e-20)).float()
+    feat[:, start+3:start+7] = build_quaternion(eigvec).float()
+    return mean, feat
+
+
+def compress_model(path, gaussians, depth=DEPTH, Qstep=QSTEP, lossless_geometry=False, codebook_size=0):
+    '''
+    Write the Gaussians to a container at path, see encode_model.
+
+    Returns
+    -------
+    size : size of the file in bytes
+    '''
+
+    with torch.no_grad():
+        data = encode_model(gaussians._xyz.detach().cpu().numpy(), model_features(gaussians), gaussians.max_sh_degree,
+                            depth, Qstep, lossless_geometry, codebook_size)
+    with open(path, 'wb') as file:
+        file.write(data)
+    return os.path.getsize(path)
+
+
+def decompress_model(path, device="cuda", level=None):
+    '''
+    GaussianModel of a container of compress_model (or compress_chunked), on
+    device, without any dataset. level, if given, is the depth level of
+    decode_model to stop the inverse RAHT at.
+    '''
+
+    header, _ = read_container(path, names=())
+    if 'chunks' in header:
+        return decompress_chunked(path, device, level=level)
+
+    with open(path, 'rb') as file:
+        pos, feat_rec, header = decode_model(file.read(), device, level)
+    return model_from_features(pos, feat_rec, header['sh_degree'])
+
+
+def model_from_features(pos, feat, sh_degree):
+    '''
+    GaussianModel with the positions pos (n, 3) and the attributes feat (n,
+    channels) in the order of model_features.
+    '''
+
+    num_g = pos.shape[0]
+    num_rest = (sh_degree + 1) ** 2 - 1
+    splits = torch.split(feat.float(), [3, 3 * num_rest, 3, 4, 1], 1)
+
+    gaussians = GaussianModel(sh_degree)
+    gaussians._xyz = nn.Parameter(pos.float().requires_grad_(True))
+    gaussians._spatial_index = None
+    gaussians._features_dc = nn.Parameter(splits[0].reshape(num_g, 1, 3).contiguous().requires_grad_(True))
+    gaussians._features_rest = nn.Parameter(splits[1].reshape(num_g, num_rest, 3).contiguous().requires_grad_(True))
+    gaussians._scaling = nn.Parameter(splits[2].contiguous().requires_grad_(True))
+    gaussians._rotation = nn.Parameter(splits[3].contiguous().requires_grad_(True))
+    gaussians._opacity = nn.Parameter(splits[4].contiguous().requires_grad_(True))
+    gaussians.active_sh_degree = sh_degree
+    return gaussians
+
+
+def chunk_ranges(codes, depth, chunk_size=CHUNK_SIZE):
+    '''
+    Chunks of the sorted morton codes of a 2**depth grid, as ranges [start,
+    end): the octree nodes are split until they hold at most chunk_size
+    points, then sibling nodes are merged as long as they fit.
+    '''
+
+    nodes = []
+    # level, node code, start, end
+    stack = [(0, 0, 0, codes.shape[0])]
+    while stack:
+        level, node, start, end = stack.pop()
+        if end - start <= chunk_size or level == depth:
+            if end > start:
+                nodes.append((level, node >> 3, start, end))
+            continue
+        shift = 3 * (depth - level - 1)
+        bounds = start + np.searchsorted(codes[start:end], ((node << 3) + np.arange(9)) << shift)
+        # reversed, so the children pop in morton order
+        for child in range(7, -1, -1):
+            stack.append((level + 1, (node << 3) + child, bounds[child], bounds[child + 1]))
+
+    ranges = []
+    parents = []
+    for level, parent, start, end in nodes:
+        if ranges and parents[-1] == (level, parent) and end - ranges[-1][0] <= chunk_size:
+            ranges[-1] = (ranges[-1][0], end)
+        else:
+            ranges.append((start, end))
+            parents.append((level, parent))
+    return ranges
+
+
+def chunk_pool(num_workers):
+    '''
+    Pool of num_workers processes with one torch thread each, or a thread in
+    this process for a single worker.
+    '''
+
+    if num_workers == 1:
+        return ThreadPoolExecutor(1)
+    return ProcessPoolExecutor(num_workers, mp_context=multiprocessing.get_context('spawn'),
+                               initializer=torch.set_num_threads, initargs=(1,))
+
+
+def decode_chunk(data, level=None):
+    pos, feat, _ = decode_model(data, "cpu", level)
+    return pos.numpy(), feat.numpy()
+
+
+def compress_chunked(path, gaussians, chunk_size=CHUNK_SIZE, depth=DEPTH, Qstep=QSTEP, lossless_geometry=False, num_workers=None,
+                     codebook_size=0):
+    '''
+    Write the Gaussians to a container of independently coded chunks (a
+    container of encode_model each), spatial blocks in morton order encoded on
+    num_workers processes. The header indexes the bounding sphere and the
+    largest scale of every chunk, decompress_chunked uses them to decode the
+    chunks a view can see. At most two chunks per worker are in flight.
+
+    Returns
+    -------
+    size : size of the file in bytes
+    '''
+
+    num_workers = num_workers or os.cpu_count()
+    with torch.no_grad():
+        pos = gaussians._xyz.detach().cpu().numpy()
+        feat = model_features(gaussians).detach().cpu().numpy()
+        max_scales = gaussians.get_scaling.detach().max(dim=1).values.cpu().numpy()
+
+    V, _, _ = voxelize(pos, depth)
+    codes = morton_encode(V)
+    order = np.argsort(codes, kind='stable')
+    ranges = chunk_ranges(codes[order], depth, chunk_size)
+
+    chunks = []
+    sections = {}
+    pending = collections.deque()
+    with chunk_pool(num_workers) as pool:
+        for i, (start, end) in enumerate(ranges):
+            idx = order[start:end]
+            lower, upper = pos[idx].min(0), pos[idx].max(0)
+            center = (lower + upper) / 2
+            chunks.append({'center':center.tolist(),
+                           'radius':float(np.linalg.norm(pos[idx] - center, axis=1).max()),
+                           'max_scale':float(max_scales[idx].max())})
+            pending.append((i, pool.submit(encode_model, pos[idx], feat[idx], gaussians.max_sh_degree, depth, Qstep, lossless_geometry,
+                                           codebook_size)))
+            if len(pending) >= 2 * num_workers:
+                j, future = pending.popleft()
+                sections['chunk_{}'.format(j)] = future.result()
+        for j, future in pending:
+            sections['chunk_{}'.format(j)] = future.result()
+
+    with open(path, 'wb') as file:
+        file.write(pack_container({'sh_degree':gaussians.max_sh_degree, 'depth':depth, 'Qstep':Qstep, 'chunks':chunks}, sections))
+    return os.path.getsize(path)
+
+
+def visible_chunks(header, camera):
+    '''
+    Indices of the chunks of a compress_chunked header that can reach the view of camera.
+    '''
+
+    chunks = header['chunks']
+    if not chunks:
+        return []
+    device = camera.world_view_transform.device
+    centers = torch.tensor([chunk['center'] for chunk in chunks], dtype=torch.float32, device=device)
+    radii = torch.tensor([chunk['radius'] for chunk in chunks], dtype=torch.float32, device=device)
+    max_scales = torch.tensor([chunk['max_scale'] for chunk in chunks], dtype=torch.float32, device=device)
+    return torch.nonzero(in_frustum(centers, max_scales, frustum_planes(camera), radii)).squeeze(1).tolist()
+
+
+def decompress_chunked(path, device="cuda", camera=None, chunks=None, num_workers=1, level=None):
+    '''
+    GaussianModel of the chunks of a compress_chunked container: the given
+    chunks, those camera can see, or all of them, down to the depth level
+    of decode_model. Only these are read from the file, and decoded on
+    num_workers processes when more than one.
+    '''
+
+    header, _ = read_container(path, names=())
+    if chunks is None:
+        chunks = visible_chunks(header, camera) if camera is not None else range(len(header['chunks']))
+    names = ['chunk_{}'.format(i) for i in chunks]
+    _, sections = read_container(path, names)
+
+    if num_workers > 1:
+        with chunk_pool(num_workers) as pool:
+            decoded = list(pool.map(decode_chunk, [sections[name] for name in names], [level] * len(names)))
+        decoded = [(torch.tensor(pos, device=device), torch.tensor(feat, device=device)) for pos, feat in decoded]
+    else:
+        decoded = [decode_model(sections[name], device, level)[:2] for name in names]
+
+    num_channels = 3 * (header['sh_degree'] + 1) ** 2 + 8
+    pos = torch.cat([pos for pos, _ in decoded]) if decoded else torch.zeros((0, 3), device=device)
+    feat = torch.cat([feat for _, feat in decoded]) if decoded else torch.zeros((0, num_channels), device=device)
+    return model_from_features(pos, feat, header['sh_degree'])
@@ -0,0 +1,178 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import torch
+from torch import nn
+from codec import (chunk_ranges, compress_chunked, compress_model, decode_model, decompress_chunked, decompress_model,
+                   encode_model, model_features, visible_chunks)
+from scene.gaussian_model import GaussianModel
+from utils.testing_utils import make_camera
+from utils.container_utils import read_container
+
+
+def make_model(num_points, sh_degree=1, seed=0):
+    generator = torch.Generator().manual_seed(seed)
+    num_rest = (sh_degree + 1) ** 2 - 1
+    model = GaussianModel(sh_degree)
+    model._xyz = nn.Parameter(torch.randn((num_points, 3), generator=generator))
+    model._features_dc = nn.Parameter(torch.rand((num_points, 1, 3), generator=generator))
+    model._features_rest = nn.Parameter(torch.randn((num_points, num_rest, 3), generator=generator) * 0.1)
+    model._scaling = nn.Parameter(torch.log(torch.rand((num_points, 3), generator=generator) * 0.1 + 0.01))
+    model._rotation = nn.Parameter(torch.randn((num_points, 4), generator=generator))
+    model._opacity = nn.Parameter(torch.randn((num_points, 1), generator=generator))
+    model.active_sh_degree = sh_degree
+    return model
+
+
+class CodecTest(unittest.TestCase):
+    def test_given_a_model__when_compressing_and_decompressing__then_restore_it_without_a_dataset(
+        self,
+    ) -> None:
+        model = make_model(3_000)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "compressed_gs.bin")
+            size = compress_model(path, model, depth=16, Qstep=0.01, lossless_geometry=True)
+            decoded = decompress_model(path, device="cpu")
+
+        # one Gaussian per voxel, in morton order
+        order = [np.nonzero((model._xyz.detach() == xyz).all(1).numpy())[0][0] for xyz in decoded._xyz.detach()]
+        self.assertEqual(len(set(order)), 3_000)
+        self.assertEqual(decoded.max_sh_degree, 1)
+        self.assertEqual(decoded.active_sh_degree, 1)
+        self.assertEqual(decoded._features_rest.shape, (3_000, 3, 3))
+        self.assertTrue(torch.allclose(model_features(decoded), model_features(model)[order], atol=0.01))
+        self.assertLess(size, 3_000 * 4 * (3 + 3 + 9 + 8))
+
+    def test_given_a_decoded_model__when_saving_it__then_load_the_same_ply(
+        self,
+    ) -> None:
+        model = make_model(500, sh_degree=0)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "compressed_gs.bin")
+            compress_model(path, model)
+            decoded = decompress_model(path, device="cpu")
+            decoded.save_ply(os.path.join(directory, "point_cloud.ply"))
+            loaded = GaussianModel(0)
+            loaded.load_ply(os.path.join(directory, "point_cloud.ply"), device="cpu")
+
+        self.assertTrue(torch.equal(loaded._xyz, decoded._xyz))
+        self.assertTrue(torch.allclose(model_features(loaded), model_features(decoded)))
+
+
+class CodebookTest(unittest.TestCase):
+    def test_given_a_codebook_size__when_encoding__then_look_up_the_sh_rest_in_the_codebook(
+        self,
+    ) -> None:
+        model = make_model(4_000, sh_degree=2)
+        with torch.no_grad():
+            # sh rest drawn from 16 vectors
+            generator = torch.Generator().manual_seed(1)
+            model._features_rest[:] = torch.randn((16, 8, 3), generator=generator)[torch.randint(16, (4_000,), generator=generator)]
+        data = encode_model(model._xyz.detach().numpy(), model_features(model), 2, depth=16, Qstep=0.01,
+                            lossless_geometry=True, codebook_size=256)
+
+        pos, feat, header = decode_model(data, "cpu")
+        coarse, coarse_feat, _ = decode_model(data, "cpu", level=30)
+
+        order = [np.nonzero((model._xyz.detach() == xyz).all(1).numpy())[0][0] for xyz in pos]
+        self.assertEqual(header["codebook_size"], 256)
+        self.assertEqual(feat.shape, (4_000, 3 * 9 + 8))
+        self.assertTrue(torch.allclose(feat, model_features(model)[order], atol=0.01))
+        self.assertLess(len(data), len(encode_model(model._xyz.detach().numpy(), model_features(model), 2, depth=16,
+                                                    Qstep=0.01, lossless_geometry=True)))
+        self.assertLess(coarse.shape[0], 4_000)
+        self.assertEqual(coarse_feat.shape[1], 3 * 9 + 8)
+
+
+class LevelOfDetailTest(unittest.TestCase):
+    def test_given_a_level__when_decoding__then_merge_the_gaussians_of_its_nodes(
+        self,
+    ) -> None:
+        model = make_model(5_000)
+        data = encode_model(model._xyz.detach().numpy(), model_features(model), 1, depth=8, Qstep=0.001)
+
+        full, feat_full, header = decode_model(data, "cpu")
+        coarse, feat, _ = decode_model(data, "cpu", level=9)
+
+        self.assertEqual(header["bands"][-1][0], 0)
+        self.assertLess(coarse.shape[0], full.shape[0])
+        # merged Gaussians are larger and keep the mean color
+        self.assertGreater(feat[:, 12:15].mean().item(), feat_full[:, 12:15].mean().item())
+        self.assertAlmostEqual(feat[:, 0].mean().item(), feat_full[:, 0].mean().item(), delta=0.05)
+        self.assertTrue(torch.isfinite(feat).all())
+
+    def test_given_a_prefix_of_the_container__when_decoding__then_decode_a_coarser_model(
+        self,
+    ) -> None:
+        model = make_model(30_000, sh_degree=0)
+        model._xyz.data *= 0.1
+        data = encode_model(model._xyz.detach().numpy(), model_features(model), 0, depth=10)
+
+        num_points = [decode_model(data[:size], "cpu")[0].shape[0] for size in (len(data) // 2, len(data))]
+
+        self.assertLess(num_points[0], num_points[1])
+        self.assertEqual(num_points[1], decode_model(data, "cpu", level=0)[0].shape[0])
+        with self.assertRaises(ValueError):
+            decode_model(data[:len(data) // 2], "cpu", level=0)
+
+
+class ChunkedCodecTest(unittest.TestCase):
+    def test_given_sorted_codes__when_chunking__then_cover_them_with_bounded_chunks(
+        self,
+    ) -> None:
+        rng = np.random.default_rng(0)
+        codes = np.sort(rng.integers(0, 2**30, 10_000))
+
+        ranges = chunk_ranges(codes, 10, chunk_size=1_000)
+
+        self.assertEqual(ranges[0][0], 0)
+        self.assertEqual(ranges[-1][1], codes.shape[0])
+        self.assertTrue(all(end == start for (_, end), (start, _) in zip(ranges[:-1], ranges[1:])))
+        self.assertTrue(all(0 < end - start <= 1_000 for start, end in ranges))
+        self.assertLess(len(ranges), 40)
+
+    def test_given_a_model__when_compressing_in_chunks__then_decode_the_same_gaussians(
+        self,
+    ) -> None:
+        model = make_model(6_000)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "compressed_gs.bin")
+            compress_chunked(path, model, chunk_size=1_000, Qstep=0.01, lossless_geometry=True, num_workers=2)
+            header, _ = read_container(path, names=())
+            decoded = decompress_model(path, device="cpu")
+            in_processes = decompress_chunked(path, device="cpu", num_workers=2)
+
+        order = [np.nonzero((model._xyz.detach() == xyz).all(1).numpy())[0][0] for xyz in decoded._xyz.detach()]
+        self.assertGreaterEqual(len(header["chunks"]), 6)
+        self.assertEqual(len(set(order)), 6_000)
+        self.assertTrue(torch.allclose(model_features(decoded), model_features(model)[order], atol=0.01))
+        self.assertTrue(torch.equal(model_features(in_processes), model_features(decoded)))
+
+    def test_given_a_camera__when_decompressing_in_chunks__then_decode_only_the_visible_chunks(
+        self,
+    ) -> None:
+        model = make_model(4_000)
+        with torch.no_grad():
+            # half of the scene in front of the camera, half behind it
+            model._xyz[:2_000, 2] += 10
+            model._xyz[2_000:, 2] -= 10
+        camera = make_camera()
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "compressed_gs.bin")
+            compress_chunked(path, model, chunk_size=500, num_workers=1)
+            header, _ = read_container(path, names=())
+            visible = visible_chunks(header, camera)
+            decoded = decompress_chunked(path, device="cpu", camera=camera)
+
+        self.assertLess(len(visible), len(header["chunks"]))
+        self.assertTrue((decoded._xyz[:, 2] > 0).all())
+        self.assertEqual(decoded._xyz.shape[0], 2_000)
+
+
+if __name__ == "__main__":
+    unittest.main()
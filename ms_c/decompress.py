@@ -0,0 +1,54 @@
+import os
+import sys
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.abspath(os.path.join(BASE_DIR, '..')))
+
+import time
+import torch
+from argparse import ArgumentParser
+from tqdm import tqdm
+from arguments import PipelineParams
+from gaussian_renderer import render_batch
+from utils.trajectory_utils import load_trajectory
+from utils.writer_utils import ImageWriterPool, to_uint8
+
+from codec import decompress_model
+
+
+def render_cameras(cameras_path, render_path, gaussians, pipeline, background, device):
+    '''
+    Render the cameras of a cameras.json style file, loaded only now.
+    '''
+    views = load_trajectory(cameras_path, device)
+    os.makedirs(render_path, exist_ok=True)
+    with torch.no_grad(), ImageWriterPool() as writer:
+        render_pkgs = render_batch(views, gaussians, pipeline, background, importance=False)
+        for idx, render_pkg in enumerate(tqdm(render_pkgs, total=len(views), desc="Rendering progress")):
+            writer.submit(os.path.join(render_path, '{0:05d}'.format(idx) + ".png"), to_uint8(render_pkg["render"]))
+
+
+if __name__ == "__main__":
+    # Decode a compressed model without its dataset
+    parser = ArgumentParser(description="Decompression script parameters")
+    pipeline = PipelineParams(parser)
+    parser.add_argument("compressed", type=str, help="compressed_gs.bin written by run.py")
+    parser.add_argument("--output", type=str, default=None, help="PLY to write, point_cloud.ply next to the compressed file by default")
+    parser.add_argument("--device", type=str, default="cuda")
+    parser.add_argument("--cameras", type=str, default=None, help="Also render the cameras of a cameras.json style file")
+    parser.add_argument("--render_dir", type=str, default=None, help="Where the renders of --cameras go, renders next to the compressed file by default")
+    parser.add_argument("--white_background", action="store_true")
+    parser.add_argument("--level", type=int, default=None, help="Depth level of the RAHT tree to decode down to, coarser levels give fewer, merged Gaussians")
+    args = parser.parse_args(sys.argv[1:])
+
+    start = time.perf_counter()
+    gaussians = decompress_model(args.compressed, args.device, args.level)
+    print("Decoded {} Gaussians in {:.2f}s".format(gaussians._xyz.shape[0], time.perf_counter() - start))
+
+    output = args.output or os.path.join(os.path.dirname(os.path.abspath(args.compressed)), "point_cloud.ply")
+    gaussians.save_ply(output)
+    print("Wrote " + output)
+
+    if args.cameras is not None:
+        background = torch.tensor([1, 1, 1] if args.white_background else [0, 0, 0], dtype=torch.float32, device=args.device)
+        render_dir = args.render_dir or os.path.join(os.path.dirname(os.path.abspath(args.compressed)), "renders")
+        render_cameras(args.cameras, render_dir, gaussians, pipeline.extract(args), background, args.device)
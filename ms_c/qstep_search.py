@@ -0,0 +1,149 @@
+import os
+import sys
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.abspath(os.path.join(BASE_DIR, '..')))
+
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import torch
+from gaussian_renderer import render_batch
+from Haar3D_torch import inv_haar3D_fast, raht_tree
+from utils.image_utils import psnr
+from utils.octree_utils import decode_geometry
+from utils.vq_utils import assign, kmeans
+
+from codec import (ATTRIBUTE_GROUPS, DEPTH, QSTEP, channel_steps, model_features, model_from_features, pack_model,
+                   transform_model)
+
+# scalings of the steps tried by candidate_qsteps
+FACTORS = (0.5, 1, 2)
+
+
+def candidate_qsteps(base=QSTEP, factors=FACTORS, groups=ATTRIBUTE_GROUPS):
+    '''
+    Step sets (dicts of channel_steps) around base: base scaled by every
+    factor, and each of these with the step of one of groups scaled again by
+    every other factor.
+    '''
+
+    if not isinstance(base, dict):
+        base = dict.fromkeys(ATTRIBUTE_GROUPS, base)
+    candidates = []
+    for factor in factors:
+        scaled = {group: step * factor for group, step in base.items()}
+        candidates.append(scaled)
+        for group, other in itertools.product(groups, factors):
+            if other != 1:
+                candidates.append(dict(scaled, **{group: scaled[group] * other}))
+    return candidates
+
+
+def pareto_front(sizes, psnrs):
+    '''
+    Indices of the candidates no other one beats in both size and PSNR, by
+    increasing size (and so increasing PSNR).
+    '''
+
+    front = []
+    best = -np.inf
+    for i in np.lexsort((-np.asarray(psnrs), np.asarray(sizes))):
+        if psnrs[i] > best:
+            front.append(int(i))
+            best = psnrs[i]
+    return front
+
+
+def pick_qsteps(sizes, psnrs, target_size=None, target_psnr=None):
+    '''
+    Index of the Pareto-optimal candidate with the best PSNR within
+    target_size bytes, or the smallest one reaching target_psnr. Falls back to
+    the smallest (or the best) candidate when none meets the target.
+    '''
+
+    front = pareto_front(sizes, psnrs)
+    if target_size is not None:
+        within = [i for i in front if sizes[i] <= target_size]
+        return within[-1] if within else front[0]
+    if target_psnr is not None:
+        reaching = [i for i in front if psnrs[i] >= target_psnr]
+        return reaching[0] if reaching else front[-1]
+    raise ValueError("a target size or PSNR is needed")
+
+
+def search_qsteps(gaussians, views, pipeline, background, target_size=None, target_psnr=None, candidates=None,
+                  depth=DEPTH, lossless_geometry=False, num_workers=None, codebook_size=0):
+    '''
+    Quantization steps of encode_model for the Gaussians meeting target_size
+    (bytes) or target_psnr (see pick_qsteps), among candidates
+    (candidate_qsteps() by default).
+
+    The geometry and the RAHT are computed once. Every candidate is quantized
+    and entropy coded on a pool of num_workers threads, while this thread
+    renders views with the quantized attributes, the inverse RAHT of the next
+    candidate running meanwhile. The renders themselves stay serial, as they
+    share one device. The PSNR is against the
+    renders of the uncompressed Gaussians, so it measures the compression loss
+    only; views should be a small subsample of the test cameras.
+
+    With codebook_size, the SH rest is vector quantized as by encode_model,
+    with one codebook for all the candidates, and its step is not searched.
+
+    Returns
+    -------
+    Qstep : the chosen steps
+    results : size in bytes, PSNR and steps of every candidate
+    '''
+
+    sh_degree = gaussians.max_sh_degree
+    vq = codebook_size > 0 and sh_degree > 0
+    candidates = candidates or candidate_qsteps(groups=[group for group in ATTRIBUTE_GROUPS if not (vq and group == 'rest')])
+    num_workers = num_workers or os.cpu_count()
+    with torch.no_grad():
+        device = gaussians._xyz.device
+        feat = model_features(gaussians)
+        num_sh = 3 * (sh_degree + 1) ** 2
+        codebook, indices, rest = None, None, None
+        if vq:
+            geometry, pos_voxlized, pos_idx, res = transform_model(gaussians._xyz.detach().cpu().numpy(),
+                                                                   torch.cat((feat[:, :3], feat[:, num_sh:]), 1),
+                                                                   depth, lossless_geometry)
+            rest = feat[torch.tensor(pos_idx, device=feat.device), 3:num_sh].float()
+            codebook = kmeans(rest, codebook_size)
+            indices = assign(rest, codebook)
+            # the decoder looks the SH rest up in the float16 codebook
+            rest = codebook.half().float()[indices].to(device)
+        else:
+            geometry, pos_voxlized, _, res = transform_model(gaussians._xyz.detach().cpu().numpy(), feat,
+                                                             depth, lossless_geometry)
+        CT = res['CT']
+        depth_CT = res['depth_CT'].cpu().numpy()
+        tree = raht_tree(pos_voxlized, depth, device)
+        pos = torch.tensor(decode_geometry(geometry)[1], device=device)
+        references = [render_pkg["render"] for render_pkg in render_batch(views, gaussians, pipeline, background, importance=False)]
+
+        def dequantize(Qstep):
+            steps = torch.tensor(channel_steps(Qstep, 0 if vq else sh_degree), dtype=CT.dtype, device=CT.device)
+            feat = inv_haar3D_fast(pos_voxlized, torch.round(CT/steps)*steps, depth, tree).to(device)
+            if vq:
+                feat = torch.cat((feat[:, :3], rest, feat[:, 3:]), 1)
+            return model_from_features(pos, feat, sh_degree)
+
+        # the next candidate is dequantized on its own thread while this one renders
+        with ThreadPoolExecutor(num_workers) as pool, ThreadPoolExecutor(1) as prefetch:
+            sizes = [pool.submit(lambda Qstep: len(pack_model(geometry, CT, depth_CT, sh_degree, depth, Qstep, codebook,
+                                                              indices)), Qstep)
+                     for Qstep in candidates]
+            psnrs = []
+            quantized = prefetch.submit(dequantize, candidates[0])
+            for i in range(len(candidates)):
+                model = quantized.result()
+                if i + 1 < len(candidates):
+                    quantized = prefetch.submit(dequantize, candidates[i + 1])
+                renders = render_batch(views, model, pipeline, background, importance=False)
+                psnrs.append(float(np.mean([psnr(render_pkg["render"][None], reference[None]).item()
+                                            for render_pkg, reference in zip(renders, references)])))
+            sizes = [size.result() for size in sizes]
+
+    results = [{'size':size, 'psnr':value, 'Qstep':Qstep} for size, value, Qstep in zip(sizes, psnrs, candidates)]
+    return candidates[pick_qsteps(sizes, psnrs, target_size, target_psnr)], results
@@ -0,0 +1,96 @@
+import unittest
+import numpy as np
+import torch
+from codec import ATTRIBUTE_GROUPS, decode_model, encode_model, model_features
+from codec_test import make_model
+from qstep_search import candidate_qsteps, pareto_front, pick_qsteps, search_qsteps
+from utils.testing_utils import FakePipe, make_camera
+
+
+class ParetoTest(unittest.TestCase):
+    def test_given_candidates__when_taking_the_pareto_front__then_drop_the_dominated_ones(
+        self,
+    ) -> None:
+        sizes = [100, 200, 150, 300, 120]
+        psnrs = [30.0, 35.0, 29.0, 34.0, 32.0]
+
+        front = pareto_front(sizes, psnrs)
+
+        self.assertEqual(front, [0, 4, 1])
+
+    def test_given_a_target__when_picking__then_choose_the_pareto_optimal_candidate_meeting_it(
+        self,
+    ) -> None:
+        sizes = [100, 200, 150, 300, 120]
+        psnrs = [30.0, 35.0, 29.0, 34.0, 32.0]
+
+        self.assertEqual(pick_qsteps(sizes, psnrs, target_size=160), 4)
+        self.assertEqual(pick_qsteps(sizes, psnrs, target_size=50), 0)
+        self.assertEqual(pick_qsteps(sizes, psnrs, target_psnr=31), 4)
+        self.assertEqual(pick_qsteps(sizes, psnrs, target_psnr=40), 1)
+        with self.assertRaises(ValueError):
+            pick_qsteps(sizes, psnrs)
+
+
+class QstepSearchTest(unittest.TestCase):
+    def test_given_steps_per_group__when_encoding__then_write_them_and_quantize_each_group_with_its_own(
+        self,
+    ) -> None:
+        model = make_model(2_000)
+        Qstep = {'dc':0.001, 'rest':0.2, 'scale':0.001, 'rotation':0.001, 'opacity':0.001}
+
+        pos, feat, header = decode_model(encode_model(model._xyz.detach().numpy(), model_features(model), 1, depth=16,
+                                                      Qstep=Qstep, lossless_geometry=True), "cpu")
+
+        order = [np.nonzero((model._xyz.detach() == xyz).all(1).numpy())[0][0] for xyz in pos]
+        error = (feat - model_features(model)[order]).abs()
+        self.assertEqual(header["Qstep"], Qstep)
+        self.assertLess(error[:, :3].max().item(), 0.01)
+        self.assertGreater(error[:, 3:12].mean().item(), 10 * error[:, :3].mean().item())
+        self.assertLess(error[:, 12:].max().item(), 0.01)
+        self.assertEqual(len(candidate_qsteps()), 3 + 3 * len(ATTRIBUTE_GROUPS) * 2)
+
+    def test_given_a_target_size__when_searching__then_pick_steps_within_it(
+        self,
+    ) -> None:
+        model = make_model(2_000, sh_degree=0)
+        with torch.no_grad():
+            model._xyz[:, 2] += 8
+        views = [make_camera(), make_camera(t=[0.5, 0.0, 0.0])]
+        candidates = [{group: step for group in ATTRIBUTE_GROUPS} for step in (0.005, 0.02, 0.1)]
+
+        Qstep, results = search_qsteps(model, views, FakePipe(), torch.zeros(3), candidates=candidates, num_workers=2,
+                                       target_size=None, target_psnr=0.0)
+        sizes = [result["size"] for result in results]
+        psnrs = [result["psnr"] for result in results]
+        target = (sizes[0] + sizes[1]) // 2
+        within, _ = search_qsteps(model, views, FakePipe(), torch.zeros(3), candidates=candidates, num_workers=2,
+                                  target_size=target)
+
+        self.assertTrue(sizes[0] > sizes[1] > sizes[2])
+        self.assertTrue(psnrs[0] > psnrs[1] > psnrs[2])
+        self.assertEqual(Qstep, candidates[2])
+        self.assertEqual(within, candidates[1])
+
+    def test_given_a_codebook_size__when_searching__then_size_the_vector_quantized_container(
+        self,
+    ) -> None:
+        model = make_model(2_000, sh_degree=1)
+        with torch.no_grad():
+            model._xyz[:, 2] += 8
+        views = [make_camera()]
+        candidates = [{group: step for group in ATTRIBUTE_GROUPS} for step in (0.005, 0.1)]
+
+        Qstep, results = search_qsteps(model, views, FakePipe(), torch.zeros(3), candidates=candidates, num_workers=2,
+                                       target_psnr=0.0, codebook_size=64)
+
+        for result in results:
+            data = encode_model(model._xyz.detach().numpy(), model_features(model), 1, Qstep=result["Qstep"],
+                                codebook_size=64)
+            self.assertEqual(result["size"], len(data))
+        self.assertEqual(Qstep, candidates[1])
+        self.assertEqual(len(candidate_qsteps(groups=("dc", "scale"))), 3 + 3 * 2 * 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -8,16 +8,15 @@ from scene import Scene
 import os
 from tqdm import tqdm
 from os import makedirs
-from gaussian_renderer import render
-import torchvision
+from gaussian_renderer import render_batch
 from utils.general_utils import safe_state
+from utils.writer_utils import ImageWriterPool, to_uint8
 from argparse import ArgumentParser
 from arguments import ModelParams, PipelineParams, get_combined_args
 from gaussian_renderer import GaussianModel
-import numpy as np
 
-from Haar3D_torch import haar3D, inv_haar3D
-from utils.sh_utils import SH2RGB
+from codec import DEPTH, QSTEP, compress_chunked, compress_model, decompress_model
+from qstep_search import search_qsteps
 from pathlib import Path
 from PIL import Image
 import torchvision.transforms.functional as tf
@@ -109,15 +108,18 @@ def render_set(model_path, name, iteration, views, gaussians, pipeline, backgrou
     makedirs(render_path, exist_ok=True)
     makedirs(gts_path, exist_ok=True)
 
-    for idx, view in enumerate(tqdm(views, desc="Rendering progress")):
-        rendering = render(view, gaussians, pipeline, background)["render"]
-        gt = view.original_image[0:3, :, :]
-        torchvision.utils.save_image(rendering, os.path.join(render_path, '{0:05d}'.format(idx) + ".png"))
-        torchvision.utils.save_image(gt, os.path.join(gts_path, '{0:05d}'.format(idx) + ".png"))
+    # PNG encoding runs on the writer threads while the next views render
+    with ImageWriterPool() as writer:
+        render_pkgs = render_batch(views, gaussians, pipeline, background, importance=False)
+        for idx, (view, render_pkg) in enumerate(tqdm(zip(views, render_pkgs), total=len(views), desc="Rendering progress")):
+            rendering = render_pkg["render"]
+            gt = view.original_image[0:3, :, :]
+            writer.submit(os.path.join(render_path, '{0:05d}'.format(idx) + ".png"), to_uint8(rendering))
+            writer.submit(os.path.join(gts_path, '{0:05d}'.format(idx) + ".png"), to_uint8(gt), skip_unchanged=True)
 
 
 
-def compress(dataset : ModelParams, iteration : int, pipeline : PipelineParams, skip_train : bool, skip_test : bool):
+def compress(dataset : ModelParams, iteration : int, pipeline : PipelineParams, skip_train : bool, skip_test : bool, lossless_geometry : bool = False, chunk_size : int = 0, num_workers : int = None, target_size : float = None, target_psnr : float = None, search_views : int = 8, codebook_size : int = 0):
     with torch.no_grad():
         gaussians = GaussianModel(dataset.sh_degree)
         scene = Scene(dataset, gaussians, load_iteration=iteration, shuffle=False)
@@ -132,45 +134,26 @@ def compress(dataset : ModelParams, iteration : int, pipeline : PipelineParams,
         os.mkdir(dir_path)
         
 
-        depth=16
-        Qstep=0.02
-
-
-        # voxlize
-        pos=gaussians._xyz
-        pos_voxlized=(pos-pos.min())/(pos.max()-pos.min())
-        pos_voxlized=torch.round(pos_voxlized*(2**depth-1))
-        pos_voxlized, pos_idx = np.unique(pos_voxlized.detach().cpu().numpy(), axis=0, return_index=True)
-
-        pos_remain = pos[pos_idx]
-        rgb=SH2RGB(gaussians._features_dc+0)[:,0]
-        rgb=rgb[pos_idx]
-
-        pos_voxlized=(pos_remain-pos_remain.min())/(pos_remain.max()-pos_remain.min())
-        pos_voxlized=torch.round(pos_voxlized*(2**depth-1))
-        pos_voxlized=pos_voxlized.cpu().numpy()
-
-        num_g = pos.shape[0]
-
-
-
-        feat=torch.cat((gaussians._features_dc.reshape(num_g, -1),
-                       gaussians._features_rest.reshape(num_g, -1),
-                       gaussians._scaling.reshape(num_g, -1),
-                       gaussians._rotation.reshape(num_g, -1),
-                       gaussians._opacity.reshape(num_g, -1),), 1
-                       )
-        feat=feat[pos_idx]
-
-
-        # RAHT transform
-        res = haar3D(pos_voxlized, feat, depth)
-        CT = res['CT']
-        CT_q = torch.round(CT/Qstep)
-
-
-        # zip compression
-        np.savez_compressed(dir_path+'/compressed_gs.npz', pos_remain.cpu().numpy(), CT_q.cpu().numpy(), Qstep, depth)
+        # quantization steps per attribute group, searched on a subsample of the test views for a target size (mb) or psnr
+        Qstep = QSTEP
+        if target_size is not None or target_psnr is not None:
+            views = scene.getTestCameras()
+            views = views[::max(1, len(views) // search_views)][:search_views]
+            bg_color = [1,1,1] if dataset.white_background else [0, 0, 0]
+            background = torch.tensor(bg_color, dtype=torch.float32, device="cuda")
+            Qstep, results = search_qsteps(gaussians, views, pipeline, background,
+                                           None if target_size is None else target_size*1024*1024, target_psnr,
+                                           depth=DEPTH, lossless_geometry=lossless_geometry, num_workers=num_workers,
+                                           codebook_size=codebook_size)
+            with open(os.path.join(dir_path, '..', 'qstep_search.json'), 'w') as fp:
+                json.dump(results, fp, indent=True)
+            print('qstep: ', Qstep)
+
+        # octree geometry and entropy coded RAHT coefficients, of the whole scene or of independent chunks
+        if chunk_size > 0:
+            compress_chunked(dir_path+'/compressed_gs.bin', gaussians, chunk_size, depth=DEPTH, Qstep=Qstep, lossless_geometry=lossless_geometry, num_workers=num_workers, codebook_size=codebook_size)
+        else:
+            compress_model(dir_path+'/compressed_gs.bin', gaussians, depth=DEPTH, Qstep=Qstep, lossless_geometry=lossless_geometry, codebook_size=codebook_size)
         
         file_size=0
         import glob
@@ -185,46 +168,14 @@ def compress(dataset : ModelParams, iteration : int, pipeline : PipelineParams,
 
 def decompress(dataset : ModelParams, iteration : int, pipeline : PipelineParams, skip_train : bool, skip_test : bool):
     with torch.no_grad():
-        gaussians = GaussianModel(dataset.sh_degree)
-        scene = Scene(dataset, gaussians, shuffle=False)
-
-        dir_path=os.path.join(scene.model_path,
+        dir_path=os.path.join(dataset.model_path,
                     "point_cloud",
                     "iteration_" + str(iteration),
                     "compressed")
 
-        data = np.load(dir_path+'/compressed_gs.npz')
-
-        pos=data['arr_0']
-        CT_q=data['arr_1']
-        Qstep=data['arr_2']
-        depth=data['arr_3']
-
-        pos=torch.tensor(pos).cuda()
-        CT_q=torch.tensor(CT_q).cuda()
-        Qstep=torch.tensor(Qstep).cuda()
-
-
-        # voxlize
-        pos_voxlized=(pos-pos.min())/(pos.max()-pos.min())
-        pos_voxlized=torch.round(pos_voxlized*(2**depth-1))
-        pos_voxlized, pos_idx = np.unique(pos_voxlized.detach().cpu().numpy(), axis=0, return_index=True)     
-
-        # inverse RAHT
-        feat_rec = inv_haar3D(pos_voxlized, CT_q*(Qstep).item(), int(depth))
-
-        num_g_voxlized=pos_voxlized.shape[0]
-
-
-        gaussians._xyz = pos
-        gaussians._features_dc = feat_rec[:, :3].reshape(num_g_voxlized, -1, 3).float()
-        gaussians._features_rest = feat_rec[:, 3:48].reshape(num_g_voxlized, -1, 3)
-
-        gaussians._scaling = feat_rec[:, 48:51].reshape(num_g_voxlized, 3).float()
-        gaussians._rotation = feat_rec[:, 51:55].reshape(num_g_voxlized, 4).float()
-        gaussians._opacity = feat_rec[:, 55:56].reshape(num_g_voxlized, 1).float()
-        gaussians.active_sh_degree = dataset.sh_degree
-
+        # the model decodes on its own, the dataset is only read for the test views
+        gaussians = decompress_model(dir_path+'/compressed_gs.bin')
+        scene = Scene(dataset, GaussianModel(dataset.sh_degree), shuffle=False)
 
 
         bg_color = [1,1,1] if dataset.white_background else [0, 0, 0]
@@ -251,6 +202,13 @@ if __name__ == "__main__":
     parser.add_argument("--skip_train", action="store_true")
     parser.add_argument("--skip_test", action="store_true")
     parser.add_argument("--quiet", action="store_true")
+    parser.add_argument("--lossless_geometry", action="store_true")
+    parser.add_argument("--chunk_size", type=int, default=0, help="Compress spatial chunks of at most this many Gaussians independently, 0 for one transform over the scene")
+    parser.add_argument("--num_workers", type=int, default=None, help="Processes encoding the chunks, all cores by default")
+    parser.add_argument("--target_size", type=float, default=None, help="Search the quantization steps of the attribute groups for the best PSNR within this size in mb")
+    parser.add_argument("--target_psnr", type=float, default=None, help="Search the quantization steps of the attribute groups for the smallest size within this PSNR of the uncompressed renders")
+    parser.add_argument("--codebook_size", type=int, default=0, help="Vector quantize the SH rest with a codebook of this many codes (e.g. 4096) instead of the RAHT, 0 for the RAHT")
+    parser.add_argument("--search_views", type=int, default=8, help="Test views rendered per candidate of the quantization step search")
 
     args = get_combined_args(parser)
 
@@ -262,7 +220,7 @@ if __name__ == "__main__":
     # Initialize system state (RNG)
     
     # compress
-    file_size = compress(model.extract(args), args.iteration, pipeline.extract(args), args.skip_train, args.skip_test) 
+    file_size = compress(model.extract(args), args.iteration, pipeline.extract(args), args.skip_train, args.skip_test, args.lossless_geometry, args.chunk_size, args.num_workers, args.target_size, args.target_psnr, args.search_views, args.codebook_size)
     # decompress and render       
     decompress(model.extract(args), args.iteration, pipeline.extract(args), args.skip_train, args.skip_test)
     #evaluate
@@ -8,10 +8,10 @@ import torch
 from random import randint
 from utils.loss_utils import l1_loss, ssim
 from gaussian_renderer import network_gui
-from gaussian_renderer import render_imp, render_depth
+from gaussian_renderer import render_imp, render_batch
 import sys
 from scene import Scene, GaussianModel
-from utils.general_utils import safe_state
+from utils.general_utils import safe_state, weighted_sample_without_replacement
 import uuid
 from tqdm import tqdm
 from utils.image_utils import psnr
@@ -23,7 +23,6 @@ try:
 except ImportError:
     TENSORBOARD_FOUND = False
 
-import numpy as np
 from lpipsPyTorch import lpips
 from utils.sh_utils import SH2RGB
 
@@ -56,20 +55,7 @@ def training(dataset, opt, pipe, testing_iterations, saving_iterations, checkpoi
     mask_blur = torch.zeros(gaussians._xyz.shape[0], device='cuda')
     
     for iteration in range(first_iter, opt.iterations + 1):        
-        if network_gui.conn == None:
-            network_gui.try_connect()
-        while network_gui.conn != None:
-            try:
-                net_image_bytes = None
-                custom_cam, do_training, pipe.convert_SHs_python, pipe.compute_cov3D_python, keep_alive, scaling_modifer = network_gui.receive()
-                if custom_cam != None:
-                    net_image = render_imp(custom_cam, gaussians, pipe, background, scaling_modifer)["render"]
-                    net_image_bytes = memoryview((torch.clamp(net_image, min=0, max=1.0) * 255).byte().permute(1, 2, 0).contiguous().cpu().numpy())
-                network_gui.send(net_image_bytes, dataset.source_path)
-                if do_training and ((iteration < int(opt.iterations)) or not keep_alive):
-                    break
-            except Exception as e:
-                network_gui.conn = None
+        network_gui.update(gaussians, pipe, background, dataset.source_path, iteration == opt.iterations)
 
         iter_start.record()
 
@@ -114,7 +100,7 @@ def training(dataset, opt, pipe, testing_iterations, saving_iterations, checkpoi
                 progress_bar.close()
 
             # Log and save
-            training_report(tb_writer, iteration, Ll1, loss, l1_loss, iter_start.elapsed_time(iter_end), testing_iterations, scene, render_imp, (pipe, background))
+            training_report(tb_writer, iteration, Ll1, loss, l1_loss, iter_start.elapsed_time(iter_end), testing_iterations, scene, render_batch, (pipe, background))
             if (iteration in saving_iterations):
                 print("\n[ITER {}] Saving Gaussians".format(iteration))
                 scene.save(iteration)
@@ -147,27 +133,22 @@ def training(dataset, opt, pipe, testing_iterations, saving_iterations, checkpoi
                     out_pts_list=[]
                     gt_list=[]
                     views=scene.getTrainCameras()
-                    for view in views:
+                    for view, render_depth_pkg in zip(views, render_batch(views, gaussians, pipe, background, depth=True)):
                         gt = view.original_image[0:3, :, :]
-                        render_depth_pkg = render_depth(view, gaussians, pipe, background)
                         out_pts = render_depth_pkg["out_pts"]
                         accum_alpha = render_depth_pkg["accum_alpha"]
 
 
                         prob=1-accum_alpha
 
-                        prob = prob/prob.sum()
-                        prob = prob.reshape(-1).cpu().numpy()
-
 
                         factor=1/(image.shape[1]*image.shape[2]*len(views)/args.num_depth)
 
 
-                        N_xyz=prob.shape[0]
+                        N_xyz=prob.numel()
                         num_sampled=int(N_xyz*factor)
 
-                        indices = np.random.choice(N_xyz, size=num_sampled, p=prob)
-                        indices=np.unique(indices)
+                        indices = weighted_sample_without_replacement(prob, num_sampled)
                         
                         out_pts = out_pts.permute(1,2,0).reshape(-1,3)
                         gt = gt.permute(1,2,0).reshape(-1,3)
@@ -263,8 +244,9 @@ def training_report(tb_writer, iteration, Ll1, loss, l1_loss, elapsed, testing_i
                 psnr_test = 0.0
                 ssims = []
                 lpipss = []
-                for idx, viewpoint in enumerate(config['cameras']):
-                    image = torch.clamp(renderFunc(viewpoint, scene.gaussians, *renderArgs)["render"], 0.0, 1.0)
+                render_pkgs = renderFunc(config['cameras'], scene.gaussians, *renderArgs)
+                for idx, (viewpoint, render_pkg) in enumerate(zip(config['cameras'], render_pkgs)):
+                    image = torch.clamp(render_pkg["render"], 0.0, 1.0)
                     gt_image = torch.clamp(viewpoint.original_image.to("cuda"), 0.0, 1.0)
                     if tb_writer and (idx < 5):
                         tb_writer.add_images(config['name'] + "_view_{}/render".format(viewpoint.image_name), image[None], global_step=iteration)
@@ -307,6 +289,7 @@ if __name__ == "__main__":
     pp = PipelineParams(parser)
     parser.add_argument('--ip', type=str, default="127.0.0.1")
     parser.add_argument('--port', type=int, default=6009)
+    parser.add_argument('--gui_fps', type=float, default=30)
     parser.add_argument('--debug_from', type=int, default=-1)
     parser.add_argument('--detect_anomaly', action='store_true', default=False)
     parser.add_argument("--test_iterations", nargs="+", type=int, default=[7_000, 30_000])
@@ -328,7 +311,7 @@ if __name__ == "__main__":
     safe_state(args.quiet)
 
     # Start GUI server, configure and run training
-    network_gui.init(args.ip, args.port)
+    network_gui.init(args.ip, args.port, args.gui_fps, render_func=render_imp)
     torch.autograd.set_detect_anomaly(args.detect_anomaly)
 
 
@@ -12,15 +12,55 @@
 import torch
 from scene import Scene
 import os
+import shutil
+import time
 from tqdm import tqdm
 from os import makedirs
-from gaussian_renderer import render
-import torchvision
+from gaussian_renderer import render_batch
+from gaussian_renderer.tiled import resized_camera, save_tiled
+from utils.trajectory_utils import interpolate_trajectory, load_trajectory
+from utils.writer_utils import ImageWriterPool, VideoWriter, to_uint8
 from utils.general_utils import safe_state
 from argparse import ArgumentParser
 from arguments import ModelParams, PipelineParams, get_combined_args
 from gaussian_renderer import GaussianModel
 
+def render_trajectory(model_path, iteration, views, gaussians, pipeline, background, fps, as_video):
+    """
+    Render views as a stream, the frames are encoded on writer threads (ffmpeg
+    for a video, a pool of PNG writers otherwise) while the next ones render.
+    """
+    out_path = os.path.join(model_path, "trajectory", "ours_{}".format(iteration))
+    makedirs(out_path, exist_ok=True)
+    if as_video:
+        writer = VideoWriter(os.path.join(out_path, "video.mp4"), views[0].image_width, views[0].image_height, fps)
+    else:
+        writer = ImageWriterPool()
+
+    render_time = 0.0
+    start = time.perf_counter()
+    with writer:
+        render_pkgs = render_batch(views, gaussians, pipeline, background, importance=False)
+        for idx, view in enumerate(tqdm(views, desc="Rendering trajectory")):
+            render_start = time.perf_counter()
+            frame = to_uint8(next(render_pkgs)["render"])
+            render_time += time.perf_counter() - render_start
+            if as_video:
+                writer.write(frame)
+            else:
+                writer.submit(os.path.join(out_path, '{0:05d}'.format(idx) + ".png"), frame)
+    elapsed = time.perf_counter() - start
+    print("Rendered {} frames to {}: {:.1f} FPS sustained (encoding included), {:.1f} FPS rendering".format(
+        len(views), out_path, len(views) / elapsed, len(views) / max(render_time, 1e-9)))
+
+def render_set_tiled(model_path, name, iteration, views, gaussians, pipeline, background, render_width, tile_size):
+    render_path = os.path.join(model_path, name, "ours_{}".format(iteration), "renders_{}".format(render_width))
+    makedirs(render_path, exist_ok=True)
+
+    for idx, view in enumerate(tqdm(views, desc="Rendering progress")):
+        save_tiled(os.path.join(render_path, '{0:05d}'.format(idx) + ".png"), resized_camera(view, render_width),
+                   gaussians, pipeline, background, tile_size)
+
 def render_set(model_path, name, iteration, views, gaussians, pipeline, background):
     render_path = os.path.join(model_path, name, "ours_{}".format(iteration), "renders")
     gts_path = os.path.join(model_path, name, "ours_{}".format(iteration), "gt")
@@ -28,13 +68,16 @@ def render_set(model_path, name, iteration, views, gaussians, pipeline, backgrou
     makedirs(render_path, exist_ok=True)
     makedirs(gts_path, exist_ok=True)
 
-    for idx, view in enumerate(tqdm(views, desc="Rendering progress")):
-        rendering = render(view, gaussians, pipeline, background)["render"]
-        gt = view.original_image[0:3, :, :]
-        torchvision.utils.save_image(rendering, os.path.join(render_path, '{0:05d}'.format(idx) + ".png"))
-        torchvision.utils.save_image(gt, os.path.join(gts_path, '{0:05d}'.format(idx) + ".png"))
+    # PNG encoding runs on the writer threads while the next views render
+    with ImageWriterPool() as writer:
+        render_pkgs = render_batch(views, gaussians, pipeline, background, importance=False)
+        for idx, (view, render_pkg) in enumerate(tqdm(zip(views, render_pkgs), total=len(views), desc="Rendering progress")):
+            rendering = render_pkg["render"]
+            gt = view.original_image[0:3, :, :]
+            writer.submit(os.path.join(render_path, '{0:05d}'.format(idx) + ".png"), to_uint8(rendering))
+            writer.submit(os.path.join(gts_path, '{0:05d}'.format(idx) + ".png"), to_uint8(gt), skip_unchanged=True)
 
-def render_sets(dataset : ModelParams, iteration : int, pipeline : PipelineParams, skip_train : bool, skip_test : bool):
+def render_sets(dataset : ModelParams, iteration : int, pipeline : PipelineParams, skip_train : bool, skip_test : bool, render_width : int = None, tile_size : int = 1024, trajectory : str = None, trajectory_frames : int = 300, fps : int = 30, image_sequence : bool = False):
     with torch.no_grad():
         gaussians = GaussianModel(dataset.sh_degree)
         scene = Scene(dataset, gaussians, load_iteration=iteration, shuffle=False)
@@ -42,11 +85,24 @@ def render_sets(dataset : ModelParams, iteration : int, pipeline : PipelineParam
         bg_color = [1,1,1] if dataset.white_background else [0, 0, 0]
         background = torch.tensor(bg_color, dtype=torch.float32, device="cuda")
 
-        if not skip_train:
-             render_set(dataset.model_path, "train", scene.loaded_iter, scene.getTrainCameras(), gaussians, pipeline, background)
+        if trajectory is not None:
+            if trajectory == "train":
+                views = interpolate_trajectory(scene.getTrainCameras(), trajectory_frames, num_keyframes=min(30, len(scene.getTrainCameras())))
+            else:
+                views = load_trajectory(trajectory)
+            as_video = not image_sequence and shutil.which("ffmpeg") is not None
+            if not image_sequence and not as_video:
+                print("ffmpeg not found, writing an image sequence")
+            render_trajectory(dataset.model_path, scene.loaded_iter, views, gaussians, pipeline, background, fps, as_video)
+            return
 
-        if not skip_test:
-             render_set(dataset.model_path, "test", scene.loaded_iter, scene.getTestCameras(), gaussians, pipeline, background)
+        for name, skip, views in [("train", skip_train, scene.getTrainCameras), ("test", skip_test, scene.getTestCameras)]:
+            if skip:
+                continue
+            if render_width is not None:
+                render_set_tiled(dataset.model_path, name, scene.loaded_iter, views(), gaussians, pipeline, background, render_width, tile_size)
+            else:
+                render_set(dataset.model_path, name, scene.loaded_iter, views(), gaussians, pipeline, background)
 
 if __name__ == "__main__":
     # Set up command line argument parser
@@ -57,10 +113,17 @@ if __name__ == "__main__":
     parser.add_argument("--skip_train", action="store_true")
     parser.add_argument("--skip_test", action="store_true")
     parser.add_argument("--quiet", action="store_true")
+    parser.add_argument("--render_width", type=int, default=None, help="Render the views at this width (e.g. 7680) in tiles instead of at the dataset resolution")
+    parser.add_argument("--tile_size", type=int, default=1024)
+    parser.add_argument("--trajectory", type=str, default=None, help="Render a camera path instead of the views: 'train' for a path through the training poses, or a cameras.json style file")
+    parser.add_argument("--trajectory_frames", type=int, default=300)
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--image_sequence", action="store_true", help="Write the trajectory as PNG frames instead of a video")
     args = get_combined_args(parser)
     print("Rendering " + args.model_path)
 
     # Initialize system state (RNG)
     safe_state(args.quiet)
 
-    render_sets(model.extract(args), args.iteration, pipeline.extract(args), args.skip_train, args.skip_test)
\ No newline at end of file
+    render_sets(model.extract(args), args.iteration, pipeline.extract(args), args.skip_train, args.skip_test, args.render_width, args.tile_size,
+                args.trajectory, args.trajectory_frames, args.fps, args.image_sequence)
\ No newline at end of file
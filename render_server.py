@@ -0,0 +1,312 @@
+import io
+import json
+import os
+import queue
+import threading
+import time
+import urllib.request
+from argparse import ArgumentParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+import torch
+from PIL import Image
+from arguments import ModelParams, PipelineParams, get_combined_args
+from gaussian_renderer import render_batch, GaussianModel
+from gaussian_renderer.render_cache import RenderCache, model_version
+from scene.cameras import MiniCam
+from utils.graphics_utils import getProjectionMatrix
+from utils.system_utils import searchForMaxIteration
+
+FORMATS = {"png": "image/png", "jpeg": "image/jpeg", "raw": "application/octet-stream"}
+
+
+def camera_from_request(request, device):
+    """
+    MiniCam from a request: width, height, fov_x, fov_y (radians), view_matrix
+    (the 16 values of a world_view_transform, as stored by Camera) and
+    optionally z_near / z_far.
+    """
+    width, height = int(request["width"]), int(request["height"])
+    fovx, fovy = float(request["fov_x"]), float(request["fov_y"])
+    znear, zfar = float(request.get("z_near", 0.01)), float(request.get("z_far", 100.0))
+    world_view_transform = torch.tensor(request["view_matrix"], dtype=torch.float32).reshape(4, 4).to(device)
+    projection_matrix = getProjectionMatrix(znear=znear, zfar=zfar, fovX=fovx, fovY=fovy).transpose(0, 1).to(device)
+    return MiniCam(width, height, fovy, fovx, znear, zfar, world_view_transform, world_view_transform @ projection_matrix)
+
+
+def encode_image(image, fmt, quality=90):
+    # same uint8 conversion as torchvision.utils.save_image, raw is HxWx3 uint8
+    array = image.mul(255).add_(0.5).clamp_(0, 255).permute(1, 2, 0).to("cpu", torch.uint8).numpy()
+    if fmt == "raw":
+        return array.tobytes()
+    buffer = io.BytesIO()
+    Image.fromarray(array).save(buffer, format="PNG" if fmt == "png" else "JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+class RenderRequest:
+    def __init__(self, camera, fmt, quality):
+        self.camera = camera
+        self.fmt = fmt
+        self.quality = quality
+        self.submitted = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class RenderStats:
+    """
+    Request latency (submission to encoded frame) and throughput counters.
+    """
+
+    def __init__(self, window=1000):
+        self.lock = threading.Lock()
+        self.start = time.perf_counter()
+        self.window = window
+        self.requests = 0
+        self.errors = 0
+        self.batches = 0
+        self.latencies = []
+
+    def record(self, batch):
+        now = time.perf_counter()
+        with self.lock:
+            self.batches += 1
+            self.requests += len(batch)
+            self.errors += sum(request.error is not None for request in batch)
+            self.latencies.extend(now - request.submitted for request in batch)
+            self.latencies = self.latencies[-self.window:]
+
+    def as_dict(self):
+        with self.lock:
+            elapsed = time.perf_counter() - self.start
+            latencies = np.array(self.latencies) * 1000
+            return {
+                "requests": self.requests,
+                "errors": self.errors,
+                "batches": self.batches,
+                "mean_batch_size": self.requests / self.batches if self.batches else 0.0,
+                "throughput_fps": self.requests / elapsed if elapsed > 0 else 0.0,
+                "latency_ms_mean": float(latencies.mean()) if len(latencies) else 0.0,
+                "latency_ms_p50": float(np.percentile(latencies, 50)) if len(latencies) else 0.0,
+                "latency_ms_p95": float(np.percentile(latencies, 95)) if len(latencies) else 0.0,
+            }
+
+
+class RenderServer:
+    """
+    Renders the requests of any number of client threads on one worker thread.
+    Requests arriving within max_wait seconds of each other are coalesced into
+    one render_batch call of up to max_batch views. Encoded frames are kept in
+    cache (a RenderCache, None to disable) until the Gaussians change.
+    """
+
+    def __init__(self, gaussians, pipe, background, max_batch=8, max_wait=0.005, cache=None):
+        self.gaussians = gaussians
+        self.pipe = pipe
+        self.background = background
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.cache = cache
+        self.requests = queue.Queue()
+        self.stats = RenderStats()
+        self.stopped = threading.Event()
+        self.worker = None
+
+    @property
+    def device(self):
+        return self.gaussians.get_xyz.device
+
+    def start(self):
+        self.worker = threading.Thread(target=self._work, daemon=True)
+        self.worker.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        if self.worker is not None:
+            self.worker.join()
+
+    def render(self, camera, fmt="png", quality=90, timeout=None):
+        if fmt not in FORMATS:
+            raise ValueError("Unknown format {}, expected one of {}".format(fmt, list(FORMATS)))
+        key = None
+        if self.cache is not None:
+            key, version = self.cache.key(camera, fmt, quality), model_version(self.gaussians)
+            frame = self.cache.get(key, version)
+            if frame is not None:
+                return frame
+        request = RenderRequest(camera, fmt, quality)
+        self.requests.put(request)
+        if not request.done.wait(timeout):
+            raise TimeoutError("Render request timed out")
+        if request.error is not None:
+            raise request.error
+        if key is not None:
+            self.cache.put(key, version, request.result)
+        return request.result
+
+    def stats_dict(self):
+        stats = self.stats.as_dict()
+        if self.cache is not None:
+            stats.update(self.cache.stats())
+        return stats
+
+    def _next_batch(self):
+        try:
+            batch = [self.requests.get(timeout=0.1)]
+        except queue.Empty:
+            return []
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.requests.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _work(self):
+        while not self.stopped.is_set():
+            batch = self._next_batch()
+            if len(batch) == 0:
+                continue
+            try:
+                render_pkgs = render_batch([request.camera for request in batch], self.gaussians, self.pipe, self.background)
+                for request, render_pkg in zip(batch, render_pkgs):
+                    request.result = encode_image(render_pkg["render"], request.fmt, request.quality)
+            except Exception as e:
+                for request in batch:
+                    if request.result is None:
+                        request.error = e
+            self.stats.record(batch)
+            for request in batch:
+                request.done.set()
+
+
+def make_handler(server):
+    class RenderHandler(BaseHTTPRequestHandler):
+        def _send(self, code, body, content_type, headers={}):
+            self.send_response(code)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            for key, value in headers.items():
+                self.send_header(key, str(value))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _send_json(self, code, obj):
+            self._send(code, json.dumps(obj).encode("utf-8"), "application/json")
+
+        def do_GET(self):
+            if self.path == "/stats":
+                self._send_json(200, server.stats_dict())
+            else:
+                self._send_json(404, {"error": "unknown path " + self.path})
+
+        def do_POST(self):
+            if self.path != "/render":
+                self._send_json(404, {"error": "unknown path " + self.path})
+                return
+            try:
+                request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                fmt = request.get("format", "png")
+                camera = camera_from_request(request, server.device)
+            except Exception as e:
+                self._send_json(400, {"error": repr(e)})
+                return
+            try:
+                body = server.render(camera, fmt, int(request.get("quality", 90)))
+            except ValueError as e:
+                self._send_json(400, {"error": str(e)})
+                return
+            except Exception as e:
+                self._send_json(500, {"error": repr(e)})
+                return
+            self._send(200, body, FORMATS[fmt], {"X-Width": camera.image_width, "X-Height": camera.image_height})
+
+        def log_message(self, format, *args):
+            pass
+
+    return RenderHandler
+
+
+def serve(server, host="127.0.0.1", port=6010):
+    """
+    HTTP front end of server: POST /render with a JSON camera (see
+    camera_from_request, plus format and quality) returns the frame,
+    GET /stats the counters. Use port 0 for any free port.
+    """
+    return ThreadingHTTPServer((host, port), make_handler(server))
+
+
+class RenderClient:
+    """
+    Minimal client of the HTTP API, raw frames are returned as HxWx3 uint8 arrays.
+    """
+
+    def __init__(self, host="127.0.0.1", port=6010, timeout=60):
+        self.url = "http://{}:{}".format(host, port)
+        self.timeout = timeout
+
+    def render(self, width, height, fov_x, fov_y, view_matrix, fmt="png", quality=90, **kwargs):
+        request = dict(width=width, height=height, fov_x=fov_x, fov_y=fov_y, format=fmt, quality=quality,
+                       view_matrix=[float(v) for v in np.asarray(view_matrix).reshape(-1)], **kwargs)
+        http_request = urllib.request.Request(self.url + "/render", data=json.dumps(request).encode("utf-8"),
+                                              headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(http_request, timeout=self.timeout) as response:
+            body = response.read()
+        if fmt == "raw":
+            return np.frombuffer(body, dtype=np.uint8).reshape(height, width, 3)
+        return body
+
+    def stats(self):
+        with urllib.request.urlopen(self.url + "/stats", timeout=self.timeout) as response:
+            return json.loads(response.read())
+
+
+if __name__ == "__main__":
+    # Set up command line argument parser
+    parser = ArgumentParser(description="Headless render server")
+    model = ModelParams(parser, sentinel=True)
+    pipeline = PipelineParams(parser)
+    parser.add_argument("--iteration", default=-1, type=int)
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6010)
+    parser.add_argument("--device", type=str, default="cuda")
+    parser.add_argument("--max_batch", type=int, default=8)
+    parser.add_argument("--max_wait_ms", type=float, default=5.0)
+    parser.add_argument("--cache_mb", type=float, default=256, help="Budget of the frame cache, 0 disables it")
+    args = get_combined_args(parser)
+
+    dataset, pipe = model.extract(args), pipeline.extract(args)
+    if args.device == "cpu" and pipe.rasterizer == "cuda":
+        print("No CUDA rasterizer on the CPU, using the torch one")
+        pipe.rasterizer = "torch"
+
+    iteration = args.iteration
+    if iteration == -1:
+        iteration = searchForMaxIteration(os.path.join(dataset.model_path, "point_cloud"))
+    ply_path = os.path.join(dataset.model_path, "point_cloud", "iteration_" + str(iteration), "point_cloud.ply")
+    gaussians = GaussianModel(dataset.sh_degree)
+    gaussians.load_ply(ply_path, device=args.device)
+    print("Loaded {} Gaussians from {}".format(gaussians.get_xyz.shape[0], ply_path))
+
+    bg_color = [1, 1, 1] if dataset.white_background else [0, 0, 0]
+    background = torch.tensor(bg_color, dtype=torch.float32, device=args.device)
+
+    cache = RenderCache(int(args.cache_mb * 2**20)) if args.cache_mb > 0 else None
+    server = RenderServer(gaussians, pipe, background, max_batch=args.max_batch, max_wait=args.max_wait_ms / 1000,
+                          cache=cache).start()
+    httpd = serve(server, args.host, args.port)
+    print("Serving on http://{}:{}".format(*httpd.server_address))
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        server.stop()
@@ -0,0 +1,115 @@
+import io
+import math
+import threading
+import unittest
+import urllib.error
+import numpy as np
+import torch
+from torch import nn
+from PIL import Image
+from gaussian_renderer import render_imp
+from gaussian_renderer.render_cache import RenderCache
+from render_server import RenderClient, RenderServer, camera_from_request, encode_image, serve
+from scene.gaussian_model import GaussianModel
+from utils.testing_utils import FakePipe
+
+
+def make_model(num_points=200):
+    generator = torch.Generator().manual_seed(0)
+    model = GaussianModel(0)
+    model._xyz = nn.Parameter(torch.cat([torch.rand((num_points, 2), generator=generator) * 2 - 1,
+                                         torch.rand((num_points, 1), generator=generator) * 2 + 3], 1))
+    model._features_dc = nn.Parameter(torch.rand((num_points, 1, 3), generator=generator))
+    model._features_rest = nn.Parameter(torch.zeros((num_points, 0, 3)))
+    model._scaling = nn.Parameter(torch.log(torch.rand((num_points, 3), generator=generator) * 0.1 + 0.02))
+    model._rotation = nn.Parameter(torch.randn((num_points, 4), generator=generator))
+    model._opacity = nn.Parameter(torch.randn((num_points, 1), generator=generator))
+    return model
+
+
+def view_matrix(x):
+    view = np.eye(4)
+    view[3, 0] = x
+    return view
+
+
+class RenderServerTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.model = make_model()
+        self.background = torch.tensor([0.0, 0.0, 0.0])
+        self.server = RenderServer(self.model, FakePipe(), self.background, max_batch=4, max_wait=0.2).start()
+        self.httpd = serve(self.server, "127.0.0.1", 0)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        self.client = RenderClient(*self.httpd.server_address)
+        self.camera = dict(width=32, height=24, fov_x=math.radians(60), fov_y=math.radians(50))
+
+    def tearDown(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.server.stop()
+
+    def test_given_concurrent_requests__when_rendering__then_coalesce_them_into_batches(
+        self,
+    ) -> None:
+        frames = [None] * 8
+
+        def request(i):
+            frames[i] = self.client.render(view_matrix=view_matrix(0.05 * i), fmt="raw", **self.camera)
+
+        threads = [threading.Thread(target=request, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        for i, frame in enumerate(frames):
+            camera = camera_from_request(dict(view_matrix=view_matrix(0.05 * i).reshape(-1).tolist(), **self.camera), "cpu")
+            with torch.no_grad():
+                expected = encode_image(render_imp(camera, self.model, FakePipe(), self.background)["render"], "raw")
+            self.assertEqual(frame.shape, (24, 32, 3))
+            self.assertEqual(frame.tobytes(), expected)
+        stats = self.client.stats()
+        self.assertEqual(stats["requests"], 8)
+        self.assertLess(stats["batches"], 8)
+        self.assertGreater(stats["latency_ms_p95"], 0)
+
+    def test_given_compressed_formats__when_rendering__then_return_decodable_images(
+        self,
+    ) -> None:
+        for fmt in ["png", "jpeg"]:
+            body = self.client.render(view_matrix=view_matrix(0.0), fmt=fmt, **self.camera)
+            image = Image.open(io.BytesIO(body))
+            self.assertEqual(image.format, fmt.upper())
+            self.assertEqual(image.size, (32, 24))
+
+    def test_given_an_unknown_format__when_rendering__then_answer_bad_request(
+        self,
+    ) -> None:
+        with self.assertRaises(urllib.error.HTTPError) as context:
+            self.client.render(view_matrix=view_matrix(0.0), fmt="bmp", **self.camera)
+
+        self.assertEqual(context.exception.code, 400)
+
+    def test_given_a_cache__when_repeating_a_request__then_render_once_until_the_model_changes(
+        self,
+    ) -> None:
+        server = RenderServer(self.model, FakePipe(), self.background, max_wait=0.0, cache=RenderCache()).start()
+        camera = camera_from_request(dict(view_matrix=view_matrix(0.0).reshape(-1).tolist(), **self.camera), "cpu")
+        try:
+            first = server.render(camera, "raw")
+            repeated = server.render(camera, "raw")
+            with torch.no_grad():
+                self.model._xyz.add_(0.01)
+            server.render(camera, "raw")
+        finally:
+            server.stop()
+
+        stats = server.stats_dict()
+        self.assertEqual(first, repeated)
+        self.assertEqual(stats["requests"], 2)
+        self.assertEqual(stats["cache_hits"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -10,8 +10,10 @@
 #
 
 import os
+import copy
 import random
 import json
+import shutil
 from utils.system_utils import searchForMaxIteration
 from scene.dataset_readers import sceneLoadTypeCallbacks
 from scene.gaussian_model import GaussianModel
@@ -67,6 +69,7 @@ class Scene:
             random.shuffle(scene_info.test_cameras)  # Multi-res consistent random shuffling
 
         self.cameras_extent = scene_info.nerf_normalization["radius"]
+        self.point_cloud = scene_info.point_cloud
 
         print(f"Cameras extent: {self.cameras_extent}")
 
@@ -84,6 +87,26 @@ class Scene:
         else:
             self.gaussians.create_from_pcd(scene_info.point_cloud, self.cameras_extent)
 
+    def fork(self, model_path, gaussians : GaussianModel):
+        """
+        Share the already loaded cameras with another run that writes to
+        model_path and starts from the same initial point cloud.
+        """
+        scene = copy.copy(self)
+        scene.model_path = model_path
+        scene.loaded_iter = None
+        scene.gaussians = gaussians
+
+        os.makedirs(model_path, exist_ok=True)
+        for fname in ["input.ply", "cameras.json"]:
+            src = os.path.join(self.model_path, fname)
+            dst = os.path.join(model_path, fname)
+            if os.path.exists(src) and os.path.abspath(src) != os.path.abspath(dst):
+                shutil.copyfile(src, dst)
+
+        gaussians.create_from_pcd(self.point_cloud, self.cameras_extent)
+        return scene
+
     def save(self, iteration):
         point_cloud_path = os.path.join(self.model_path, "point_cloud/iteration_{}".format(iteration))
         self.gaussians.save_ply(os.path.join(point_cloud_path, "point_cloud.ply"))
@@ -0,0 +1,128 @@
+import math
+import torch
+
+BLOCK_X = 16
+BLOCK_Y = 16
+
+
+def frustum_planes(camera, znear=0.2):
+    """
+    World space planes (normals, offsets, slacks) bounding the Gaussians the
+    rasterizer can give a non zero radius: with p the center and s the max scale
+    of a Gaussian, it is culled if n . p + d < -slack * s for one of the planes.
+
+    The side planes follow from the screen radius of the kernel,
+    ceil(3 sqrt(lambda_max)) <= 3 |J|_F s / z + 3 sqrt(0.92) + 1 pixels, and from
+    the 16x16 tiles of the last row / column reaching past the image. The near
+    plane is the z > 0.2 test on the center.
+    """
+    W, H = camera.image_width, camera.image_height
+    tanx = math.tan(camera.FoVx * 0.5)
+    tany = math.tan(camera.FoVy * 0.5)
+    focal_x = W / (2 * tanx)
+    focal_y = H / (2 * tany)
+    # |J|_F z, with the clamping of the kernel at 1.3 tan(fov / 2)
+    jacobian_norm = math.sqrt(focal_x**2 * (1 + (1.3 * tanx)**2) + focal_y**2 * (1 + (1.3 * tany)**2))
+    pixel_margin = 3 * math.sqrt(0.92) + 1 + 0.5
+    # the center lands on pixel f x / z + W / 2 - 0.5
+    bound_x = (BLOCK_X * math.ceil(W / BLOCK_X) - W / 2 + 0.5 + pixel_margin) / focal_x
+    bound_y = (BLOCK_Y * math.ceil(H / BLOCK_Y) - H / 2 + 0.5 + pixel_margin) / focal_y
+
+    view = camera.world_view_transform
+    normals = torch.tensor([[1, 0, bound_x], [-1, 0, bound_x], [0, 1, bound_y], [0, -1, bound_y], [0, 0, 1]],
+                           dtype=view.dtype, device=view.device)
+    offsets = torch.tensor([0, 0, 0, 0, -znear], dtype=view.dtype, device=view.device)
+    slacks = torch.tensor([3 * jacobian_norm / focal_x] * 2 + [3 * jacobian_norm / focal_y] * 2 + [0],
+                          dtype=view.dtype, device=view.device)
+    # n . (R^T p + t) + d = (R n) . p + n . t + d with view = [[R^T, 0], [t, 1]]
+    return normals @ view[:3, :3].T, normals @ view[3, :3] + offsets, slacks
+
+
+def in_frustum(centers, max_scales, planes, radii=None):
+    """
+    Frustum test of Gaussians, or of groups of them when radii (the radius of
+    the sphere around centers holding all of them) are given.
+    """
+    normals, offsets, slacks = planes
+    bound = max_scales[:, None] * slacks
+    if radii is not None:
+        bound = bound + radii[:, None] * normals.norm(dim=1)
+    return ((centers @ normals.T + offsets) >= -bound).all(dim=1)
+
+
+class VoxelGridIndex:
+    """
+    Uniform voxel grid over the Gaussian centers, stored as CSR (point indices
+    sorted by cell, with the end offset of every cell).
+
+    Memberships are fixed when the grid is built, which GaussianModel does
+    again after densification and pruning. The bounding sphere and max scale of
+    every cell are recomputed from the current positions and scales whenever
+    they change, so queries stay conservative while the Gaussians move between
+    rebuilds.
+    """
+
+    def __init__(self, xyz, points_per_cell=64):
+        xyz = xyz.detach()
+        self.num_points = xyz.shape[0]
+
+        # size the cells on the bulk of the scene, far away points just land in sparse cells
+        if self.num_points > 0:
+            sample = xyz[torch.randperm(self.num_points, device=xyz.device)[:100_000]]
+            lower = torch.quantile(sample, 0.01, dim=0)
+            upper = torch.quantile(sample, 0.99, dim=0)
+        else:
+            lower = upper = torch.zeros(3, device=xyz.device)
+        num_cells = max(1, self.num_points // points_per_cell)
+        volume = torch.clamp_min(upper - lower, 1e-6).prod().item()
+        self.cell_size = (volume / num_cells) ** (1 / 3)
+
+        coords = torch.floor((xyz - lower) / self.cell_size).long()
+        _, self.point_cell, self.cell_count = torch.unique(coords, dim=0, return_inverse=True, return_counts=True)
+        self.order = torch.argsort(self.point_cell)
+        self.cell_end = torch.cumsum(self.cell_count, 0)
+
+        self.version = None
+        self.cell_center = None
+        self.cell_radius = None
+        self.cell_scale = None
+
+    @property
+    def num_cells(self):
+        return self.cell_count.shape[0]
+
+    def update_bounds(self, xyz, max_scales):
+        index = self.point_cell[:, None].expand(-1, 3)
+        lower = torch.full((self.num_cells, 3), math.inf, device=xyz.device).scatter_reduce(0, index, xyz, reduce="amin")
+        upper = torch.full((self.num_cells, 3), -math.inf, device=xyz.device).scatter_reduce(0, index, xyz, reduce="amax")
+        self.cell_center = (lower + upper) / 2
+        self.cell_radius = (upper - lower).norm(dim=1) / 2
+        self.cell_scale = torch.zeros(self.num_cells, device=xyz.device).scatter_reduce(0, self.point_cell, max_scales, reduce="amax")
+
+    @torch.no_grad()
+    def query(self, camera, xyz, scaling, version=None):
+        """
+        Sorted indices of the Gaussians (centers xyz, activated scaling) that
+        may be visible from camera, a superset of the ones the rasterizer keeps.
+        The cell bounds are only recomputed when version differs from the one
+        of the last query, or always if it is None.
+        """
+        xyz = xyz.detach()
+        max_scales = scaling.detach().max(dim=1).values
+        if version is None or version != self.version:
+            self.update_bounds(xyz, max_scales)
+            self.version = version
+
+        planes = tuple(t.to(xyz) for t in frustum_planes(camera))
+        cells = torch.nonzero(in_frustum(self.cell_center, self.cell_scale, planes, radii=self.cell_radius)).squeeze(1)
+
+        # expand the CSR ranges of the selected cells
+        counts = self.cell_count[cells]
+        starts = self.cell_end[cells] - counts
+        offsets = torch.cumsum(counts, 0) - counts
+        positions = torch.arange(int(counts.sum()), device=xyz.device)
+        positions = positions + torch.repeat_interleave(starts - offsets, counts)
+        candidates = self.order[positions]
+
+        keep = in_frustum(xyz[candidates], max_scales[candidates], planes)
+        return torch.sort(candidates[keep]).values
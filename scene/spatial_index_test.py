@@ -0,0 +1,101 @@
+import math
+import unittest
+import torch
+from torch import nn
+from gaussian_renderer import render_imp
+from gaussian_renderer.torch_rasterizer import GaussianRasterizationSettings, preprocess
+from scene.gaussian_model import GaussianModel
+from scene.spatial_index import VoxelGridIndex
+from utils.testing_utils import FakePipe, random_camera
+
+
+def make_model(num_points, seed=0):
+    generator = torch.Generator().manual_seed(seed)
+    # a dense core and a sparse far background, as in unbounded scenes
+    core = torch.randn((num_points * 3 // 4, 3), generator=generator) * 2
+    far = torch.nn.functional.normalize(torch.randn((num_points - core.shape[0], 3), generator=generator), dim=1) * 30
+    model = GaussianModel(0)
+    model._xyz = nn.Parameter(torch.cat([core, far]))
+    model._features_dc = nn.Parameter(torch.rand((num_points, 1, 3), generator=generator))
+    model._features_rest = nn.Parameter(torch.zeros((num_points, 0, 3)))
+    model._scaling = nn.Parameter(torch.log(torch.rand((num_points, 3), generator=generator) * 0.1 + 0.01))
+    model._rotation = nn.Parameter(torch.randn((num_points, 4), generator=generator))
+    model._opacity = nn.Parameter(torch.randn((num_points, 1), generator=generator))
+    return model
+
+
+def rasterizer_visible(camera, model):
+    settings = GaussianRasterizationSettings(
+        camera.image_height, camera.image_width, math.tan(camera.FoVx * 0.5), math.tan(camera.FoVy * 0.5),
+        torch.zeros(3), 1.0, camera.world_view_transform, camera.full_proj_transform, 0, camera.camera_center, False, False)
+    with torch.no_grad():
+        _, radii, _ = preprocess(model.get_xyz, torch.zeros_like(model.get_xyz), model.get_opacity, model.get_features,
+                                 None, model.get_scaling, model.get_rotation, None, settings)
+    return torch.nonzero(radii > 0).squeeze(1)
+
+
+class VoxelGridIndexTest(unittest.TestCase):
+    def test_given_random_cameras__when_querying__then_keep_every_gaussian_the_rasterizer_keeps(
+        self,
+    ) -> None:
+        model = make_model(20_000)
+
+        for seed in range(8):
+            camera = random_camera(seed, width=37 + 3 * seed, height=29 + seed)
+            culled = model.frustum_indices(camera)
+
+            self.assertTrue(torch.isin(rasterizer_visible(camera, model), culled).all())
+            self.assertLess(culled.shape[0], model.get_xyz.shape[0])
+            self.assertTrue((culled[1:] > culled[:-1]).all())
+
+    def test_given_moved_gaussians__when_querying_with_a_new_version__then_stay_conservative(
+        self,
+    ) -> None:
+        model = make_model(5_000)
+        camera = random_camera(3)
+        index = model.get_spatial_index()
+        model.frustum_indices(camera)
+
+        with torch.no_grad():
+            model._xyz.add_(torch.randn_like(model._xyz) * 0.5)
+        culled = model.frustum_indices(camera)
+
+        self.assertIs(model.get_spatial_index(), index)
+        self.assertTrue(torch.isin(rasterizer_visible(camera, model), culled).all())
+
+    def test_given_a_different_number_of_points__when_getting_the_index__then_rebuild_it(
+        self,
+    ) -> None:
+        model = make_model(1_000)
+        index = model.get_spatial_index()
+
+        model._xyz = nn.Parameter(model._xyz[:500].detach())
+
+        self.assertIsNot(model.get_spatial_index(), index)
+        self.assertEqual(model.get_spatial_index().num_points, 500)
+        self.assertEqual(int(VoxelGridIndex(torch.zeros((0, 3))).cell_count.sum()), 0)
+
+    def test_given_precull__when_rendering__then_outputs_and_gradients_are_unchanged(
+        self,
+    ) -> None:
+        model = make_model(3_000)
+        camera = random_camera(5)
+        background = torch.tensor([0.5, 0.5, 0.5])
+
+        full = render_imp(camera, model, FakePipe(), background)
+        full["render"].sum().backward()
+        full_grad = model._xyz.grad.clone()
+        model._xyz.grad = None
+        culled = render_imp(camera, model, FakePipe(precull=True), background)
+        culled["render"].sum().backward()
+
+        self.assertTrue(torch.allclose(full["render"], culled["render"], atol=1e-6))
+        for key in ["radii", "area_proj", "area_max"]:
+            self.assertTrue(torch.equal(full[key], culled[key]))
+        self.assertTrue(torch.allclose(full["accum_weights"], culled["accum_weights"]))
+        self.assertTrue(torch.allclose(full["viewspace_points"].grad, culled["viewspace_points"].grad, atol=1e-6))
+        self.assertTrue(torch.allclose(full_grad, model._xyz.grad, atol=1e-6))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+import json
+import struct
+import zlib
+
+MAGIC = b"MSGC"
+FORMAT_VERSION = 1
+
+
+def pack_container(header, sections, compressed=()):
+    """
+    Bytes of a container: the magic, the format version, a JSON header (a dict)
+    and named binary sections. The sections in compressed are stored deflated.
+
+    Layout: MAGIC | version (uint16) | header size (uint32) | header | sections,
+    the header lists the name, offset, size and compression of every section.
+    """
+    index = []
+    blobs = []
+    offset = 0
+    for name, data in sections.items():
+        data = bytes(data)
+        if name in compressed:
+            data = zlib.compress(data, 9)
+        index.append([name, offset, len(data), name in compressed])
+        blobs.append(data)
+        offset += len(data)
+    header = json.dumps(dict(header, sections=index)).encode("utf-8")
+    return b"".join([MAGIC, struct.pack("<HI", FORMAT_VERSION, len(header)), header] + blobs)
+
+
+def parse_header(data):
+    """
+    Header of a container from its first bytes (up to the end of the
+    header), with the section index in header["sections"] and the offset of the
+    first section in header["start"].
+    """
+    data = memoryview(data)
+    if bytes(data[:4]) != MAGIC:
+        raise ValueError("not a compressed Gaussians container")
+    version, header_size = struct.unpack("<HI", data[4:10])
+    if version > FORMAT_VERSION:
+        raise ValueError("container version {} is newer than the supported version {}".format(version, FORMAT_VERSION))
+    if len(data) < 10 + header_size:
+        raise ValueError("truncated container header")
+    header = json.loads(bytes(data[10:10 + header_size]).decode("utf-8"))
+    header["version"] = version
+    header["start"] = 10 + header_size
+    return header
+
+
+def unpack_container(data, partial=False):
+    """
+    (header, sections) of the bytes of pack_container, with the sections
+    inflated and the format version in header["version"]. With partial, data
+    may be a prefix of the container, the sections it does not hold entirely
+    are left out.
+    """
+    data = memoryview(data)
+    header = parse_header(data)
+    start = header.pop("start")
+    sections = {}
+    for name, offset, size, deflated in header.pop("sections"):
+        if partial and start + offset + size > len(data):
+            continue
+        section = bytes(data[start + offset:start + offset + size])
+        sections[name] = zlib.decompress(section) if deflated else section
+    return header, sections
+
+
+def write_container(path, header, sections, compressed=()):
+    with open(path, "wb") as file:
+        file.write(pack_container(header, sections, compressed))
+
+
+def read_container(path, names=None):
+    """
+    (header, sections) of the container at path. With names, only those
+    sections are read from the file.
+    """
+    if names is None:
+        with open(path, "rb") as file:
+            return unpack_container(file.read())
+    with open(path, "rb") as file:
+        prefix = file.read(10)
+        header = parse_header(prefix + file.read(struct.unpack("<I", prefix[6:10])[0]))
+        start = header.pop("start")
+        sections = {}
+        for name, offset, size, deflated in header.pop("sections"):
+            if name in names:
+                file.seek(start + offset)
+                section = file.read(size)
+                sections[name] = zlib.decompress(section) if deflated else section
+    return header, sections
@@ -0,0 +1,32 @@
+import struct
+import unittest
+from utils.container_utils import FORMAT_VERSION, MAGIC, pack_container, unpack_container
+
+
+class ContainerTest(unittest.TestCase):
+    def test_given_sections__when_packing_and_unpacking__then_return_the_header_and_sections(
+        self,
+    ) -> None:
+        sections = {"raw": b"\x00\x01\x02", "deflated": b"a" * 1000, "empty": b""}
+
+        data = pack_container({"depth": 16, "Qstep": 0.02}, sections, compressed=("deflated",))
+        header, unpacked = unpack_container(data)
+
+        self.assertEqual(header, {"depth": 16, "Qstep": 0.02, "version": FORMAT_VERSION})
+        self.assertEqual(unpacked, sections)
+        self.assertLess(len(data), 200)
+
+    def test_given_another_format__when_unpacking__then_raise(
+        self,
+    ) -> None:
+        data = pack_container({}, {})
+        newer = MAGIC + struct.pack("<H", FORMAT_VERSION + 1) + data[6:]
+
+        with self.assertRaises(ValueError):
+            unpack_container(b"PK\x03\x04" + data[4:])
+        with self.assertRaises(ValueError):
+            unpack_container(newer)
+
+
+if __name__ == "__main__":
+    unittest.main()
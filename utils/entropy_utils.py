@@ -0,0 +1,313 @@
+import numpy as np
+from utils.container_utils import pack_container, unpack_container
+
+# rANS with 32 bit states, 16 bit renormalization and probabilities of PROB_BITS bits
+PROB_BITS = 14
+PROB_SCALE = 1 << PROB_BITS
+RANS_L = 1 << 16
+# the symbols are coded on interleaved lanes, each step codes one symbol of every lane
+MAX_LANES = 4096
+MIN_LANE_SIZE = 1024
+# coefficient contexts: alphabet size (the last symbol escapes) and smallest depth group
+MAX_SYMBOLS = 256
+MIN_CONTEXT_SIZE = 16384
+# wide contexts store the low bits raw, leaving HIGH_BITS to code for 99% of the values
+HIGH_BITS = 6
+
+
+def zigzag(values):
+    values = np.asarray(values, dtype=np.int64)
+    return np.where(values >= 0, values << 1, (-values << 1) - 1)
+
+
+def unzigzag(values):
+    values = np.asarray(values, dtype=np.int64)
+    return np.where(values & 1, -((values + 1) >> 1), values >> 1)
+
+
+def min_uint(max_value):
+    """
+    Smallest unsigned integer dtype holding max_value.
+    """
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if max_value <= np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.uint64)
+
+
+def normalize_counts(counts):
+    """
+    Frequencies summing to PROB_SCALE, proportional to counts, with at least
+    1 for every symbol seen. An unused context gets everything on symbol 0.
+    """
+    counts = np.asarray(counts, dtype=np.int64)
+    total = counts.sum()
+    if total == 0:
+        freq = np.zeros(counts.shape[0], dtype=np.int64)
+        freq[0] = PROB_SCALE
+        return freq
+    freq = np.where(counts > 0, np.maximum(counts * PROB_SCALE // total, 1), 0)
+    diff = PROB_SCALE - freq.sum()
+    if diff > 0:
+        freq[np.argmax(freq)] += diff
+    while diff < 0:
+        i = np.argmax(freq)
+        take = min(-diff, freq[i] - 1)
+        freq[i] -= take
+        diff += take
+    return freq
+
+
+class FrequencyTables:
+    """
+    Frequencies (num_contexts, num_symbols) of a static rANS model, each row
+    summing to PROB_SCALE, with the cumulative frequencies and the slot to
+    symbol lookup of the decoder.
+    """
+
+    def __init__(self, freq):
+        self.freq = np.asarray(freq, dtype=np.int64)
+        self.cum = np.cumsum(self.freq, 1) - self.freq
+        self._lut = None
+
+    @classmethod
+    def from_symbols(cls, symbols, contexts, num_contexts, num_symbols):
+        counts = np.bincount(contexts * num_symbols + symbols, minlength=num_contexts * num_symbols)
+        counts = counts.reshape(num_contexts, num_symbols)
+        return cls(np.stack([normalize_counts(row) for row in counts]))
+
+    @property
+    def lut(self):
+        if self._lut is None:
+            num_symbols = self.freq.shape[1]
+            self._lut = np.stack([np.repeat(np.arange(num_symbols, dtype=np.uint16), row) for row in self.freq])
+        return self._lut
+
+
+def lane_layout(n):
+    """
+    Number of lanes and symbols per lane of a stream of n symbols, lane i codes
+    the symbols [i * steps, (i + 1) * steps).
+    """
+    lanes = max(1, min(MAX_LANES, n // MIN_LANE_SIZE))
+    return lanes, -(-n // lanes)
+
+
+def as_steps(values, lanes, steps, fill):
+    """
+    (steps, lanes) view of values padded with fill, row t holds the t-th symbol of every lane.
+    """
+    padded = np.full(lanes * steps, fill, dtype=values.dtype)
+    padded[:values.shape[0]] = values
+    return np.ascontiguousarray(padded.reshape(lanes, steps).T)
+
+
+def rans_encode(symbols, contexts, tables):
+    """
+    Interleaved rANS code of symbols, each coded with the frequencies of its
+    context in tables. Returns the final states (uint32), the number of words
+    of every lane (uint32) and the words (uint16), lane after lane in decoding
+    order.
+
+    Padding symbols get a probability of 1, coding them leaves the states as they are.
+    """
+    n = symbols.shape[0]
+    lanes, steps = lane_layout(n)
+    freq = as_steps(tables.freq[contexts, symbols].astype(np.uint64), lanes, steps, PROB_SCALE)
+    cum = as_steps(tables.cum[contexts, symbols].astype(np.uint64), lanes, steps, 0)
+
+    x = np.full(lanes, RANS_L, dtype=np.uint64)
+    emitted_lanes = []
+    emitted_words = []
+    for t in range(steps - 1, -1, -1):
+        f, c = freq[t], cum[t]
+        renorm = x >= ((RANS_L << 16) >> PROB_BITS) * f
+        if renorm.any():
+            emitted_lanes.append(np.nonzero(renorm)[0])
+            emitted_words.append(x[renorm] & 0xffff)
+            x[renorm] >>= 16
+        x = ((x // f) << PROB_BITS) + x % f + c
+
+    if emitted_lanes:
+        # the decoder reads the words of a lane in the reverse order of the encoder
+        lane = np.concatenate(emitted_lanes)
+        words = np.concatenate(emitted_words).astype(np.uint16)
+        order = np.lexsort((-np.arange(lane.shape[0]), lane))
+        lane, words = lane[order], words[order]
+    else:
+        lane, words = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.uint16)
+    lane_sizes = np.bincount(lane, minlength=lanes).astype(np.uint32)
+    return x.astype(np.uint32), lane_sizes, words
+
+
+def rans_decode(states, lane_sizes, words, contexts, tables):
+    """
+    Symbols of rans_encode, given the context of every symbol.
+    """
+    n = contexts.shape[0]
+    lanes, steps = lane_layout(n)
+    if states.shape[0] != lanes:
+        raise ValueError("expected {} rANS lanes, got {}".format(lanes, states.shape[0]))
+    num_symbols = tables.freq.shape[1]
+    # flat tables, indexed by context * num_symbols + symbol and context * PROB_SCALE + slot
+    freq = tables.freq.astype(np.uint64).ravel()
+    cum = tables.cum.astype(np.uint64).ravel()
+    lut = tables.lut.astype(np.int64).ravel()
+    padding = lanes * steps - n
+    contexts = as_steps(contexts.astype(np.int64), lanes, steps, 0)
+    words = np.append(words.astype(np.uint64), np.uint64(0))
+    ptr = np.concatenate([[0], np.cumsum(lane_sizes, dtype=np.int64)[:-1]])
+
+    x = states.astype(np.uint64)
+    mask = np.uint64(PROB_SCALE - 1)
+    symbols = np.empty((steps, lanes), dtype=np.int64)
+    for t in range(steps):
+        slot = x & mask
+        s = lut[contexts[t] * PROB_SCALE + slot.astype(np.int64)]
+        index = contexts[t] * num_symbols + s
+        f, c = freq[index], cum[index]
+        # the last lanes end with padding
+        first_pad = -(-(n - t) // steps)
+        if padding and first_pad < lanes:
+            pad = np.arange(lanes) >= first_pad
+            f, c = np.where(pad, np.uint64(PROB_SCALE), f), np.where(pad, np.uint64(0), c)
+        x = f * (x >> np.uint64(PROB_BITS)) + slot - c
+        renorm = x < RANS_L
+        if renorm.any():
+            x[renorm] = (x[renorm] << np.uint64(16)) | words[ptr[renorm]]
+            ptr[renorm] += 1
+        symbols[t] = s
+    return symbols.T.ravel()[:n]
+
+
+def depth_groups(depth_CT):
+    """
+    Context of every RAHT depth level: consecutive levels, from the finest,
+    are grouped until a group holds MIN_CONTEXT_SIZE coefficients.
+    """
+    counts = np.bincount(depth_CT, minlength=1)
+    groups = np.zeros(counts.shape[0], dtype=np.int64)
+    group, size = 0, 0
+    for d, count in enumerate(counts):
+        if size >= MIN_CONTEXT_SIZE:
+            group, size = group + 1, 0
+        groups[d] = group
+        size += count
+    if group > 0 and size < MIN_CONTEXT_SIZE:
+        # a small coarsest group joins the previous one
+        groups[groups == group] = group - 1
+    return groups
+
+
+def encode_coefficients(CT_q, depth_CT):
+    """
+    Entropy code of quantized RAHT coefficients CT_q (n, channels) with the
+    depth levels depth_CT (n, ) of haar3D, as container bytes.
+
+    Every channel and group of depth levels (depth_groups) has a context with
+    its own alphabet: the zigzag of the coefficient, up to MAX_SYMBOLS - 1,
+    beyond which the last symbol escapes and the remainder is stored aside at
+    the smallest integer width holding it. In contexts of wide values, the
+    low bits (shifts) are packed raw and only the high part is coded.
+    """
+    CT_q = np.asarray(CT_q)
+    depth_CT = np.asarray(depth_CT, dtype=np.int64)
+    n, channels = CT_q.shape
+    groups = depth_groups(depth_CT) if n > 0 else np.zeros(1, dtype=np.int64)
+    num_groups = int(groups.max()) + 1
+    num_contexts = channels * num_groups
+
+    # channel major, so each context covers long runs of the stream
+    values = zigzag(np.rint(CT_q).astype(np.int64).T.ravel())
+    contexts = (np.arange(channels)[:, None] * num_groups + groups[depth_CT][None, :]).ravel()
+
+    # bit length of every value, the 99th percentile per context sets the shift
+    lengths = np.frexp(values.astype(np.float64))[1]
+    hist = np.cumsum(np.bincount(contexts * 65 + lengths, minlength=num_contexts * 65).reshape(num_contexts, 65), 1)
+    shifts = np.maximum(np.argmax(hist >= 0.99 * hist[:, -1:], 1) - HIGH_BITS, 0)
+    # the values of every context, grouped once by a stable sort of the contexts
+    order = np.argsort(contexts, kind="stable")
+    by_context = np.split(values[order], np.cumsum(np.bincount(contexts, minlength=num_contexts))[:-1])
+    low_bits = []
+    for c in np.nonzero(shifts)[0]:
+        low = by_context[c] & ((1 << shifts[c]) - 1)
+        low_bits.append(np.packbits(((low[:, None] >> np.arange(shifts[c])) & 1).astype(np.uint8), bitorder="little"))
+    values = values >> shifts[contexts]
+
+    max_values = np.zeros(num_contexts, dtype=np.int64)
+    np.maximum.at(max_values, contexts, values)
+    alphabet = np.minimum(max_values + 1, MAX_SYMBOLS)
+    escape = max_values + 1 > MAX_SYMBOLS
+    symbols = np.minimum(values, alphabet[contexts] - 1)
+    escaped = escape[contexts] & (symbols == alphabet[contexts] - 1)
+    remainders = values[escaped] - symbols[escaped]
+    remainder_dtype = min_uint(remainders.max() if remainders.shape[0] else 0)
+
+    tables = FrequencyTables.from_symbols(symbols, contexts, num_contexts, int(alphabet.max()))
+    states, lane_sizes, words = rans_encode(symbols, contexts, tables)
+
+    freq = np.concatenate([row[:size] for row, size in zip(tables.freq, alphabet)]).astype(np.uint16)
+    header = {
+        "num_coefficients": n,
+        "num_channels": channels,
+        "groups": groups.tolist(),
+        "remainder_dtype": remainder_dtype.str,
+        "shifts": shifts.tolist(),
+    }
+    sections = {
+        "alphabet": alphabet.astype(np.uint16).tobytes(),
+        "escape": escape.astype(np.uint8).tobytes(),
+        "freq": freq.tobytes(),
+        "states": states.tobytes(),
+        "lane_sizes": lane_sizes.tobytes(),
+        "words": words.tobytes(),
+        "remainders": remainders.astype(remainder_dtype).tobytes(),
+        "low_bits": b"".join(bits.tobytes() for bits in low_bits),
+    }
+    return pack_container(header, sections, compressed=("alphabet", "escape", "freq", "lane_sizes", "remainders"))
+
+
+def decode_coefficients(data, depth_CT):
+    """
+    Quantized coefficients (n, channels) int64 of encode_coefficients, given the
+    same depth levels depth_CT.
+    """
+    header, sections = unpack_container(data)
+    depth_CT = np.asarray(depth_CT, dtype=np.int64)
+    n, channels = header["num_coefficients"], header["num_channels"]
+    if depth_CT.shape[0] != n:
+        raise ValueError("expected {} depth levels, got {}".format(n, depth_CT.shape[0]))
+    groups = np.array(header["groups"], dtype=np.int64)
+    num_groups = int(groups.max()) + 1
+
+    alphabet = np.frombuffer(sections["alphabet"], dtype=np.uint16).astype(np.int64)
+    escape = np.frombuffer(sections["escape"], dtype=np.uint8).astype(bool)
+    packed = np.frombuffer(sections["freq"], dtype=np.uint16)
+    freq = np.zeros((alphabet.shape[0], int(alphabet.max())), dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(alphabet)])
+    for i, size in enumerate(alphabet):
+        freq[i, :size] = packed[offsets[i]:offsets[i + 1]]
+    tables = FrequencyTables(freq)
+
+    contexts = (np.arange(channels)[:, None] * num_groups + groups[depth_CT][None, :]).ravel()
+    values = rans_decode(np.frombuffer(sections["states"], dtype=np.uint32),
+                         np.frombuffer(sections["lane_sizes"], dtype=np.uint32),
+                         np.frombuffer(sections["words"], dtype=np.uint16), contexts, tables)
+    escaped = escape[contexts] & (values == alphabet[contexts] - 1)
+    values[escaped] += np.frombuffer(sections["remainders"], dtype=header["remainder_dtype"]).astype(np.int64)
+
+    shifts = np.array(header["shifts"], dtype=np.int64)
+    values <<= shifts[contexts]
+    # the low bits are stored context by context, in the order of a stable sort of the contexts
+    counts = np.bincount(contexts, minlength=shifts.shape[0])
+    starts = np.cumsum(counts) - counts
+    low = np.zeros_like(values)
+    packed = np.frombuffer(sections["low_bits"], dtype=np.uint8)
+    offset = 0
+    for c in np.nonzero(shifts)[0]:
+        size = counts[c] * shifts[c]
+        bits = np.unpackbits(packed[offset:offset + (size + 7) // 8], count=size, bitorder="little")
+        low[starts[c]:starts[c] + counts[c]] = (bits.reshape(counts[c], shifts[c]).astype(np.int64) << np.arange(shifts[c])).sum(1)
+        offset += (size + 7) // 8
+    values[np.argsort(contexts, kind="stable")] |= low
+    return unzigzag(values).reshape(channels, n).T
@@ -0,0 +1,85 @@
+import io
+import unittest
+import numpy as np
+from utils.entropy_utils import (FrequencyTables, PROB_SCALE, decode_coefficients, encode_coefficients,
+                                 normalize_counts, rans_decode, rans_encode, unzigzag, zigzag)
+
+
+def make_coefficients(n, channels, seed=0):
+    """
+    Laplacian coefficients, wider at the coarser depth levels as those of haar3D.
+    """
+    rng = np.random.default_rng(seed)
+    depth_CT = np.minimum(rng.geometric(0.4, n) - 1, 47)
+    CT_q = np.round(rng.laplace(0, 0.3, (n, channels)) * (1 + depth_CT[:, None]))
+    return CT_q, depth_CT
+
+
+class EntropyCoderTest(unittest.TestCase):
+    def test_given_counts__when_normalizing__then_keep_every_seen_symbol(
+        self,
+    ) -> None:
+        for counts in [[1] * 200 + [10**9], [0, 5, 0, 3]]:
+            freq = normalize_counts(counts)
+
+            self.assertEqual(freq.sum(), PROB_SCALE)
+            self.assertTrue(np.array_equal(freq > 0, np.array(counts) > 0))
+        self.assertEqual(normalize_counts([0, 0, 0]).tolist(), [PROB_SCALE, 0, 0])
+
+    def test_given_symbols_with_contexts__when_coding__then_decode_them(
+        self,
+    ) -> None:
+        rng = np.random.default_rng(0)
+        # the padding of the last case spans more than one lane
+        for n in [1, 1_000, 5_001, 100_000, 2_000 * 1_024 + 5]:
+            contexts = rng.integers(0, 3, n)
+            symbols = np.minimum(rng.geometric(0.3 * (contexts + 1)) - 1, 15)
+            tables = FrequencyTables.from_symbols(symbols, contexts, 3, 16)
+
+            states, lane_sizes, words = rans_encode(symbols, contexts, tables)
+
+            self.assertTrue(np.array_equal(rans_decode(states, lane_sizes, words, contexts, tables), symbols))
+
+    def test_given_quantized_coefficients__when_coding__then_decode_them_exactly(
+        self,
+    ) -> None:
+        for n, channels in [(0, 3), (1, 1), (1_025, 3), (50_000, 14)]:
+            CT_q, depth_CT = make_coefficients(n, channels)
+            if n > 0:
+                # escapes beyond the alphabet
+                CT_q[0] = [123_456] * channels
+                CT_q[-1, 0] = -2**40
+
+            decoded = decode_coefficients(encode_coefficients(CT_q, depth_CT), depth_CT)
+
+            self.assertEqual(decoded.dtype, np.int64)
+            self.assertTrue(np.array_equal(decoded, CT_q))
+        self.assertTrue(np.array_equal(unzigzag(zigzag(np.arange(-5, 6))), np.arange(-5, 6)))
+
+    def test_given_wide_values__when_coding__then_pack_the_low_bits_raw(
+        self,
+    ) -> None:
+        rng = np.random.default_rng(1)
+        CT_q = np.round(rng.laplace(0, [1, 3_000, 10**7], (20_000, 3)))
+        depth_CT = np.zeros(CT_q.shape[0], dtype=np.int64)
+
+        data = encode_coefficients(CT_q, depth_CT)
+
+        self.assertTrue(np.array_equal(decode_coefficients(data, depth_CT), CT_q))
+        # about the entropy of the Laplacians, log2(2 e b) bits
+        self.assertLess(len(data), CT_q.shape[0] * (3 + 14 + 27) / 8)
+
+    def test_given_quantized_coefficients__when_coding__then_beat_zlib(
+        self,
+    ) -> None:
+        CT_q, depth_CT = make_coefficients(100_000, 8)
+        buffer = io.BytesIO()
+        np.savez_compressed(buffer, CT_q)
+
+        data = encode_coefficients(CT_q, depth_CT)
+
+        self.assertLess(len(data), len(buffer.getvalue()) / 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -62,7 +62,7 @@ def get_expon_lr_func(
     return helper
 
 def strip_lowerdiag(L):
-    uncertainty = torch.zeros((L.shape[0], 6), dtype=torch.float, device="cuda")
+    uncertainty = torch.zeros((L.shape[0], 6), dtype=torch.float, device=L.device)
 
     uncertainty[:, 0] = L[:, 0, 0]
     uncertainty[:, 1] = L[:, 0, 1]
@@ -80,7 +80,7 @@ def build_rotation(r):
 
     q = r / norm[:, None]
 
-    R = torch.zeros((q.size(0), 3, 3), device='cuda')
+    R = torch.zeros((q.size(0), 3, 3), device=r.device)
 
     r = q[:, 0]
     x = q[:, 1]
@@ -98,8 +98,28 @@ def build_rotation(r):
     R[:, 2, 2] = 1 - 2 * (x*x + y*y)
     return R
 
+def build_quaternion(R):
+    """
+    Unit quaternions (r, x, y, z) of rotation matrices R (n, 3, 3), the
+    inverse of build_rotation, from the largest of the four components.
+    """
+    m = R
+    trace = m[:, 0, 0] + m[:, 1, 1] + m[:, 2, 2]
+    squares = torch.stack([1 + trace, 1 + m[:, 0, 0] - m[:, 1, 1] - m[:, 2, 2],
+                           1 - m[:, 0, 0] + m[:, 1, 1] - m[:, 2, 2], 1 - m[:, 0, 0] - m[:, 1, 1] + m[:, 2, 2]], 1)
+    largest = torch.argmax(squares, dim=1)
+    s = 2 * torch.sqrt(torch.clamp_min(squares.gather(1, largest[:, None]).squeeze(1), 1e-12))
+    diff_x, diff_y, diff_z = m[:, 2, 1] - m[:, 1, 2], m[:, 0, 2] - m[:, 2, 0], m[:, 1, 0] - m[:, 0, 1]
+    sum_xy, sum_xz, sum_yz = m[:, 0, 1] + m[:, 1, 0], m[:, 0, 2] + m[:, 2, 0], m[:, 1, 2] + m[:, 2, 1]
+    candidates = torch.stack([
+        torch.stack([s * s / 4, diff_x, diff_y, diff_z], 1),
+        torch.stack([diff_x, s * s / 4, sum_xy, sum_xz], 1),
+        torch.stack([diff_y, sum_xy, s * s / 4, sum_yz], 1),
+        torch.stack([diff_z, sum_xz, sum_yz, s * s / 4], 1)], 1) / s[:, None, None]
+    return candidates[torch.arange(R.shape[0], device=R.device), largest]
+
 def build_scaling_rotation(s, r):
-    L = torch.zeros((s.shape[0], 3, 3), dtype=torch.float, device="cuda")
+    L = torch.zeros((s.shape[0], 3, 3), dtype=torch.float, device=s.device)
     R = build_rotation(r)
 
     L[:,0,0] = s[:,0]
@@ -136,4 +156,56 @@ def get_top_k_indices(tensor, k):
     if k > tensor.shape[-1]:
         return torch.arange(tensor.shape[-1], device=tensor.device)
     v, i = torch.topk(tensor, k, largest=True)
-    return i
\ No newline at end of file
+    return i
+
+def get_top_mass_indices(tensor, fraction):
+    """
+    Counterpart of get_top_k_indices that selects by mass instead of count:
+    indices of the largest entries that together hold at most `fraction` of
+    the total sum.
+    """
+    return torch.nonzero(tensor > get_cdf_threshold(tensor, fraction)).squeeze(-1)
+
+def get_cdf_threshold(tensor, fraction, n_buckets=1024, max_exact=1 << 16):
+    """
+    Returns vals[split_index] of the sort based search, i.e. the first value
+    (in ascending order) at which the cumulative sum exceeds (1-fraction) of
+    the total. Entries must be non-negative.
+
+    Instead of sorting all N entries, the values are bucketed by a histogram,
+    only the bucket containing the crossing is kept and the search is repeated
+    on it; the final (small) bucket is sorted. Expected O(N).
+    """
+    values = tensor.flatten()
+    target = (1 - fraction) * values.double().sum()
+    mass_below = torch.zeros((), dtype=torch.float64, device=values.device)
+
+    lo, hi = values.min(), values.max()
+    while values.numel() > max_exact and lo < hi:
+        bucket = ((values - lo) / (hi - lo) * n_buckets).long().clamp_(0, n_buckets - 1)
+        mass = torch.zeros(n_buckets, dtype=torch.float64, device=values.device).scatter_add_(0, bucket, values.double())
+        cum_mass = torch.cumsum(mass, dim=0) + mass_below
+        # first bucket whose cumulative mass exceeds the target, never an empty one
+        b = torch.minimum(torch.searchsorted(cum_mass, target, right=True), bucket.max())
+        mass_below = cum_mass[b] - mass[b]
+        values = values[bucket == b]
+        lo, hi = values.min(), values.max()
+
+    vals, _ = torch.sort(values)
+    cum_mass = torch.cumsum(vals.double(), dim=0) + mass_below
+    split_index = torch.searchsorted(cum_mass, target, right=True).clamp(max=vals.shape[0] - 1)
+    return vals[split_index]
+
+
+def weighted_sample_without_replacement(weights, num_samples, generator=None):
+    """
+    Draw num_samples distinct indices with probability proportional to weights,
+    on the device the weights live on (exponential keys of Efraimidis-Spirakis,
+    the same distribution as Gumbel top-k and np.random.choice(replace=False)).
+    Entries with zero weight are never drawn.
+    """
+    weights = weights.flatten().float()
+    num_samples = min(num_samples, int((weights > 0).sum()))
+    keys = torch.empty_like(weights).exponential_(generator=generator) / weights
+    _, indices = torch.topk(keys, num_samples, largest=False)
+    return indices
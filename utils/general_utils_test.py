@@ -0,0 +1,104 @@
+import unittest
+import torch
+from utils.general_utils import build_quaternion, build_rotation, get_cdf_threshold, get_top_mass_indices, weighted_sample_without_replacement
+
+
+class WeightedSampleWithoutReplacementTest(unittest.TestCase):
+    def test_given_weights_with_zeros__when_sampling__then_return_distinct_indices_of_positive_weights(
+        self,
+    ) -> None:
+        weights = torch.rand(10_000)
+        weights[::3] = 0
+
+        indices = weighted_sample_without_replacement(weights, 2_000)
+
+        self.assertEqual(indices.shape[0], 2_000)
+        self.assertEqual(torch.unique(indices).shape[0], 2_000)
+        self.assertTrue((weights[indices] > 0).all())
+
+    def test_given_more_samples_than_positive_weights__when_sampling__then_return_all_positive_indices(
+        self,
+    ) -> None:
+        weights = torch.tensor([0.0, 1.0, 0.0, 2.0])
+
+        indices = weighted_sample_without_replacement(weights, 4)
+
+        self.assertEqual(sorted(indices.tolist()), [1, 3])
+
+    def test_given_the_same_seed__when_sampling_twice__then_return_the_same_indices(
+        self,
+    ) -> None:
+        weights = torch.rand(1_000)
+
+        a = weighted_sample_without_replacement(weights, 100, generator=torch.Generator().manual_seed(3))
+        b = weighted_sample_without_replacement(weights, 100, generator=torch.Generator().manual_seed(3))
+
+        self.assertTrue(torch.equal(a, b))
+
+    def test_given_a_single_draw__when_sampling_many_times__then_frequencies_follow_the_weights(
+        self,
+    ) -> None:
+        weights = torch.tensor([1.0, 2.0, 3.0, 4.0])
+        generator = torch.Generator().manual_seed(0)
+
+        counts = torch.zeros(4)
+        for _ in range(4_000):
+            counts[weighted_sample_without_replacement(weights, 1, generator=generator)] += 1
+
+        self.assertTrue(torch.allclose(counts / counts.sum(), weights / weights.sum(), atol=0.03))
+
+
+def sorted_cdf_threshold(importance, fraction):
+    # the full sort used by init_cdf_mask before the selection based search
+    vals, _ = torch.sort(importance.double())
+    cumsum_val = torch.cumsum(vals, dim=0)
+    split_index = ((cumsum_val/vals.sum()) > (1-fraction)).nonzero().min()
+    return vals[split_index].float()
+
+
+class CdfThresholdTest(unittest.TestCase):
+    def test_given_heavy_tailed_importance__when_bucketing__then_match_the_sorted_threshold(
+        self,
+    ) -> None:
+        generator = torch.Generator().manual_seed(0)
+        importance = torch.empty(200_000).exponential_(generator=generator) ** 4 + 1e-6
+
+        for fraction in [0.5, 0.9, 0.99]:
+            threshold = get_cdf_threshold(importance, fraction, max_exact=1024)
+            self.assertEqual(threshold.item(), sorted_cdf_threshold(importance, fraction).item())
+
+    def test_given_many_ties__when_bucketing__then_return_the_same_mask(
+        self,
+    ) -> None:
+        importance = torch.randint(0, 5, (100_000,)).float() + 1e-6
+
+        threshold = get_cdf_threshold(importance, 0.99, max_exact=128)
+
+        self.assertTrue(torch.equal(importance > threshold, importance > sorted_cdf_threshold(importance, 0.99)))
+
+    def test_given_a_mass_fraction__when_selecting_top_mass__then_selected_entries_hold_at_most_that_fraction(
+        self,
+    ) -> None:
+        importance = torch.rand(50_000)
+
+        indices = get_top_mass_indices(importance, 0.3)
+
+        self.assertLessEqual(importance[indices].sum().item(), 0.3 * importance.sum().item())
+        self.assertGreater(importance[indices].min().item(), importance[~torch.isin(torch.arange(50_000), indices)].max().item() - 1e-6)
+
+
+class BuildQuaternionTest(unittest.TestCase):
+    def test_given_rotation_matrices__when_building_quaternions__then_build_rotation_restores_them(
+        self,
+    ) -> None:
+        q = torch.randn((1_000, 4), generator=torch.Generator().manual_seed(0))
+        R = build_rotation(q)
+
+        restored = build_quaternion(R)
+
+        self.assertTrue(torch.allclose(restored.norm(dim=1), torch.ones(1_000), atol=1e-5))
+        self.assertTrue(torch.allclose(build_rotation(restored), R, atol=1e-5))
+
+
+if __name__ == "__main__":
+    unittest.main()
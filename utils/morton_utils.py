@@ -0,0 +1,56 @@
+import numpy as np
+import torch
+
+# up to 21 bits per axis, 63 bits per code
+MAX_BITS = 21
+
+
+def spread_bits(x):
+    """
+    Insert two zero bits after each of the 21 low bits of x (int64 np.array or
+    tensor), in five shift-and-mask passes.
+    """
+    x = x & 0x1fffff
+    x = (x | (x << 32)) & 0x1f00000000ffff
+    x = (x | (x << 16)) & 0x1f0000ff0000ff
+    x = (x | (x << 8)) & 0x100f00f00f00f00f
+    x = (x | (x << 4)) & 0x10c30c30c30c30c3
+    x = (x | (x << 2)) & 0x1249249249249249
+    return x
+
+
+def compact_bits(x):
+    """
+    Inverse of spread_bits, keeps every third bit of x starting at bit 0.
+    """
+    x = x & 0x1249249249249249
+    x = (x ^ (x >> 2)) & 0x10c30c30c30c30c3
+    x = (x ^ (x >> 4)) & 0x100f00f00f00f00f
+    x = (x ^ (x >> 8)) & 0x1f0000ff0000ff
+    x = (x ^ (x >> 16)) & 0x1f00000000ffff
+    x = (x ^ (x >> 32)) & 0x1fffff
+    return x
+
+
+def morton_encode(V):
+    """
+    Morton codes of integer coordinates V (n, 3), np.array or tensor, with the
+    bit layout of ms_c copyAsort: bit i of V[:, 2], V[:, 1], V[:, 0] goes to bit
+    3i, 3i + 1, 3i + 2 of the code.
+    """
+    if isinstance(V, torch.Tensor):
+        V = V.long()
+    else:
+        V = np.asarray(V).astype(np.int64)
+    return spread_bits(V[:, 2]) | (spread_bits(V[:, 1]) << 1) | (spread_bits(V[:, 0]) << 2)
+
+
+def morton_decode(code):
+    """
+    Integer coordinates (n, 3) of Morton codes, inverse of morton_encode.
+    """
+    if isinstance(code, torch.Tensor):
+        code = code.long()
+        return torch.stack([compact_bits(code >> 2), compact_bits(code >> 1), compact_bits(code)], 1)
+    code = np.asarray(code).astype(np.int64)
+    return np.stack([compact_bits(code >> 2), compact_bits(code >> 1), compact_bits(code)], 1)
@@ -0,0 +1,48 @@
+import unittest
+import numpy as np
+import torch
+from utils.morton_utils import MAX_BITS, morton_decode, morton_encode
+
+
+def reference_encode(V):
+    code = np.zeros(V.shape[0], dtype=np.int64)
+    for i in range(MAX_BITS):
+        for axis, shift in [(2, 0), (1, 1), (0, 2)]:
+            code |= ((V[:, axis] >> i) & 1) << (3 * i + shift)
+    return code
+
+
+class MortonTest(unittest.TestCase):
+    def setUp(self) -> None:
+        rng = np.random.default_rng(0)
+        self.V = rng.integers(0, 2**MAX_BITS, (10_000, 3), dtype=np.int64)
+        self.V[0] = 2**MAX_BITS - 1
+        self.V[1] = 0
+
+    def test_given_21_bit_coordinates__when_encoding__then_interleave_the_bits(
+        self,
+    ) -> None:
+        code = morton_encode(self.V)
+
+        self.assertTrue(np.array_equal(code, reference_encode(self.V)))
+        self.assertEqual(code[0], 2**63 - 1)
+        self.assertTrue(torch.equal(morton_encode(torch.tensor(self.V)), torch.tensor(code)))
+
+    def test_given_codes__when_decoding__then_recover_the_coordinates(
+        self,
+    ) -> None:
+        code = morton_encode(self.V)
+
+        self.assertTrue(np.array_equal(morton_decode(code), self.V))
+        self.assertTrue(torch.equal(morton_decode(torch.tensor(code)), torch.tensor(self.V)))
+
+    def test_given_sorted_codes__when_decoding_parents__then_match_the_coordinates_shifted_down(
+        self,
+    ) -> None:
+        code = np.sort(morton_encode(self.V))
+
+        self.assertTrue(np.array_equal(morton_decode(code >> 3), morton_decode(code) >> 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
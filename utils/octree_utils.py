@@ -0,0 +1,142 @@
+import numpy as np
+from utils.container_utils import pack_container, unpack_container
+from utils.entropy_utils import FrequencyTables, decode_coefficients, encode_coefficients, rans_decode, rans_encode
+from utils.morton_utils import morton_decode, morton_encode
+
+# occupancy bytes are coded with the number of occupied children of their parent as context
+NUM_CONTEXTS = 9
+POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.int64)
+
+
+def voxelize(pos, depth):
+    """
+    Integer coordinates (n, 3) of pos in a grid of 2**depth voxels a side over
+    the bounding cube of pos, with the origin and the voxel size of the grid.
+    """
+    pos = np.asarray(pos, dtype=np.float64)
+    origin = float(pos.min()) if pos.shape[0] else 0.0
+    extent = float(pos.max()) - origin if pos.shape[0] else 0.0
+    scale = extent / (2**depth - 1) if extent > 0 else 1.0
+    return np.round((pos - origin) / scale).astype(np.int64), origin, scale
+
+
+def devoxelize(V, origin, scale):
+    return (origin + np.asarray(V, dtype=np.float64) * scale).astype(np.float32)
+
+
+def octree_occupancy(codes, depth):
+    """
+    Occupancy bytes of the octree of sorted unique Morton codes, level by level
+    from the root, each level in Morton order of its nodes.
+    """
+    levels = []
+    for level in range(depth - 1, -1, -1):
+        children = np.unique(codes >> (3 * level))
+        _, start = np.unique(children >> 3, return_index=True)
+        levels.append(np.bitwise_or.reduceat(1 << (children & 7), start).astype(np.uint8))
+    return levels
+
+
+def child_codes(nodes, occupancy):
+    bits = (occupancy[:, None].astype(np.int64) >> np.arange(8)) & 1
+    return ((nodes[:, None] << 3) | np.arange(8))[bits.astype(bool)]
+
+
+def encode_octree(V, depth):
+    """
+    Container bytes of the unique voxels V (n, 3) of a 2**depth grid: the
+    occupancy bytes of their octree, rANS coded per level.
+    """
+    codes = np.unique(morton_encode(V))
+    if codes.shape[0] == 0:
+        return pack_container({"depth": depth, "num_points": 0}, {})
+    levels = octree_occupancy(codes, depth)
+    contexts = [np.zeros(1, dtype=np.int64)]
+    for parent in levels[:-1]:
+        contexts.append(np.repeat(POPCOUNT[parent], POPCOUNT[parent]))
+
+    tables = FrequencyTables.from_symbols(np.concatenate(levels).astype(np.int64), np.concatenate(contexts),
+                                          NUM_CONTEXTS, 256)
+    streams = [rans_encode(symbols.astype(np.int64), context, tables) for symbols, context in zip(levels, contexts)]
+    header = {
+        "depth": depth,
+        "num_points": int(codes.shape[0]),
+        "num_lanes": [int(states.shape[0]) for states, _, _ in streams],
+        "num_words": [int(words.shape[0]) for _, _, words in streams],
+    }
+    sections = {
+        "freq": tables.freq.astype(np.uint16).tobytes(),
+        "states": b"".join(states.tobytes() for states, _, _ in streams),
+        "lane_sizes": b"".join(lane_sizes.tobytes() for _, lane_sizes, _ in streams),
+        "words": b"".join(words.tobytes() for _, _, words in streams),
+    }
+    return pack_container(header, sections, compressed=("freq", "lane_sizes"))
+
+
+def decode_octree(data):
+    """
+    Voxels (n, 3) of encode_octree in Morton order, rebuilt from the root
+    level by level.
+    """
+    header, sections = unpack_container(data)
+    if header["num_points"] == 0:
+        return np.zeros((0, 3), dtype=np.int64)
+    tables = FrequencyTables(np.frombuffer(sections["freq"], dtype=np.uint16).reshape(NUM_CONTEXTS, 256))
+    states = np.frombuffer(sections["states"], dtype=np.uint32)
+    lane_sizes = np.frombuffer(sections["lane_sizes"], dtype=np.uint32)
+    words = np.frombuffer(sections["words"], dtype=np.uint16)
+
+    nodes = np.zeros(1, dtype=np.int64)
+    contexts = np.zeros(1, dtype=np.int64)
+    lane, word = 0, 0
+    for num_lanes, num_words in zip(header["num_lanes"], header["num_words"]):
+        occupancy = rans_decode(states[lane:lane + num_lanes], lane_sizes[lane:lane + num_lanes],
+                                words[word:word + num_words], contexts, tables)
+        lane, word = lane + num_lanes, word + num_words
+        nodes = child_codes(nodes, occupancy)
+        contexts = np.repeat(POPCOUNT[occupancy], POPCOUNT[occupancy])
+    return morton_decode(nodes)
+
+
+def float_residuals(pos, rec):
+    """
+    Difference of the float32 bit patterns of pos and rec, small for close values.
+    """
+    return pos.astype(np.float32).view(np.int32).astype(np.int64) - rec.view(np.int32).astype(np.int64)
+
+
+def encode_geometry(pos, depth, lossless=False):
+    """
+    Octree code of the positions pos (n, 3), with one point per voxel of the
+    2**depth grid kept. Returns the container bytes, the kept voxels in Morton
+    order and the index in pos of each of them (the first point of every
+    voxel).
+
+    The decoder puts the points at the voxel centers, within half a voxel of
+    pos. With lossless, the float32 positions are restored exactly from the
+    entropy coded differences of their bit patterns to the voxel centers.
+    """
+    pos = np.asarray(pos, dtype=np.float32)
+    V, origin, scale = voxelize(pos, depth)
+    codes, index = np.unique(morton_encode(V), return_index=True)
+    V = V[index]
+
+    header = {"depth": depth, "origin": origin, "scale": scale, "lossless": lossless}
+    sections = {"octree": encode_octree(V, depth)}
+    if lossless:
+        residuals = float_residuals(pos[index], devoxelize(V, origin, scale))
+        sections["residuals"] = encode_coefficients(residuals, np.zeros(residuals.shape[0], dtype=np.int64))
+    return pack_container(header, sections), V, index
+
+
+def decode_geometry(data):
+    """
+    Voxels (n, 3) in Morton order and float32 positions (n, 3) of encode_geometry.
+    """
+    header, sections = unpack_container(data)
+    V = decode_octree(sections["octree"])
+    pos = devoxelize(V, header["origin"], header["scale"])
+    if header["lossless"]:
+        residuals = decode_coefficients(sections["residuals"], np.zeros(V.shape[0], dtype=np.int64))
+        pos = (pos.view(np.int32).astype(np.int64) + residuals).astype(np.int32).view(np.float32)
+    return V, pos
@@ -0,0 +1,63 @@
+import unittest
+import numpy as np
+from utils.morton_utils import morton_encode
+from utils.octree_utils import decode_geometry, decode_octree, encode_geometry, encode_octree, octree_occupancy
+
+
+def make_positions(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return (rng.normal(0, 1, (n, 3)) * [3, 1, 2]).astype(np.float32)
+
+
+class OctreeTest(unittest.TestCase):
+    def test_given_two_voxels__when_building_the_octree__then_split_at_the_first_differing_level(
+        self,
+    ) -> None:
+        codes = np.sort(morton_encode(np.array([[0, 0, 0], [0, 0, 1]])))
+
+        levels = octree_occupancy(codes, 2)
+
+        self.assertEqual([level.tolist() for level in levels], [[1], [0b11]])
+
+    def test_given_voxels__when_coding_the_octree__then_decode_them_in_morton_order(
+        self,
+    ) -> None:
+        rng = np.random.default_rng(0)
+        for n, depth in [(0, 4), (1, 4), (7, 3), (20_000, 16)]:
+            V = np.unique(rng.integers(0, 2**depth, (n, 3)), axis=0)
+
+            decoded = decode_octree(encode_octree(V, depth))
+
+            self.assertTrue(np.array_equal(decoded, V[np.argsort(morton_encode(V))]))
+
+    def test_given_positions__when_coding_near_losslessly__then_stay_within_half_a_voxel(
+        self,
+    ) -> None:
+        pos = make_positions(50_000)
+        depth = 12
+        half_voxel = (pos.max() - pos.min()) / (2**depth - 1) / 2
+
+        data, V, index = encode_geometry(pos, depth)
+        decoded_V, decoded = decode_geometry(data)
+
+        self.assertTrue(np.array_equal(decoded_V, V))
+        self.assertEqual(np.unique(V, axis=0).shape[0], V.shape[0])
+        self.assertLessEqual(np.abs(decoded - pos[index]).max(), half_voxel * 1.001)
+        self.assertLess(len(data), pos[index].nbytes / 3)
+
+    def test_given_positions__when_coding_losslessly__then_restore_the_float32_values(
+        self,
+    ) -> None:
+        pos = make_positions(50_000)
+        pos[0] = 0.0
+        pos[1] = -1e-30
+
+        data, V, index = encode_geometry(pos, 16, lossless=True)
+        _, decoded = decode_geometry(data)
+
+        self.assertTrue(np.array_equal(decoded.view(np.int32), pos[index].view(np.int32)))
+        self.assertLess(len(data), pos[index].nbytes)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import math
+from typing import NamedTuple
+import numpy as np
+import torch
+from scene.cameras import MiniCam
+from utils.general_utils import build_scaling_rotation, strip_symmetric
+from utils.graphics_utils import getWorld2View2, getProjectionMatrix
+
+
+class FakePipe(NamedTuple):
+    convert_SHs_python: bool = False
+    compute_cov3D_python: bool = False
+    debug: bool = False
+    rasterizer: str = "torch"
+    precull: bool = False
+
+
+class FakeView(NamedTuple):
+    """
+    Training camera with only the fields a test needs; render_pkg is what
+    fake_render returns for it.
+    """
+    image_name: str = ""
+    image_height: int = 0
+    image_width: int = 0
+    original_image: torch.Tensor = None
+    render_pkg: dict = None
+
+
+class FakeGaussians(NamedTuple):
+    get_xyz: torch.Tensor
+    get_opacity: torch.Tensor = None
+    get_scaling: torch.Tensor = None
+    get_rotation: torch.Tensor = None
+    get_features: torch.Tensor = None
+    active_sh_degree: int = 0
+    max_sh_degree: int = 0
+
+    def get_covariance(self, scaling_modifier = 1):
+        L = build_scaling_rotation(scaling_modifier * self.get_scaling, self.get_rotation)
+        return strip_symmetric(L @ L.transpose(1, 2))
+
+
+def fake_render(view, gaussians, pipe, background):
+    return view.render_pkg
+
+
+def make_camera(width=40, height=36, fov=math.radians(60), t=np.zeros(3), R=np.eye(3)):
+    world_view_transform = torch.tensor(getWorld2View2(R, t)).transpose(0, 1).float()
+    projection_matrix = getProjectionMatrix(znear=0.01, zfar=100.0, fovX=fov, fovY=fov).transpose(0, 1)
+    return MiniCam(width, height, fov, fov, 0.01, 100.0, world_view_transform, world_view_transform @ projection_matrix)
+
+
+def random_camera(seed, width=48, height=32, fov=math.radians(50)):
+    generator = torch.Generator().manual_seed(seed)
+    q = torch.nn.functional.normalize(torch.randn(4, generator=generator), dim=0).tolist()
+    R = np.array([[1 - 2 * (q[2]**2 + q[3]**2), 2 * (q[1]*q[2] - q[0]*q[3]), 2 * (q[1]*q[3] + q[0]*q[2])],
+                  [2 * (q[1]*q[2] + q[0]*q[3]), 1 - 2 * (q[1]**2 + q[3]**2), 2 * (q[2]*q[3] - q[0]*q[1])],
+                  [2 * (q[1]*q[3] - q[0]*q[2]), 2 * (q[2]*q[3] + q[0]*q[1]), 1 - 2 * (q[1]**2 + q[2]**2)]])
+    t = (torch.rand(3, generator=generator) * 2 - 1).numpy()
+    return make_camera(width, height, fov, t, R)
+
+
+def make_gaussians(xyz, scaling, rgb, opacity, requires_grad=False):
+    xyz = torch.tensor(xyz, dtype=torch.float32).requires_grad_(requires_grad)
+    opacity = torch.tensor(opacity, dtype=torch.float32)[:, None].requires_grad_(requires_grad)
+    features = ((torch.tensor(rgb, dtype=torch.float32) - 0.5) / 0.28209479177387814)[:, None, :]
+    rotation = torch.nn.functional.normalize(torch.randn(xyz.shape[0], 4), dim=1)
+    return FakeGaussians(xyz, opacity, torch.tensor(scaling, dtype=torch.float32), rotation, features)
@@ -0,0 +1,85 @@
+import json
+import math
+import numpy as np
+import torch
+from scene.cameras import MiniCam
+from scene.colmap_loader import qvec2rotmat, rotmat2qvec
+from utils.graphics_utils import getWorld2View2, getProjectionMatrix, focal2fov
+
+
+def camera_pose(camera):
+    """
+    Camera to world rotation and camera center of a Camera (R is stored camera
+    to world, T world to camera).
+    """
+    return camera.R, -camera.R @ camera.T
+
+
+def pose_camera(R, center, width, height, fovx, fovy, device="cuda", znear=0.01, zfar=100.0):
+    T = -R.T @ center
+    world_view_transform = torch.tensor(getWorld2View2(R, T), dtype=torch.float32).transpose(0, 1).to(device)
+    projection_matrix = getProjectionMatrix(znear=znear, zfar=zfar, fovX=fovx, fovY=fovy).transpose(0, 1).to(device)
+    return MiniCam(width, height, fovy, fovx, znear, zfar, world_view_transform, world_view_transform @ projection_matrix)
+
+
+def slerp(q0, q1, t):
+    dot = np.dot(q0, q1)
+    if dot < 0:
+        q1, dot = -q1, -dot
+    if dot > 0.9995:
+        q = q0 + t * (q1 - q0)
+        return q / np.linalg.norm(q)
+    theta = math.acos(dot)
+    return (math.sin((1 - t) * theta) * q0 + math.sin(t * theta) * q1) / math.sin(theta)
+
+
+def catmull_rom(p0, p1, p2, p3, t):
+    return 0.5 * (2 * p1 + (p2 - p0) * t + (2 * p0 - 5 * p1 + 4 * p2 - p3) * t**2 + (3 * p1 - p0 - 3 * p2 + p3) * t**3)
+
+
+def interpolate_trajectory(cameras, num_frames, num_keyframes=None, loop=False, device="cuda"):
+    """
+    Smooth path through the poses of cameras, in image name order (usually the
+    capture order): Catmull-Rom splines through the centers and slerp between
+    the rotations. num_keyframes evenly spaced cameras are used as key poses
+    (all of them if None), the resolution and field of view are those of the
+    first camera.
+    """
+    cameras = sorted(cameras, key=lambda camera: camera.image_name)
+    if num_keyframes is not None and num_keyframes < len(cameras):
+        cameras = [cameras[i] for i in np.linspace(0, len(cameras) - 1, num_keyframes).round().astype(int)]
+    poses = [camera_pose(camera) for camera in cameras]
+    centers = [center for _, center in poses]
+    quaternions = [rotmat2qvec(R) for R, _ in poses]
+
+    num_segments = len(poses) if loop else len(poses) - 1
+    reference = cameras[0]
+    trajectory = []
+    for i in range(num_frames):
+        if num_segments == 0:
+            segment, t = 0, 0.0
+        else:
+            position = i * num_segments / (num_frames if loop else max(num_frames - 1, 1))
+            segment = min(int(position), num_segments - 1)
+            t = position - segment
+        index = lambda k: k % len(poses) if loop else min(max(k, 0), len(poses) - 1)
+        center = catmull_rom(*[centers[index(segment + k)] for k in range(-1, 3)], t)
+        R = qvec2rotmat(slerp(quaternions[index(segment)], quaternions[index(segment + 1)], t))
+        trajectory.append(pose_camera(R, center, reference.image_width, reference.image_height,
+                                      reference.FoVx, reference.FoVy, device))
+    return trajectory
+
+
+def load_trajectory(path, device="cuda"):
+    """
+    Cameras of a JSON file in the format of the cameras.json written next to
+    trained models (a list of entries with position, camera to world rotation,
+    width, height, fx and fy), or a {"frames": [...]} object holding that list.
+    """
+    with open(path) as file:
+        entries = json.load(file)
+    if isinstance(entries, dict):
+        entries = entries["frames"]
+    return [pose_camera(np.array(entry["rotation"]), np.array(entry["position"]), entry["width"], entry["height"],
+                        focal2fov(entry["fx"], entry["width"]), focal2fov(entry["fy"], entry["height"]), device)
+            for entry in entries]
@@ -0,0 +1,68 @@
+import json
+import math
+import os
+import tempfile
+import types
+import unittest
+import numpy as np
+import torch
+from scene.colmap_loader import qvec2rotmat
+from utils.trajectory_utils import interpolate_trajectory, load_trajectory
+
+
+def make_camera(name, angle, center):
+    R = qvec2rotmat(np.array([math.cos(angle / 2), 0.0, math.sin(angle / 2), 0.0]))
+    return types.SimpleNamespace(image_name=name, R=R, T=-R.T @ np.array(center, dtype=np.float64),
+                                 image_width=64, image_height=48, FoVx=1.0, FoVy=0.8)
+
+
+def center_of(camera):
+    return camera.camera_center.cpu().numpy()
+
+
+class TrajectoryTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.cameras = [make_camera("{:03d}".format(i), 0.3 * i, [i, 0.1 * i * i, 0.0]) for i in range(5)]
+
+    def test_given_training_cameras__when_interpolating__then_pass_through_the_key_poses_in_name_order(
+        self,
+    ) -> None:
+        trajectory = interpolate_trajectory(self.cameras[::-1], 9, device="cpu")
+
+        self.assertEqual(len(trajectory), 9)
+        for frame, camera in zip(trajectory[::2], self.cameras):
+            self.assertTrue(np.allclose(center_of(frame), -camera.R @ camera.T, atol=1e-5))
+            expected = torch.tensor(camera.R.T, dtype=torch.float32)
+            self.assertTrue(torch.allclose(frame.world_view_transform[:3, :3].T, expected, atol=1e-5))
+        self.assertEqual((trajectory[1].image_width, trajectory[1].image_height), (64, 48))
+        steps = np.linalg.norm(np.diff([center_of(frame) for frame in trajectory], axis=0), axis=1)
+        self.assertLess(steps.max() / steps.min(), 3)
+
+    def test_given_a_loop__when_interpolating__then_return_to_the_first_pose(
+        self,
+    ) -> None:
+        trajectory = interpolate_trajectory(self.cameras, 10, num_keyframes=3, loop=True, device="cpu")
+
+        self.assertTrue(np.allclose(center_of(trajectory[0]), [0, 0, 0], atol=1e-5))
+        self.assertLess(np.linalg.norm(center_of(trajectory[-1])), np.linalg.norm(center_of(trajectory[5])))
+
+    def test_given_a_cameras_json__when_loading__then_rebuild_the_views(
+        self,
+    ) -> None:
+        camera = self.cameras[2]
+        entry = dict(id=0, img_name="a", width=64, height=48, position=(-camera.R @ camera.T).tolist(),
+                     rotation=camera.R.tolist(), fx=32 / math.tan(0.5), fy=24 / math.tan(0.4))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "cameras.json")
+            with open(path, "w") as file:
+                json.dump([entry, entry], file)
+            trajectory = load_trajectory(path, device="cpu")
+
+        expected = interpolate_trajectory([camera], 1, device="cpu")[0]
+        self.assertEqual(len(trajectory), 2)
+        self.assertAlmostEqual(trajectory[0].FoVx, 1.0, places=5)
+        self.assertTrue(torch.allclose(trajectory[0].full_proj_transform, expected.full_proj_transform, atol=1e-5))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+import numpy as np
+import torch
+from utils.container_utils import pack_container, unpack_container
+from utils.entropy_utils import PROB_SCALE, FrequencyTables, rans_decode, rans_encode
+
+# vectors per distance matrix of assign
+ASSIGN_BATCH_SIZE = 8192
+
+
+def assign(x, codebook):
+    """
+    Index of the nearest code of codebook (k, d) to every row of x (n, d).
+    """
+    norms = (codebook * codebook).sum(1)
+    indices = [torch.argmin(norms[None, :] - 2 * batch @ codebook.T, 1) for batch in torch.split(x, ASSIGN_BATCH_SIZE)]
+    return torch.cat(indices) if indices else torch.zeros(0, dtype=torch.long, device=x.device)
+
+
+def kmeans(x, num_codes, iterations=50, batch_size=16384, seed=0):
+    """
+    Codebook (num_codes, d) of the rows of x (n, d) by mini-batch k-means on
+    the device of x: the codes start at random rows, then every batch moves
+    each code to the batch rows it is nearest to with a rate of one over the
+    rows it has drawn so far.
+    """
+    generator = torch.Generator().manual_seed(seed)
+    x = x.float()
+    n = x.shape[0]
+    codebook = x[torch.randperm(n, generator=generator)[:num_codes].to(x.device)].clone()
+    counts = torch.zeros(codebook.shape[0], device=x.device)
+    for _ in range(iterations if n > codebook.shape[0] else 0):
+        batch = x[torch.randint(n, (min(batch_size, n),), generator=generator).to(x.device)]
+        indices = assign(batch, codebook)
+        batch_counts = torch.bincount(indices, minlength=codebook.shape[0]).float()
+        sums = torch.zeros_like(codebook).index_add_(0, indices, batch)
+        counts += batch_counts
+        drawn = batch_counts > 0
+        codebook[drawn] += (sums[drawn] - batch_counts[drawn, None] * codebook[drawn]) / counts[drawn, None]
+    return codebook
+
+
+def encode_indices(indices, num_codes):
+    """
+    Container bytes of the code indices (n, ) of a codebook of num_codes
+    (at most PROB_SCALE) codes, rANS coded with their frequencies.
+    """
+    if num_codes > PROB_SCALE:
+        raise ValueError("at most {} codes, not {}".format(PROB_SCALE, num_codes))
+    indices = np.asarray(indices, dtype=np.int64)
+    contexts = np.zeros(indices.shape[0], dtype=np.int64)
+    tables = FrequencyTables.from_symbols(indices, contexts, 1, num_codes)
+    states, lane_sizes, words = rans_encode(indices, contexts, tables)
+    sections = {
+        "freq": tables.freq.astype(np.uint16).tobytes(),
+        "states": states.tobytes(),
+        "lane_sizes": lane_sizes.tobytes(),
+        "words": words.tobytes(),
+    }
+    return pack_container({"num_codes": num_codes, "num_indices": int(indices.shape[0])}, sections,
+                          compressed=("freq", "lane_sizes"))
+
+
+def decode_indices(data):
+    header, sections = unpack_container(data)
+    if header["num_indices"] == 0:
+        return np.zeros(0, dtype=np.int64)
+    tables = FrequencyTables(np.frombuffer(sections["freq"], dtype=np.uint16).reshape(1, header["num_codes"]))
+    return rans_decode(np.frombuffer(sections["states"], dtype=np.uint32),
+                       np.frombuffer(sections["lane_sizes"], dtype=np.uint32),
+                       np.frombuffer(sections["words"], dtype=np.uint16),
+                       np.zeros(header["num_indices"], dtype=np.int64), tables).astype(np.int64)
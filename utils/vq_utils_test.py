@@ -0,0 +1,47 @@
+import unittest
+import numpy as np
+import torch
+from utils.vq_utils import assign, decode_indices, encode_indices, kmeans
+
+
+class KmeansTest(unittest.TestCase):
+    def test_given_clustered_vectors__when_learning_a_codebook__then_find_the_clusters(
+        self,
+    ) -> None:
+        generator = torch.Generator().manual_seed(0)
+        centers = torch.randn((8, 6), generator=generator) * 10
+        labels = torch.randint(8, (20_000,), generator=generator)
+        x = centers[labels] + torch.randn((20_000, 6), generator=generator) * 0.1
+
+        codebook = kmeans(x, 32, iterations=50, batch_size=4_096)
+
+        self.assertEqual(codebook.shape, (32, 6))
+        error = (codebook[assign(x, codebook)] - x).norm(dim=1)
+        self.assertLess(error.mean().item(), 1.0)
+
+    def test_given_fewer_vectors_than_codes__when_learning_a_codebook__then_keep_them_all(
+        self,
+    ) -> None:
+        x = torch.randn((5, 3))
+
+        codebook = kmeans(x, 16)
+
+        self.assertTrue(torch.equal(codebook[assign(x, codebook)], x))
+
+
+class IndicesTest(unittest.TestCase):
+    def test_given_indices__when_coding__then_decode_them(
+        self,
+    ) -> None:
+        rng = np.random.default_rng(0)
+        for n, num_codes in [(0, 16), (1, 16), (100_000, 4_096)]:
+            indices = np.minimum(rng.geometric(0.01, n) - 1, num_codes - 1)
+
+            data = encode_indices(indices, num_codes)
+
+            self.assertTrue(np.array_equal(decode_indices(data), indices))
+            self.assertLess(len(data), max(300, n * 12 / 8))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,195 @@
+import os
+import queue
+import shutil
+import subprocess
+import struct
+import threading
+import zlib
+import numpy as np
+import torch
+from PIL import Image
+
+
+def to_uint8(image):
+    """
+    HxWx3 uint8 array of a 3xHxW image in [0, 1], the conversion of
+    torchvision.utils.save_image done on the device of image.
+    """
+    return image.mul(255).add_(0.5).clamp_(0, 255).permute(1, 2, 0).to("cpu", torch.uint8).numpy()
+
+
+def same_image(path, frame):
+    if not os.path.exists(path):
+        return False
+    try:
+        with Image.open(path) as image:
+            if image.size != (frame.shape[1], frame.shape[0]) or image.mode != "RGB":
+                return False
+            return np.array_equal(np.asarray(image), frame)
+    except OSError:
+        return False
+
+
+class ImageWriterPool:
+    """
+    Encodes and writes images on num_workers threads, so the caller only pays
+    for the copy to the host. At most max_pending frames wait in the queue,
+    submit blocks beyond that. close (or leaving the with block) waits for all
+    writes and raises the first error of the workers.
+
+    With skip_unchanged, a file already holding the same pixels is left as is,
+    e.g. the ground truth images rewritten by every evaluation.
+    """
+
+    def __init__(self, num_workers=4, max_pending=16):
+        self.frames = queue.Queue(maxsize=max_pending)
+        self.error = None
+        self.written = 0
+        self.skipped = 0
+        self.lock = threading.Lock()
+        self.workers = [threading.Thread(target=self._work, daemon=True) for _ in range(num_workers)]
+        for worker in self.workers:
+            worker.start()
+
+    def submit(self, path, frame, skip_unchanged=False):
+        if self.error is not None:
+            raise self.error
+        self.frames.put((path, frame, skip_unchanged))
+
+    def _work(self):
+        while True:
+            item = self.frames.get()
+            if item is None:
+                return
+            path, frame, skip_unchanged = item
+            try:
+                if skip_unchanged and same_image(path, frame):
+                    with self.lock:
+                        self.skipped += 1
+                    continue
+                Image.fromarray(frame).save(path)
+                with self.lock:
+                    self.written += 1
+            except Exception as e:
+                self.error = e
+
+    def close(self):
+        for _ in self.workers:
+            self.frames.put(None)
+        for worker in self.workers:
+            worker.join()
+        if self.error is not None:
+            raise self.error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class VideoWriter:
+    """
+    Pipes raw RGB frames to an ffmpeg process from a worker thread, write only
+    blocks when max_pending frames are already waiting.
+    """
+
+    def __init__(self, path, width, height, fps=30, crf=18, max_pending=16):
+        ffmpeg = shutil.which("ffmpeg")
+        if ffmpeg is None:
+            raise RuntimeError("ffmpeg not found, write an image sequence instead")
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.process = subprocess.Popen(
+            [ffmpeg, "-y", "-loglevel", "error", "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", "{}x{}".format(width, height),
+             "-r", str(fps), "-i", "-", "-c:v", "libx264", "-pix_fmt", "yuv420p", "-crf", str(crf),
+             # yuv420p needs even sizes
+             "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2", path],
+            stdin=subprocess.PIPE)
+        self.frames = queue.Queue(maxsize=max_pending)
+        self.error = None
+        self.worker = threading.Thread(target=self._work, daemon=True)
+        self.worker.start()
+
+    def write(self, frame):
+        if self.error is not None:
+            raise self.error
+        self.frames.put(frame)
+
+    def _work(self):
+        while True:
+            frame = self.frames.get()
+            if frame is None:
+                break
+            try:
+                self.process.stdin.write(frame.tobytes())
+            except Exception as e:
+                self.error = e
+        self.process.stdin.close()
+
+    def close(self):
+        self.frames.put(None)
+        self.worker.join()
+        if self.process.wait() != 0 and self.error is None:
+            self.error = RuntimeError("ffmpeg exited with code {}".format(self.process.returncode))
+        if self.error is not None:
+            raise self.error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class PNGWriter:
+    """
+    Writes an 8 bit RGB PNG of width x height row by row, so the caller only
+    holds the rows it writes at once. The rows are Sub filtered and deflated
+    into IDAT chunks as they come; close checks that all of them were written.
+    """
+
+    def __init__(self, path, width, height, level=6):
+        self.width = width
+        self.height = height
+        self.rows = 0
+        self.compressor = zlib.compressobj(level)
+        self.file = open(path, "wb")
+        self.file.write(b"\x89PNG\r\n\x1a\n")
+        self._chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+
+    def _chunk(self, kind, data):
+        self.file.write(struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data)))
+
+    def write(self, rows):
+        """
+        Append rows, a (n, width, 3) uint8 array.
+        """
+        rows = np.ascontiguousarray(rows, dtype=np.uint8).reshape(-1, self.width * 3)
+        filtered = np.empty((rows.shape[0], rows.shape[1] + 1), dtype=np.uint8)
+        # Sub filter, each byte minus the same channel of the previous pixel
+        filtered[:, 0] = 1
+        filtered[:, 1:4] = rows[:, :3]
+        filtered[:, 4:] = rows[:, 3:] - rows[:, :-3]
+        data = self.compressor.compress(filtered.tobytes())
+        if data:
+            self._chunk(b"IDAT", data)
+        self.rows += rows.shape[0]
+
+    def close(self):
+        try:
+            if self.rows != self.height:
+                raise ValueError("{} rows written, the image has {}".format(self.rows, self.height))
+            self._chunk(b"IDAT", self.compressor.flush())
+            self._chunk(b"IEND", b"")
+        finally:
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self.file.close()
+            os.remove(self.file.name)
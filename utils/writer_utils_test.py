@@ -0,0 +1,69 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import torch
+from PIL import Image
+from utils.writer_utils import ImageWriterPool, PNGWriter, VideoWriter, to_uint8
+
+
+class ImageWriterPoolTest(unittest.TestCase):
+    def test_given_many_frames__when_closing_the_pool__then_every_image_is_written(
+        self,
+    ) -> None:
+        frames = [to_uint8(torch.rand(3, 12, 16)) for _ in range(20)]
+        with tempfile.TemporaryDirectory() as directory:
+            with ImageWriterPool(num_workers=3, max_pending=2) as pool:
+                for i, frame in enumerate(frames):
+                    pool.submit(os.path.join(directory, "{:05d}.png".format(i)), frame)
+
+            for i, frame in enumerate(frames):
+                self.assertTrue(np.array_equal(np.array(Image.open(os.path.join(directory, "{:05d}.png".format(i)))), frame))
+
+    def test_given_unchanged_files__when_skipping_unchanged__then_only_rewrite_the_changed_ones(
+        self,
+    ) -> None:
+        frames = [to_uint8(torch.rand(3, 12, 16)) for _ in range(3)]
+        with tempfile.TemporaryDirectory() as directory:
+            paths = [os.path.join(directory, "{:05d}.png".format(i)) for i in range(3)]
+            with ImageWriterPool(num_workers=2) as pool:
+                for path, frame in zip(paths, frames):
+                    pool.submit(path, frame, skip_unchanged=True)
+            modified = os.path.getmtime(paths[0])
+
+            frames[1] = 255 - frames[1]
+            with ImageWriterPool(num_workers=2) as pool:
+                for path, frame in zip(paths, frames):
+                    pool.submit(path, frame, skip_unchanged=True)
+
+            self.assertEqual((pool.written, pool.skipped), (1, 2))
+            self.assertEqual(os.path.getmtime(paths[0]), modified)
+            self.assertTrue(np.array_equal(np.array(Image.open(paths[1])), frames[1]))
+
+    def test_given_a_failing_write__when_closing_the_pool__then_raise_the_error(
+        self,
+    ) -> None:
+        pool = ImageWriterPool(num_workers=1)
+        pool.submit("/nonexistent/directory/frame.png", np.zeros((4, 4, 3), dtype=np.uint8))
+
+        with self.assertRaises(OSError):
+            pool.close()
+
+
+@unittest.skipUnless(shutil.which("ffmpeg"), "needs ffmpeg")
+class VideoWriterTest(unittest.TestCase):
+    def test_given_frames__when_closing__then_write_a_video(
+        self,
+    ) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "video.mp4")
+            with VideoWriter(path, 17, 9, fps=10) as writer:
+                for _ in range(5):
+                    writer.write(to_uint8(torch.rand(3, 9, 17)))
+
+            self.assertGreater(os.path.getsize(path), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()